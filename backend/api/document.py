@@ -12,19 +12,29 @@ Version: 1.0.0
 License: Apache License 2.0
 """
 
-from flask import Blueprint, request, jsonify, send_file
-from werkzeug.utils import secure_filename
-from typing import Dict, Any
+from flask import Blueprint, request, jsonify, send_file, current_app, g
+from typing import Dict, Any, Optional, Tuple, List
+from cachetools import TTLCache
 import os
+import json
+import uuid
+import hashlib
+import threading
+import logging
+import redis
 
-from services.document_service import get_document_service
+from services.document_service import get_document_service, find_uploaded_pdf
 from services.knowledge_graph_service import knowledge_graph_service
-from models.document import Document, DocumentCategory
-from models.knowledge import Subject
-from utils.response import success_response, error_response
+from services.subject_cache import get_subject
+from models.document import Document, DocumentCategory, DocumentPage, DocumentAnalysis
+from utils.response import success_response, error_response, static_error_response
+from utils.validators import validate_pagination_params, parse_tags
 from utils.logger import get_logger
+from utils.decorators import with_identity
 from utils.database import db
+from utils.redis_client import get_redis
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from sqlalchemy.orm import joinedload
 from datetime import datetime
 
 logger = get_logger(__name__)
@@ -32,46 +42,264 @@ logger = get_logger(__name__)
 # 创建蓝图
 document_bp = Blueprint('document', __name__, url_prefix='/api/document')
 
+# 文档ID -> (file_path, filename, file_type, user_id)
+# 下载/预览会反复访问同一文档，缓存路径信息以省去每次的数据库查询
+_doc_path_cache = TTLCache(maxsize=4096, ttl=300)
+_doc_path_lock = threading.Lock()
+
+def _doc_path(document_id: str) -> Optional[Tuple[str, str, str, str]]:
+    """获取文档的存储路径信息（带进程内缓存）"""
+    with _doc_path_lock:
+        entry = _doc_path_cache.get(document_id)
+    if entry is not None:
+        return entry
+    
+    row = db.session.query(
+        Document.file_path, Document.filename, Document.file_type, Document.user_id
+    ).filter_by(id=document_id).first()
+    if row is None:
+        return None
+    
+    entry = tuple(row)
+    with _doc_path_lock:
+        _doc_path_cache[document_id] = entry
+    return entry
+
+def _invalidate_doc_path(document_id: str):
+    """文档更新或删除后清除路径缓存"""
+    with _doc_path_lock:
+        _doc_path_cache.pop(document_id, None)
+
+# 文档详情中页面和分析结果的输出字段，与各自to_dict()保持一致；
+# 按列查询元组后直接组装字典，大文档不再为每一页构造ORM对象
+_PAGE_COLUMNS = (
+    ('id', DocumentPage.id),
+    ('page_number', DocumentPage.page_number),
+    ('page_content', DocumentPage.page_content),
+    ('ocr_confidence', DocumentPage.ocr_confidence),
+    ('content_type', DocumentPage.content_type),
+    ('topics', DocumentPage.topics),
+    ('key_concepts', DocumentPage.key_concepts),
+    ('summary', DocumentPage.summary),
+    ('created_at', DocumentPage.created_at)
+)
+_ANALYSIS_COLUMNS = (
+    ('id', DocumentAnalysis.id),
+    ('analysis_type', DocumentAnalysis.analysis_type),
+    ('analysis_version', DocumentAnalysis.analysis_version),
+    ('result', DocumentAnalysis.result),
+    ('confidence_score', DocumentAnalysis.confidence_score),
+    ('processing_time', DocumentAnalysis.processing_time),
+    ('status', DocumentAnalysis.status),
+    ('created_at', DocumentAnalysis.created_at)
+)
+
+def _fetch_rows(columns, *criteria, order_by=None) -> List[Dict[str, Any]]:
+    """按列查询并组装为字典列表"""
+    keys = [key for key, _ in columns]
+    query = db.session.query(*[column for _, column in columns]).filter(*criteria)
+    if order_by is not None:
+        query = query.order_by(order_by)
+    return [dict(zip(keys, row)) for row in query]
+
+# 解析状态会被前端轮询，1秒TTL把同一文档的密集请求合并为最多每秒一次查询
+_parse_status_cache = TTLCache(maxsize=4096, ttl=1)
+_parse_status_lock = threading.Lock()
+
+# 分类列表很少变化，短TTL缓存以省去热点接口上的重复查询；学科信息使用共享的学科缓存
+_category_cache = TTLCache(maxsize=1024, ttl=30)
+_lookup_lock = threading.Lock()
+
+def _get_categories(tenant_id: str) -> Tuple[List[Dict[str, Any]], str]:
+    """获取租户的文档分类列表及其ETag（带进程内缓存）"""
+    with _lookup_lock:
+        entry = _category_cache.get(tenant_id)
+    if entry is not None:
+        return entry
+    
+    from sqlalchemy import func
+    
+    # 分类和各分类文档数各用一次查询，避免逐个分类统计文档数
+    categories = DocumentCategory.query.filter_by(tenant_id=tenant_id).order_by(
+        DocumentCategory.sort_order, DocumentCategory.name
+    ).all()
+    document_counts = dict(db.session.query(
+        Document.category_id, func.count(Document.id)
+    ).filter(
+        Document.category_id.in_([category.id for category in categories])
+    ).group_by(Document.category_id).all()) if categories else {}
+    
+    categories = [category.to_dict(document_count=document_counts.get(category.id, 0))
+                  for category in categories]
+    # 文档数会随上传变化，ETag取内容摘要而不是版本号
+    etag = hashlib.blake2b(
+        json.dumps(categories, sort_keys=True, default=str).encode('utf-8'), digest_size=16
+    ).hexdigest()
+    entry = (categories, etag)
+    with _lookup_lock:
+        _category_cache[tenant_id] = entry
+    return entry
+
+def _build_category_tree(categories: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """将扁平分类列表一次遍历组装为树"""
+    by_id = {category['id']: {**category, 'children': []} for category in categories}
+    roots = []
+    for node in by_id.values():
+        parent = by_id.get(node['parent_id'])
+        (parent['children'] if parent else roots).append(node)
+    return roots
+
+def _invalidate_categories(tenant_id: str):
+    """分类变更后清除缓存"""
+    with _lookup_lock:
+        _category_cache.pop(tenant_id, None)
+
+# 知识图谱后台任务状态保存在Redis中，任意worker都可查询；
+# 记录发起用户用于权限校验，过期后自动清除
+_KG_TASK_KEY = 'kg:task:{}'
+_KG_TASK_TTL = 24 * 3600
+
+def _save_kg_task(task: Dict[str, Any]):
+    """保存任务状态；状态记录只用于进度查询，Redis不可用时记录后忽略"""
+    try:
+        get_redis().set(_KG_TASK_KEY.format(task['task_id']), json.dumps(task, default=str), ex=_KG_TASK_TTL)
+    except redis.RedisError as e:
+        logger.warning(f"保存知识图谱任务状态失败: {e}")
+
+def _run_kg_task(task: Dict[str, Any], subject_id: str, user_id: str, app_context):
+    """
+    后台执行知识图谱生成
+    """
+    with app_context():
+        try:
+            task['status'] = 'running'
+            _save_kg_task(task)
+            
+            # 生成知识图谱
+            knowledge_graph = knowledge_graph_service.generate_knowledge_graph(
+                subject_id=subject_id,
+                user_id=user_id
+            )
+            
+            task.update({
+                'status': 'completed',
+                'knowledge_graph_stats': knowledge_graph.get('statistics', {}),
+                'end_time': datetime.utcnow().isoformat() + 'Z'
+            })
+        except Exception as e:
+            logger.warning(f"知识图谱生成失败: {e}")
+            task.update({
+                'status': 'failed',
+                'error': str(e),
+                'end_time': datetime.utcnow().isoformat() + 'Z'
+            })
+        _save_kg_task(task)
+
+def _start_kg_task(document_ids: List[str], subject_id: str, user_id: str) -> str:
+    """启动知识图谱后台任务，返回任务ID"""
+    task = {
+        'task_id': str(uuid.uuid4()),
+        'user_id': str(user_id),
+        'status': 'pending',
+        'subject_id': subject_id,
+        'document_ids': document_ids,
+        'start_time': datetime.utcnow().isoformat() + 'Z',
+        'end_time': None
+    }
+    _save_kg_task(task)
+    
+    thread = threading.Thread(
+        target=_run_kg_task,
+        args=(dict(task), subject_id, user_id, current_app.app_context)
+    )
+    thread.daemon = True
+    thread.start()
+    return task['task_id']
+
+def _send_document(file_path: str, **kwargs):
+    """
+    发送文档文件，支持条件请求（ETag/Last-Modified/Range）
+    
+    启用USE_X_SENDFILE时文件由前端Web服务器发送；配置了X_ACCEL_REDIRECT_PREFIX
+    时将X-Sendfile转换为nginx使用的X-Accel-Redirect
+    """
+    response = send_file(file_path, conditional=True, etag=True, max_age=3600, **kwargs)
+    # 文档属于具体用户，只允许浏览器缓存，不允许共享缓存
+    response.cache_control.private = True
+    
+    accel_prefix = current_app.config.get('X_ACCEL_REDIRECT_PREFIX')
+    sendfile_path = response.headers.pop('X-Sendfile', None)
+    if accel_prefix and sendfile_path:
+        relpath = os.path.relpath(sendfile_path, current_app.config['UPLOAD_FOLDER'])
+        response.headers['X-Accel-Redirect'] = f"{accel_prefix.rstrip('/')}/{relpath.replace(os.sep, '/')}"
+    elif sendfile_path:
+        response.headers['X-Sendfile'] = sendfile_path
+    
+    return response
+
 @document_bp.route('/upload', methods=['POST'])
+@with_identity
 def upload_document():
     """
     上传文档文件
     
     请求参数:
-    - file: 文档文件（multipart/form-data）
+    - file: 文档文件（multipart/form-data，可重复以批量上传）
     - title: 文档标题（可选）
     - description: 文档描述（可选）
     - category_id: 分类ID（可选）
     - tags: 标签列表，逗号分隔（可选）
     """
     try:
-        logger.info(f"收到文档上传请求，files: {list(request.files.keys())}, form: {dict(request.form)}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("收到文档上传请求，files: %s, form: %s",
+                         list(request.files.keys()), list(request.form.keys()))
         
         # 检查文件是否存在
         if 'file' not in request.files:
-            logger.error(f"未找到上传文件，可用字段: {list(request.files.keys())}")
-            return error_response("未找到上传文件", 400)
+            logger.error("未找到上传文件，可用字段: %s", list(request.files.keys()))
+            return static_error_response("未找到上传文件", 400)
         
-        file = request.files['file']
-        if file.filename == '':
+        files = [f for f in request.files.getlist('file') if f.filename]
+        if not files:
             logger.error("文件名为空")
-            return error_response("未选择文件", 400)
+            return static_error_response("未选择文件", 400)
+        file = files[0]
         
-        logger.info(f"准备上传文件: {file.filename}, 大小: {file.content_length if hasattr(file, 'content_length') else 'unknown'}")
+        logger.info("准备上传文件: %s, 数量: %d", file.filename, len(files))
         
         # 获取其他参数
         title = request.form.get('title')
         description = request.form.get('description')
         category_id = request.form.get('category_id')
         tags_str = request.form.get('tags', '')
-        tags = [tag.strip() for tag in tags_str.split(',') if tag.strip()] if tags_str else None
+        tags = list(parse_tags(tags_str)) if tags_str else None
         
-        # 暂时使用固定的用户ID和租户ID
-        user_id = "1"
-        tenant_id = "default"
+        user_id = g.user_id
+        tenant_id = g.tenant_id
         
-        # 创建文档
         document_service = get_document_service()
+        
+        # 多文件上传：一次事务批量写入
+        if len(files) > 1:
+            documents = document_service.create_documents(
+                files=files,
+                user_id=user_id,
+                tenant_id=tenant_id,
+                category_id=category_id,
+                tags=tags
+            )
+            return success_response([{
+                'document_id': document.id,
+                'filename': document.filename,
+                'title': document.title,
+                'file_size': document.file_size,
+                'file_type': document.file_type,
+                'parse_status': document.parse_status,
+                'created_at': document.created_at
+            } for document in documents], "文档上传成功")
+        
+        # 创建文档
         document = document_service.create_document(
             file=file,
             user_id=user_id,
@@ -89,16 +317,17 @@ def upload_document():
             'file_size': document.file_size,
             'file_type': document.file_type,
             'parse_status': document.parse_status,
-            'created_at': document.created_at.isoformat()
+            'created_at': document.created_at
         }, "文档上传成功")
         
     except ValueError as e:
         return error_response(str(e), 400)
     except Exception as e:
         logger.error(f"文档上传失败: {e}")
-        return error_response("文档上传失败", 500)
+        return static_error_response("文档上传失败", 500)
 
 @document_bp.route('/list', methods=['GET'])
+@with_identity
 def list_documents():
     """
     获取文档列表
@@ -113,12 +342,14 @@ def list_documents():
         # 获取查询参数
         category_id = request.args.get('category_id')
         search = request.args.get('search')
-        page = int(request.args.get('page', 1))
-        per_page = int(request.args.get('per_page', 20))
+        page, per_page, error = validate_pagination_params(
+            request.args.get('page'), request.args.get('per_page')
+        )
+        if error:
+            return error_response(error, 400)
         
-        # 暂时使用固定的用户ID和租户ID
-        user_id = "1"
-        tenant_id = "default"
+        user_id = g.user_id
+        tenant_id = g.tenant_id
         
         # 获取文档列表
         document_service = get_document_service()
@@ -137,9 +368,10 @@ def list_documents():
         return error_response(str(e), 400)
     except Exception as e:
         logger.error(f"获取文档列表失败: {e}")
-        return error_response("获取文档列表失败", 500)
+        return static_error_response("获取文档列表失败", 500)
 
 @document_bp.route('/<document_id>', methods=['GET'])
+@with_identity
 def get_document(document_id: str):
     """
     获取文档详情
@@ -148,18 +380,21 @@ def get_document(document_id: str):
     - document_id: 文档ID
     """
     try:
-        # 暂时使用固定的用户ID
-        user_id = "1"
+        user_id = g.user_id
         
-        document = Document.query.filter_by(id=document_id, user_id=user_id).first()
+        # 分类随文档一并加载，避免序列化时懒加载
+        document = Document.query.options(
+            joinedload(Document.category)
+        ).filter_by(id=document_id, user_id=user_id).first()
         if not document:
-            return error_response("文档不存在或无权限访问", 404)
+            return static_error_response("文档不存在或无权限访问", 404)
         
         # 获取文档页面内容
-        pages = [page.to_dict() for page in document.pages]
+        pages = _fetch_rows(_PAGE_COLUMNS, DocumentPage.document_id == document_id,
+                            order_by=DocumentPage.page_number)
         
         # 获取分析结果
-        analyses = [analysis.to_dict() for analysis in document.analyses]
+        analyses = _fetch_rows(_ANALYSIS_COLUMNS, DocumentAnalysis.document_id == document_id)
         
         result = {
             **document.to_dict(),
@@ -171,7 +406,7 @@ def get_document(document_id: str):
         
     except Exception as e:
         logger.error(f"获取文档详情失败: {e}")
-        return error_response("获取文档详情失败", 500)
+        return static_error_response("获取文档详情失败", 500)
 
 @document_bp.route('/<document_id>/download', methods=['GET'])
 def download_document(document_id: str):
@@ -183,24 +418,26 @@ def download_document(document_id: str):
     """
     try:
         # 查找文档，不限制用户ID（因为PPT生成的文档应该可以被任何用户下载）
-        document = Document.query.filter_by(id=document_id).first()
-        if not document:
-            return error_response("文档不存在", 404)
+        entry = _doc_path(document_id)
+        if not entry:
+            return static_error_response("文档不存在", 404)
+        file_path, filename, _, _ = entry
         
-        if not os.path.exists(document.file_path):
-            return error_response("文件不存在", 404)
+        if not os.path.exists(file_path):
+            return static_error_response("文件不存在", 404)
         
-        return send_file(
-            document.file_path,
+        return _send_document(
+            file_path,
             as_attachment=True,
-            download_name=document.filename
+            download_name=filename
         )
         
     except Exception as e:
         logger.error(f"文档下载失败: {e}")
-        return error_response("文档下载失败", 500)
+        return static_error_response("文档下载失败", 500)
 
 @document_bp.route('/<document_id>/preview', methods=['GET'])
+@with_identity
 def preview_document(document_id: str):
     """
     预览PDF文档
@@ -209,34 +446,26 @@ def preview_document(document_id: str):
     - document_id: 文档ID
     """
     try:
-        # 暂时使用固定的用户ID
-        user_id = "1"
+        user_id = g.user_id
         
-        document = Document.query.filter_by(id=document_id, user_id=user_id).first()
-        if not document:
-            return error_response("文档不存在或无权限访问", 404)
+        entry = _doc_path(document_id)
+        if not entry or entry[3] != user_id:
+            return static_error_response("文档不存在或无权限访问", 404)
+        file_path, filename, file_type, _ = entry
         
         # 检查文件类型是否为PDF
-        if document.file_type.lower() != 'pdf':
-            return error_response("只支持PDF文件预览", 400)
+        if file_type.lower() != 'pdf':
+            return static_error_response("只支持PDF文件预览", 400)
         
-        # 如果file_path为空，尝试根据文件名在uploads/documents目录中查找
-        file_path = document.file_path
+        # 如果file_path失效，根据文件名在uploads/documents目录的索引中查找
         if not file_path or not os.path.exists(file_path):
-            # 在uploads/documents目录中查找包含文档文件名的文件
-            uploads_dir = os.path.join(os.path.dirname(__file__), '..', 'uploads', 'documents')
-            uploads_dir = os.path.abspath(uploads_dir)
-            
-            if os.path.exists(uploads_dir):
-                for filename in os.listdir(uploads_dir):
-                    if document.filename in filename and filename.endswith('.pdf'):
-                        file_path = os.path.join(uploads_dir, filename)
-                        break
+            uploads_dir = os.path.join(current_app.config['UPLOAD_FOLDER'], 'documents')
+            file_path = find_uploaded_pdf(filename, uploads_dir)
         
         if not file_path or not os.path.exists(file_path):
-            return error_response("文件不存在", 404)
+            return static_error_response("文件不存在", 404)
         
-        return send_file(
+        return _send_document(
             file_path,
             as_attachment=False,
             mimetype='application/pdf'
@@ -244,9 +473,10 @@ def preview_document(document_id: str):
         
     except Exception as e:
         logger.error(f"文档预览失败: {e}")
-        return error_response("文档预览失败", 500)
+        return static_error_response("文档预览失败", 500)
 
 @document_bp.route('/<document_id>', methods=['PUT'])
+@with_identity
 def update_document(document_id: str):
     """
     更新文档信息
@@ -263,14 +493,13 @@ def update_document(document_id: str):
     try:
         data = request.get_json()
         if not data:
-            return error_response("缺少请求数据", 400)
+            return static_error_response("缺少请求数据", 400)
         
-        # 暂时使用固定的用户ID
-        user_id = "1"
+        user_id = g.user_id
         
         document = Document.query.filter_by(id=document_id, user_id=user_id).first()
         if not document:
-            return error_response("文档不存在或无权限访问", 404)
+            return static_error_response("文档不存在或无权限访问", 404)
         
         # 更新文档信息
         if 'title' in data:
@@ -283,15 +512,17 @@ def update_document(document_id: str):
             document.tags = data['tags']
         
         db.session.commit()
+        _invalidate_doc_path(document_id)
         
         return success_response(document.to_dict(), "文档更新成功")
         
     except Exception as e:
         logger.error(f"文档更新失败: {e}")
         db.session.rollback()
-        return error_response("文档更新失败", 500)
+        return static_error_response("文档更新失败", 500)
 
 @document_bp.route('/<document_id>', methods=['DELETE'])
+@with_identity
 def delete_document(document_id: str):
     """
     删除文档
@@ -300,22 +531,23 @@ def delete_document(document_id: str):
     - document_id: 文档ID
     """
     try:
-        # 暂时使用固定的用户ID
-        user_id = "1"
+        user_id = g.user_id
         
         document_service = get_document_service()
         success = document_service.delete_document(document_id, user_id)
         
         if success:
+            _invalidate_doc_path(document_id)
             return success_response({}, "文档删除成功")
         else:
-            return error_response("文档删除失败", 500)
+            return static_error_response("文档删除失败", 500)
         
     except Exception as e:
         logger.error(f"文档删除失败: {e}")
-        return error_response("文档删除失败", 500)
+        return static_error_response("文档删除失败", 500)
 
 @document_bp.route('/<document_id>/parse-status', methods=['GET'])
+@with_identity
 def get_parse_status(document_id: str):
     """
     获取文档解析状态
@@ -324,46 +556,71 @@ def get_parse_status(document_id: str):
     - document_id: 文档ID
     """
     try:
-        # 暂时使用固定的用户ID
-        user_id = "1"
-        
-        document = Document.query.filter_by(id=document_id, user_id=user_id).first()
-        if not document:
-            return error_response("文档不存在或无权限访问", 404)
-        
-        result = {
-            'document_id': document.id,
-            'parse_status': document.parse_status,
-            'parse_progress': document.parse_progress,
-            'parse_error': document.parse_error,
-            'parsed_at': document.parsed_at.isoformat() if document.parsed_at else None
-        }
-        
-        return success_response(result, "获取解析状态成功")
+        user_id = g.user_id
+        
+        key = (document_id, user_id)
+        with _parse_status_lock:
+            result = _parse_status_cache.get(key)
+        
+        if result is None:
+            # 轮询接口：只查询需要的列，避免加载整行ORM对象
+            row = db.session.query(
+                Document.id,
+                Document.parse_status,
+                Document.parse_progress,
+                Document.parse_error,
+                Document.parsed_at
+            ).filter_by(id=document_id, user_id=user_id).first()
+            if row is None:
+                return static_error_response("文档不存在或无权限访问", 404)
+            
+            result = {
+                'document_id': row.id,
+                'parse_status': row.parse_status,
+                'parse_progress': row.parse_progress,
+                'parse_error': row.parse_error,
+                'parsed_at': row.parsed_at
+            }
+            with _parse_status_lock:
+                _parse_status_cache[key] = result
+        
+        response, code = success_response(result, "获取解析状态成功")
+        response.headers['Cache-Control'] = 'no-store'
+        return response, code
         
     except Exception as e:
         logger.error(f"获取解析状态失败: {e}")
-        return error_response("获取解析状态失败", 500)
+        return static_error_response("获取解析状态失败", 500)
 
 @document_bp.route('/categories', methods=['GET'])
+@with_identity
 def list_categories():
     """
     获取文档分类列表
+    
+    查询参数:
+    - tree: 为true时返回嵌套的分类树（children字段），默认返回扁平列表
     """
     try:
-        # 暂时使用固定的租户ID
-        tenant_id = "default"
+        tenant_id = g.tenant_id
         
-        categories = DocumentCategory.query.filter_by(tenant_id=tenant_id).all()
-        result = [category.to_dict() for category in categories]
+        categories, etag = _get_categories(tenant_id)
+        if request.args.get('tree', 'false').lower() == 'true':
+            categories = _build_category_tree(categories)
+            etag = f"{etag}-tree"
         
-        return success_response(result, "获取分类列表成功")
+        response, _ = success_response(categories, "获取分类列表成功")
+        response.set_etag(etag)
+        response.cache_control.private = True
+        response.cache_control.max_age = _category_cache.ttl
+        return response.make_conditional(request)
         
     except Exception as e:
         logger.error(f"获取分类列表失败: {e}")
-        return error_response("获取分类列表失败", 500)
+        return static_error_response("获取分类列表失败", 500)
 
 @document_bp.route('/categories', methods=['POST'])
+@with_identity
 def create_category():
     """
     创建文档分类
@@ -376,10 +633,9 @@ def create_category():
     try:
         data = request.get_json()
         if not data or 'name' not in data:
-            return error_response("缺少必要参数：name", 400)
+            return static_error_response("缺少必要参数：name", 400)
         
-        # 暂时使用固定的租户ID
-        tenant_id = "default"
+        tenant_id = g.tenant_id
         
         category = DocumentCategory(
             tenant_id=tenant_id,
@@ -390,69 +646,54 @@ def create_category():
         
         db.session.add(category)
         db.session.commit()
+        _invalidate_categories(tenant_id)
         
         return success_response(category.to_dict(), "分类创建成功")
         
     except Exception as e:
         logger.error(f"分类创建失败: {e}")
         db.session.rollback()
-        return error_response("分类创建失败", 500)
+        return static_error_response("分类创建失败", 500)
 
 @document_bp.route('/stats', methods=['GET'])
+@with_identity
 def get_document_stats():
     """
     获取文档统计信息
     """
     try:
-        # 暂时使用固定的用户ID和租户ID
-        user_id = "1"
-        tenant_id = "default"
-        
-        # 统计文档数量
-        total_documents = Document.query.filter_by(user_id=user_id, tenant_id=tenant_id).count()
+        user_id = g.user_id
+        tenant_id = g.tenant_id
         
-        # 按状态统计
-        pending_count = Document.query.filter_by(
-            user_id=user_id, tenant_id=tenant_id, parse_status='pending'
-        ).count()
-        
-        processing_count = Document.query.filter_by(
-            user_id=user_id, tenant_id=tenant_id, parse_status='processing'
-        ).count()
-        
-        completed_count = Document.query.filter_by(
-            user_id=user_id, tenant_id=tenant_id, parse_status='completed'
-        ).count()
-        
-        failed_count = Document.query.filter_by(
-            user_id=user_id, tenant_id=tenant_id, parse_status='failed'
-        ).count()
-        
-        # 按文件类型统计
         from sqlalchemy import func
-        type_stats = db.session.query(
+        
+        # 一次分组查询同时得到状态统计和类型统计，在Python中汇总
+        rows = db.session.query(
+            Document.parse_status,
             Document.file_type,
-            func.count(Document.id).label('count')
-        ).filter_by(
-            user_id=user_id, tenant_id=tenant_id
-        ).group_by(Document.file_type).all()
+            func.count(Document.id)
+        ).filter(
+            Document.user_id == user_id, Document.tenant_id == tenant_id
+        ).group_by(Document.parse_status, Document.file_type).all()
+        
+        status_stats = dict.fromkeys(('pending', 'processing', 'completed', 'failed'), 0)
+        type_stats = {}
+        for parse_status, file_type, count in rows:
+            if parse_status in status_stats:
+                status_stats[parse_status] += count
+            type_stats[file_type] = type_stats.get(file_type, 0) + count
         
         result = {
-            'total_documents': total_documents,
-            'status_stats': {
-                'pending': pending_count,
-                'processing': processing_count,
-                'completed': completed_count,
-                'failed': failed_count
-            },
-            'type_stats': {stat.file_type: stat.count for stat in type_stats}
+            'total_documents': sum(type_stats.values()),
+            'status_stats': status_stats,
+            'type_stats': type_stats
         }
         
         return success_response(result, "获取统计信息成功")
         
     except Exception as e:
         logger.error(f"获取统计信息失败: {e}")
-        return error_response("获取统计信息失败", 500)
+        return static_error_response("获取统计信息失败", 500)
 
 @document_bp.route('/upload-by-subject', methods=['POST'])
 @jwt_required()
@@ -475,26 +716,26 @@ def upload_document_by_subject():
         
         # 检查文件是否存在
         if 'file' not in request.files:
-            return error_response("未找到上传文件", 400)
+            return static_error_response("未找到上传文件", 400)
         
         file = request.files['file']
         if file.filename == '':
-            return error_response("未选择文件", 400)
+            return static_error_response("未选择文件", 400)
         
         # 获取参数
         subject_id = request.form.get('subject_id')
         if not subject_id:
-            return error_response("学科ID不能为空", 400)
+            return static_error_response("学科ID不能为空", 400)
         
         # 验证学科
-        subject = Subject.query.filter_by(id=subject_id, tenant_id=tenant_id).first()
+        subject = get_subject(subject_id, tenant_id)
         if not subject:
-            return error_response('学科不存在', 404)
+            return static_error_response('学科不存在', 404)
         
         title = request.form.get('title')
         description = request.form.get('description')
         tags_str = request.form.get('tags', '')
-        tags = [tag.strip() for tag in tags_str.split(',') if tag.strip()] if tags_str else []
+        tags = list(parse_tags(tags_str))
         
         # 添加学科标签
         if subject.name not in tags:
@@ -524,30 +765,13 @@ def upload_document_by_subject():
             'subject_id': subject_id,
             'subject_name': subject.name,
             'tags': tags,
-            'created_at': document.created_at.isoformat()
+            'created_at': document.created_at
         }
         
-        # 自动生成知识图谱
+        # 自动生成知识图谱（后台执行，通过kg-tasks接口查询进度）
         if auto_generate_kg:
-            try:
-                # 更新知识点（从文档中提取）
-                knowledge_graph_service.update_knowledge_point_from_document(
-                    document_id=document.id
-                )
-                
-                # 生成知识图谱
-                knowledge_graph = knowledge_graph_service.generate_knowledge_graph(
-                    subject_id=subject_id,
-                    user_id=user_id
-                )
-                
-                result['knowledge_graph_generated'] = True
-                result['knowledge_graph_stats'] = knowledge_graph.get('statistics', {})
-                
-            except Exception as kg_error:
-                logger.warning(f"知识图谱生成失败: {kg_error}")
-                result['knowledge_graph_generated'] = False
-                result['knowledge_graph_error'] = str(kg_error)
+            result['kg_task_id'] = _start_kg_task([document.id], subject_id, user_id)
+            result['knowledge_graph_status'] = 'processing'
         
         return success_response(result, "文档上传成功")
         
@@ -555,7 +779,32 @@ def upload_document_by_subject():
         return error_response(str(e), 400)
     except Exception as e:
         logger.error(f"按学科上传文档失败: {e}")
-        return error_response("文档上传失败", 500)
+        return static_error_response("文档上传失败", 500)
+
+@document_bp.route('/kg-tasks/<task_id>', methods=['GET'])
+@jwt_required()
+def get_kg_task_status(task_id):
+    """
+    获取知识图谱后台任务状态
+    
+    路径参数:
+    - task_id: 任务ID
+    """
+    current_user_identity = get_jwt_identity()
+    user_id = current_user_identity.get('user_id') if isinstance(current_user_identity, dict) else current_user_identity
+    
+    try:
+        task = get_redis().get(_KG_TASK_KEY.format(task_id))
+    except redis.RedisError as e:
+        logger.error(f"读取知识图谱任务状态失败: {e}")
+        return static_error_response("任务状态暂不可用", 503)
+    
+    # 其他用户的任务与不存在的任务同样处理，不暴露任务是否存在
+    task = json.loads(task) if task else None
+    if not task or task.pop('user_id', None) != str(user_id):
+        return static_error_response("任务不存在", 404)
+    
+    return success_response(task, "获取任务状态成功")
 
 @document_bp.route('/search-by-subject/<subject_id>', methods=['GET'])
 @jwt_required()
@@ -575,37 +824,32 @@ def search_documents_by_subject(subject_id):
         tenant_id = current_user_identity.get('tenant_id')
         
         # 验证学科
-        subject = Subject.query.filter_by(id=subject_id, tenant_id=tenant_id).first()
+        subject = get_subject(subject_id, tenant_id)
         if not subject:
-            return error_response('学科不存在', 404)
+            return static_error_response('学科不存在', 404)
         
         # 获取查询参数
         query = request.args.get('query', '')
         tags_str = request.args.get('tags', '')
-        tags = [tag.strip() for tag in tags_str.split(',') if tag.strip()] if tags_str else []
-        page = int(request.args.get('page', 1))
-        per_page = min(int(request.args.get('per_page', 20)), 100)
-        
-        # 添加学科标签到搜索条件
-        if subject.name not in tags:
-            tags.append(subject.name)
+        tags = list(parse_tags(tags_str))
+        page, per_page, error = validate_pagination_params(
+            request.args.get('page'), request.args.get('per_page')
+        )
+        if error:
+            return error_response(error, 400)
         
-        # 搜索文档
+        # 搜索文档（数据库分页），按学科标签或分类限定范围
         document_service = get_document_service()
-        results = document_service.search_documents(
+        paginated_docs, total = document_service.search_documents_paginated(
             query=query,
             user_id=user_id,
             tenant_id=tenant_id,
-            search_tags=True,
-            subject_filter=subject_id
+            tags=tags,
+            subject=(subject_id, subject.name),
+            page=page,
+            per_page=per_page
         )
         
-        # 处理分页
-        total = len(results)
-        start_idx = (page - 1) * per_page
-        end_idx = start_idx + per_page
-        paginated_docs = results[start_idx:end_idx]
-        
         return success_response({
             'subject_id': subject_id,
             'subject_name': subject.name,
@@ -618,7 +862,7 @@ def search_documents_by_subject(subject_id):
         
     except Exception as e:
         logger.error(f"按学科搜索文档失败: {e}")
-        return error_response("搜索失败", 500)
+        return static_error_response("搜索失败", 500)
 
 @document_bp.route('/generate-knowledge-graph/<subject_id>', methods=['POST'])
 @jwt_required()
@@ -626,8 +870,8 @@ def generate_knowledge_graph_from_documents(subject_id):
     """
     从文档生成知识图谱
     
-    请求参数:
-    - document_ids: 文档ID列表（可选，不提供则使用该学科的所有文档）
+    图谱由该学科已有的知识点生成；从文档内容中提取知识点尚未实现，
+    请求体中的document_ids目前不参与生成
     """
     try:
         current_user_identity = get_jwt_identity()
@@ -635,27 +879,9 @@ def generate_knowledge_graph_from_documents(subject_id):
         tenant_id = current_user_identity.get('tenant_id')
         
         # 验证学科
-        subject = Subject.query.filter_by(id=subject_id, tenant_id=tenant_id).first()
+        subject = get_subject(subject_id, tenant_id)
         if not subject:
-            return error_response('学科不存在', 404)
-        
-        data = request.get_json() or {}
-        document_ids = data.get('document_ids', [])
-        
-        # 更新知识点（从文档中提取）
-        if document_ids:
-            for doc_id in document_ids:
-                knowledge_graph_service.update_knowledge_point_from_document(
-                    document_id=doc_id
-                )
-        else:
-            # 处理该学科的所有文档
-            documents = Document.query.filter_by(tenant_id=tenant_id).all()
-            for doc in documents:
-                if subject.name in (doc.tags or []):
-                    knowledge_graph_service.update_knowledge_point_from_document(
-                        document_id=doc.id
-                    )
+            return static_error_response('学科不存在', 404)
         
         # 生成知识图谱
         knowledge_graph = knowledge_graph_service.generate_knowledge_graph(
@@ -667,9 +893,9 @@ def generate_knowledge_graph_from_documents(subject_id):
             'subject_id': subject_id,
             'subject_name': subject.name,
             'knowledge_graph': knowledge_graph,
-            'generated_at': datetime.now().isoformat()
+            'generated_at': datetime.now()
         }, "知识图谱生成成功")
         
     except Exception as e:
         logger.error(f"生成知识图谱失败: {e}")
-        return error_response("生成知识图谱失败", 500)
\ No newline at end of file
+        return static_error_response("生成知识图谱失败", 500)
\ No newline at end of file
@@ -13,25 +13,219 @@ License: Apache License 2.0
 """
 
 
-from flask import Blueprint, request, jsonify, g
+from flask import Blueprint, request, jsonify, g, current_app
+import gzip
+import hashlib
+import threading
+from werkzeug.exceptions import HTTPException
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from datetime import datetime
+from flask_jwt_extended.exceptions import JWTExtendedException, NoAuthorizationError
+from jwt.exceptions import PyJWTError, ExpiredSignatureError
+import time
+from datetime import date, datetime
+from functools import lru_cache
+import orjson
 from typing import Dict, List, Optional
+from marshmallow import Schema, fields, validate, ValidationError, INCLUDE, EXCLUDE
 
-from services.exam_service import ExamService
+from services.exam_service import ExamService, session_event_channel
+from api.exam_stream import (
+    STREAM_HEARTBEAT_SECONDS, STREAM_MAX_SECONDS, KEEP_ALIVE_MESSAGE, sse_message, is_completed_event
+)
 from services.strategy_service import StrategyService
-from models.exam import ExamSession, TimeAllocation, ScoringStrategy
-from utils.validators import validate_required_fields, validate_enum_field
+from models.exam import ExamSession, ExamStatus, TimeAllocation, ScoringStrategy
 from utils.response import success_response, error_response
 from utils.database import db
+from utils.redis_client import get_redis
+from utils.logger import get_logger
 
 # 创建蓝图
 exam_bp = Blueprint('exam', __name__, url_prefix='/exam')
+logger = get_logger(__name__)
 
 # 初始化服务
+# 服务对象不持有数据库会话，所有查询都经由db.session（按请求/线程作用域，
+# 请求结束时归还连接），因此模块级单例不会让并发请求串行到同一连接上
 exam_service = ExamService()
 strategy_service = StrategyService()
 
+# 请求验证模式
+_REQUIRED = {'required': '缺少必需字段', 'null': '缺少必需字段'}
+_EXAM_MINUTES_RANGE = validate.Range(min=1, max=600, error='考试时长必须在1-600分钟之间')
+
+class ExamSessionCreateSchema(Schema):
+    """创建考试会话请求验证，未声明的字段忽略"""
+    class Meta:
+        unknown = EXCLUDE
+    exam_name = fields.Str(required=True, validate=validate.Length(min=1), error_messages=_REQUIRED)
+    exam_type = fields.Str(load_default='practice',
+                           validate=validate.OneOf(['practice', 'mock', 'final'], error='无效的考试类型'))
+    subject_id = fields.Raw(required=True, error_messages=_REQUIRED)
+    total_questions = fields.Int(required=True, error_messages=_REQUIRED)
+    total_time_minutes = fields.Int(required=True, validate=_EXAM_MINUTES_RANGE, error_messages=_REQUIRED)
+    # 旧版客户端的时长字段，服务层在缺少total_time_minutes时使用
+    time_limit = fields.Int(load_default=None, allow_none=True, validate=_EXAM_MINUTES_RANGE)
+    difficulty_level = fields.Str(load_default='medium',
+                                  validate=validate.OneOf(['easy', 'medium', 'hard', 'mixed'], error='无效的难度级别'))
+    question_filters = fields.Dict(load_default=dict)
+    time_allocation_id = fields.Raw(load_default=None)
+    scoring_strategy_id = fields.Raw(load_default=None)
+
+class AnswerSubmitSchema(Schema):
+    """提交答案请求验证"""
+    question_id = fields.Raw(required=True, error_messages=_REQUIRED)
+    answer = fields.Raw(required=True, error_messages=_REQUIRED)
+    time_spent = fields.Raw(required=True, error_messages=_REQUIRED)
+    confidence_level = fields.Float(load_default=None, allow_none=True)
+    is_guess = fields.Bool(load_default=False)
+
+class AnswerBatchSubmitSchema(Schema):
+    """批量提交答案请求验证"""
+    answers = fields.List(fields.Nested(AnswerSubmitSchema), required=True,
+                          validate=validate.Length(min=1, max=100), error_messages=_REQUIRED)
+
+class TimeAllocationCreateSchema(Schema):
+    """创建时间分配策略请求验证，其余配置项原样传给服务层"""
+    class Meta:
+        unknown = INCLUDE
+    strategy_name = fields.Str(required=True, validate=validate.Length(min=1), error_messages=_REQUIRED)
+
+class TimeAllocationRecommendSchema(Schema):
+    """时间分配建议请求验证"""
+    class Meta:
+        unknown = INCLUDE
+    total_time_minutes = fields.Raw(required=True, error_messages=_REQUIRED)
+    total_questions = fields.Raw(required=True, error_messages=_REQUIRED)
+
+class ScoringRecommendSchema(Schema):
+    """得分策略建议请求验证，未提供的配置项由服务层取默认值"""
+    class Meta:
+        unknown = INCLUDE
+    exam_type = fields.Str()
+    subject_id = fields.Raw(allow_none=True)
+    total_time_minutes = fields.Int(validate=_EXAM_MINUTES_RANGE, error_messages={'invalid': '考试时长必须是数字'})
+    total_questions = fields.Int(validate=validate.Range(min=1, error='题目数量必须大于0'),
+                                 error_messages={'invalid': '题目数量必须是数字'})
+
+class ScoringStrategyCreateSchema(Schema):
+    """创建得分策略请求验证"""
+    class Meta:
+        unknown = INCLUDE
+    strategy_name = fields.Str(required=True, validate=validate.Length(min=1), error_messages=_REQUIRED)
+    strategy_type = fields.Str(load_default='balanced',
+                               validate=validate.OneOf(['conservative', 'aggressive', 'balanced'], error='无效的策略类型'))
+
+class SessionListQuerySchema(Schema):
+    """考试会话列表查询参数，一次完成取值与类型转换"""
+    class Meta:
+        unknown = EXCLUDE
+    status = fields.Str(load_default=None)
+    exam_type = fields.Str(load_default=None)
+    subject_id = fields.Int(load_default=None, error_messages={'invalid': '科目ID必须是数字'})
+    cursor = fields.Str(load_default=None)
+    page = fields.Int(load_default=1, validate=validate.Range(min=1, error='页码必须大于0'),
+                      error_messages={'invalid': '分页参数必须是数字'})
+    per_page = fields.Int(load_default=20, validate=validate.Range(min=1, max=100, error='每页数量必须在1-100之间'),
+                          error_messages={'invalid': '分页参数必须是数字'})
+
+class ExamStatisticsQuerySchema(Schema):
+    """考试统计查询参数"""
+    class Meta:
+        unknown = EXCLUDE
+    subject_id = fields.Int(load_default=None, error_messages={'invalid': '科目ID必须是数字'})
+    exam_type = fields.Str(load_default=None)
+    days = fields.Int(load_default=30, error_messages={'invalid': '统计天数必须是数字'})
+
+# 模式实例无状态，模块加载时创建一次
+_exam_session_create_schema = ExamSessionCreateSchema()
+_answer_submit_schema = AnswerSubmitSchema()
+_answer_batch_submit_schema = AnswerBatchSubmitSchema()
+_time_allocation_create_schema = TimeAllocationCreateSchema()
+_time_allocation_recommend_schema = TimeAllocationRecommendSchema()
+_scoring_strategy_create_schema = ScoringStrategyCreateSchema()
+_scoring_recommend_schema = ScoringRecommendSchema()
+_session_list_query_schema = SessionListQuerySchema()
+_exam_statistics_query_schema = ExamStatisticsQuerySchema()
+
+def _validation_message(error: ValidationError) -> str:
+    """取第一条校验错误信息"""
+    messages = error.messages
+    if isinstance(messages, dict):
+        for field_messages in messages.values():
+            if isinstance(field_messages, list) and field_messages:
+                return str(field_messages[0])
+            return str(field_messages)
+    return '参数验证失败'
+
+def _etag_for(*parts) -> str:
+    """由数据版本信息生成ETag"""
+    return hashlib.blake2b(':'.join(map(str, parts)).encode('utf-8'), digest_size=12).hexdigest()
+
+def _conditional_response(etag: str, build):
+    """
+    客户端携带的ETag仍然有效时直接返回304，跳过查询结果的序列化；
+    否则调用build生成完整响应。响应要求客户端每次使用前重新验证
+    """
+    if request.if_none_match.contains_weak(etag):
+        response = current_app.response_class(status=304)
+    else:
+        response, _ = build()
+    response.set_etag(etag)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+# ==================== 错误处理 ====================
+# 视图函数不再各自捕获异常，统一在蓝图级别转换为错误响应
+
+@exam_bp.errorhandler(ValidationError)
+def _handle_validation_error(e: ValidationError):
+    return error_response(_validation_message(e), 400)
+
+@exam_bp.errorhandler(ValueError)
+def _handle_value_error(e: ValueError):
+    return error_response(str(e), 400)
+
+@exam_bp.errorhandler(JWTExtendedException)
+@exam_bp.errorhandler(PyJWTError)
+def _handle_jwt_error(e: Exception):
+    # 蓝图的Exception处理器优先于应用级处理器匹配，JWT认证异常需在蓝图内单独处理，
+    # 响应与应用级注册的JWT回调保持一致
+    if isinstance(e, ExpiredSignatureError):
+        return {'error': 'Token has expired'}, 401
+    if isinstance(e, NoAuthorizationError):
+        return {'error': 'Authorization token is required'}, 401
+    return {'error': 'Invalid token'}, 422
+
+@exam_bp.errorhandler(Exception)
+def _handle_exception(e: Exception):
+    # HTTP异常原样返回；其余异常记录详情，响应中不暴露内部错误信息
+    if isinstance(e, HTTPException):
+        return e
+    logger.exception(f"考试接口处理失败: {e}")
+    return error_response('服务器内部错误', 500)
+
+# 考试分析报告的生成状态以数据库记录为准：交卷后该时长内仍无报告视为生成中，
+# 超过后视为生成失败（任务出错或所在进程已退出）
+_ANALYTICS_PENDING_SECONDS = 120
+
+def _run_analytics_task(session_id: int, app_context):
+    """后台生成考试分析报告"""
+    try:
+        with app_context():
+            exam_service.generate_exam_analytics(session_id)
+    except Exception as e:
+        logger.warning(f"考试分析生成失败: {e}")
+
+def _start_analytics_task(session_id: int):
+    """启动考试分析后台任务"""
+    thread = threading.Thread(
+        target=_run_analytics_task,
+        args=(session_id, current_app.app_context)
+    )
+    thread.daemon = True
+    thread.start()
+
 # ==================== 考试会话管理 ====================
 
 @exam_bp.route('/sessions', methods=['POST'])
@@ -70,50 +264,20 @@ def create_exam_session():
         }
     }
     """
-    try:
-        user_info = get_jwt_identity()
-        user_id = user_info['user_id'] if isinstance(user_info, dict) else user_info
-        data = request.get_json()
-        
-        # 验证必需字段
-        required_fields = ['exam_name', 'subject_id', 'total_questions', 'total_time_minutes']
-        if not validate_required_fields(data, required_fields):
-            return error_response('缺少必需字段', 400)
-        
-        # 验证枚举字段
-        exam_type = data.get('exam_type', 'practice')
-        if exam_type not in ['practice', 'mock', 'final']:
-            return error_response('无效的考试类型', 400)
-        
-        difficulty_level = data.get('difficulty_level', 'medium')
-        if difficulty_level not in ['easy', 'medium', 'hard', 'mixed']:
-            return error_response('无效的难度级别', 400)
-        
-        # 创建考试会话
-        exam_session = exam_service.create_exam_session(
-            user_id=user_id,
-            exam_config={
-                'exam_name': data['exam_name'],
-                'exam_type': data.get('exam_type', 'practice'),
-                'subject_id': data['subject_id'],
-                'total_questions': data['total_questions'],
-                'total_time_minutes': data.get('total_time_minutes', data.get('time_limit', 60)),
-                'difficulty_level': data.get('difficulty_level', 'medium'),
-                'question_filters': data.get('question_filters', {}),
-                'time_allocation_id': data.get('time_allocation_id'),
-                'scoring_strategy_id': data.get('scoring_strategy_id')
-            }
-        )
-        
-        return success_response(
-            message='考试会话创建成功',
-            data=exam_session
-        )
-        
-    except Exception as e:
-        import traceback
-        traceback.print_exc()
-        return error_response(f'创建考试会话失败: {str(e)}', 500)
+    user_info = get_jwt_identity()
+    user_id = user_info['user_id'] if isinstance(user_info, dict) else user_info
+    data = _exam_session_create_schema.load(request.get_json(silent=True) or {})
+    
+    # 创建考试会话
+    exam_session = exam_service.create_exam_session(
+        user_id=user_id,
+        exam_config=data
+    )
+    
+    return success_response(
+        message='考试会话创建成功',
+        data=exam_session
+    )
 
 @exam_bp.route('/sessions/<int:session_id>/start', methods=['POST'])
 @jwt_required()
@@ -145,22 +309,121 @@ def start_exam(session_id: int):
         }
     }
     """
-    try:
-        user_info = get_jwt_identity()
-        user_id = user_info['user_id'] if isinstance(user_info, dict) else user_info
-        
-        # 开始考试
-        result = exam_service.start_exam(user_id, session_id)
-        
-        return success_response(
-            message='考试开始成功',
-            data=result
-        )
-        
-    except ValueError as e:
-        return error_response(str(e), 400)
-    except Exception as e:
-        return error_response(f'开始考试失败: {str(e)}', 500)
+    user_info = get_jwt_identity()
+    user_id = user_info['user_id'] if isinstance(user_info, dict) else user_info
+    
+    # 开始考试
+    result = exam_service.start_exam(user_id, session_id)
+    
+    return success_response(
+        message='考试开始成功',
+        data=result
+    )
+
+@exam_bp.route('/sessions/<int:session_id>/stream', methods=['GET'])
+@jwt_required()
+def stream_exam_session(session_id: int):
+    """
+    订阅考试会话状态（Server-Sent Events）
+    
+    连接建立后先推送一次当前状态（event=snapshot），之后每次答题推送
+    进度增量（event=progress），交卷后推送event=completed并关闭连接；
+    空闲时定期发送注释行保活。客户端用它代替轮询会话详情
+    
+    经asgi.py部署时该路径由api.exam_stream在事件循环中处理，不进入本视图；
+    本视图供开发服务器等纯WSGI环境使用，推送期间占用一个工作线程
+    
+    消息示例:
+    data: {"event": "progress", "progress": {"answered": 2, "total": 50, "percentage": 4.0}, "statistics": {...}}
+    """
+    user_info = get_jwt_identity()
+    user_id = user_info['user_id'] if isinstance(user_info, dict) else user_info
+    
+    # 先订阅再读取快照，读取期间发布的事件不会丢失
+    pubsub = get_redis().pubsub(ignore_subscribe_messages=True)
+    pubsub.subscribe(session_event_channel(session_id))
+    result = exam_service.get_stream_snapshot(session_id, str(user_id))
+    if result is None:
+        pubsub.close()
+        return error_response('考试会话不存在', 404)
+    snapshot, finished = result
+    
+    def generate():
+        try:
+            yield sse_message(orjson.dumps(snapshot))
+            if finished:
+                return
+            deadline = time.monotonic() + STREAM_MAX_SECONDS
+            while time.monotonic() < deadline:
+                message = pubsub.get_message(timeout=STREAM_HEARTBEAT_SECONDS)
+                if message is None:
+                    yield KEEP_ALIVE_MESSAGE
+                    continue
+                yield sse_message(message['data'])
+                if is_completed_event(message['data']):
+                    break
+        finally:
+            pubsub.close()
+    
+    response = current_app.response_class(generate(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-store'
+    # 禁止反向代理缓冲推送内容
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@exam_bp.route('/sessions/<int:session_id>/time-status', methods=['GET'])
+@jwt_required()
+def get_time_status(session_id: int):
+    """
+    获取考试计时状态
+    
+    计时信息取自开始、交卷时写入Redis的计时哈希，缺失时只读取计时相关的列；
+    剩余时间由会话模型计算（扣除暂停时长），考试结束后剩余时间为0
+    
+    返回:
+    {
+        "code": 200,
+        "message": "获取成功",
+        "data": {
+            "session_id": 1,
+            "status": "in_progress",
+            "elapsed_minutes": 30.5,
+            "remaining_minutes": 89.5,
+            "total_minutes": 120
+        }
+    }
+    """
+    user_info = get_jwt_identity()
+    user_id = user_info['user_id'] if isinstance(user_info, dict) else user_info
+    timing = exam_service.get_exam_timing(session_id, str(user_id))
+    if not timing:
+        return error_response('考试会话不存在', 404)
+    if not timing.actual_start_time:
+        return error_response('考试尚未开始', 400)
+    
+    total_minutes = timing.total_time_minutes or 0
+    # get_remaining_time只读取计时相关的属性，计时信息可直接复用会话模型的计算
+    remaining_seconds = ExamSession.get_remaining_time(timing)
+    if remaining_seconds is None:
+        # 已结束的考试按结束时间计算用时
+        end_time = timing.end_time or datetime.utcnow()
+        elapsed_seconds = (end_time - timing.actual_start_time).total_seconds() - (timing.pause_duration or 0)
+        remaining_seconds = 0
+    else:
+        elapsed_seconds = total_minutes * 60 - remaining_seconds
+    
+    response, code = success_response(
+        message='获取成功',
+        data={
+            'session_id': session_id,
+            'status': timing.status,
+            'elapsed_minutes': round(max(elapsed_seconds, 0) / 60, 2),
+            'remaining_minutes': round(remaining_seconds / 60, 2),
+            'total_minutes': total_minutes
+        }
+    )
+    response.headers['Cache-Control'] = 'no-store'
+    return response, code
 
 @exam_bp.route('/sessions/<int:session_id>/answer', methods=['POST'])
 @jwt_required()
@@ -203,36 +466,70 @@ def submit_answer(session_id: int):
         }
     }
     """
-    try:
-        user_info = get_jwt_identity()
-        user_id = user_info['user_id'] if isinstance(user_info, dict) else user_info
-        data = request.get_json()
-        
-        # 验证必需字段
-        required_fields = ['question_id', 'answer', 'time_spent']
-        if not validate_required_fields(data, required_fields):
-            return error_response('缺少必需字段', 400)
-        
-        # 提交答案
-        result = exam_service.submit_answer(
-            user_id=user_id,
-            session_id=session_id,
-            question_id=data['question_id'],
-            answer=data['answer'],
-            time_spent=data['time_spent'],
-            confidence_level=data.get('confidence_level'),
-            is_guess=data.get('is_guess', False)
-        )
-        
-        return success_response(
-            message='答案提交成功',
-            data=result
-        )
-        
-    except ValueError as e:
-        return error_response(str(e), 400)
-    except Exception as e:
-        return error_response(f'提交答案失败: {str(e)}', 500)
+    user_info = get_jwt_identity()
+    user_id = user_info['user_id'] if isinstance(user_info, dict) else user_info
+    data = _answer_submit_schema.load(request.get_json(silent=True) or {})
+    
+    # 提交答案
+    result = exam_service.submit_answer(
+        user_id=user_id,
+        session_id=session_id,
+        question_id=data['question_id'],
+        answer=data['answer'],
+        time_spent=data['time_spent'],
+        confidence_level=data['confidence_level'],
+        is_guess=data['is_guess']
+    )
+    
+    return success_response(
+        message='答案提交成功',
+        data=result
+    )
+
+@exam_bp.route('/sessions/<int:session_id>/answers', methods=['POST'])
+@jwt_required()
+def submit_answers(session_id: int):
+    """
+    批量提交答案
+    
+    客户端可先在本地缓冲若干道题的答案，再一次提交，服务端只做一次读取和一次写回
+    
+    请求体:
+    {
+        "answers": [
+            {"question_id": 1, "answer": "A", "time_spent": 90, "confidence_level": 0.8, "is_guess": false},
+            {"question_id": 2, "answer": "C", "time_spent": 60}
+        ]
+    }
+    
+    返回:
+    {
+        "code": 200,
+        "message": "答案提交成功",
+        "data": {
+            "results": [
+                {"question_id": 1, "is_correct": true, "score": 5, "explanation": "答案解析"}
+            ],
+            "next_question": {...},
+            "progress": {"answered": 2, "total": 50, "percentage": 4.0},
+            "statistics": {"correct_answers": 1, "total_score": 5, "accuracy": 50.0}
+        }
+    }
+    """
+    user_info = get_jwt_identity()
+    user_id = user_info['user_id'] if isinstance(user_info, dict) else user_info
+    data = _answer_batch_submit_schema.load(request.get_json(silent=True) or {})
+    
+    result = exam_service.submit_answers(
+        user_id=user_id,
+        session_id=session_id,
+        submissions=data['answers']
+    )
+    
+    return success_response(
+        message='答案提交成功',
+        data=result
+    )
 
 @exam_bp.route('/sessions/<int:session_id>/pause', methods=['POST'])
 @jwt_required()
@@ -252,17 +549,11 @@ def pause_exam(session_id: int):
         }
     }
     """
-    try:
-        user_info = get_jwt_identity()
-        user_id = user_info['user_id'] if isinstance(user_info, dict) else user_info
-        
-        # 暂停考试功能暂未实现
-        return error_response('暂停考试功能暂未实现', 501)
-        
-    except ValueError as e:
-        return error_response(str(e), 400)
-    except Exception as e:
-        return error_response(f'暂停考试失败: {str(e)}', 500)
+    user_info = get_jwt_identity()
+    user_id = user_info['user_id'] if isinstance(user_info, dict) else user_info
+    
+    # 暂停考试功能暂未实现
+    return error_response('暂停考试功能暂未实现', 501)
 
 @exam_bp.route('/sessions/<int:session_id>/resume', methods=['POST'])
 @jwt_required()
@@ -282,17 +573,11 @@ def resume_exam(session_id: int):
         }
     }
     """
-    try:
-        user_info = get_jwt_identity()
-        user_id = user_info['user_id'] if isinstance(user_info, dict) else user_info
-        
-        # 恢复考试功能暂未实现
-        return error_response('恢复考试功能暂未实现', 501)
-        
-    except ValueError as e:
-        return error_response(str(e), 400)
-    except Exception as e:
-        return error_response(f'恢复考试失败: {str(e)}', 500)
+    user_info = get_jwt_identity()
+    user_id = user_info['user_id'] if isinstance(user_info, dict) else user_info
+    
+    # 恢复考试功能暂未实现
+    return error_response('恢复考试功能暂未实现', 501)
 
 @exam_bp.route('/sessions/<int:session_id>/complete', methods=['POST'])
 @jwt_required()
@@ -316,21 +601,20 @@ def complete_exam(session_id: int):
         }
     }
     """
-    try:
-        user_info = get_jwt_identity()
-        user_id = user_info['user_id'] if isinstance(user_info, dict) else user_info
-        
-        result = exam_service.complete_exam(user_id, session_id)
-        
-        return success_response(
-            message='考试完成',
-            data=result
-        )
-        
-    except ValueError as e:
-        return error_response(str(e), 400)
-    except Exception as e:
-        return error_response(f'完成考试失败: {str(e)}', 500)
+    user_info = get_jwt_identity()
+    user_id = user_info['user_id'] if isinstance(user_info, dict) else user_info
+    
+    result = exam_service.complete_exam(user_id, session_id)
+    
+    # 分析报告在后台生成，客户端通过 /sessions/<session_id>/analytics 轮询
+    _start_analytics_task(session_id)
+    result['analytics_id'] = None
+    result['analytics_status'] = 'pending'
+    
+    return success_response(
+        message='考试完成',
+        data=result
+    )
 
 @exam_bp.route('/sessions/<int:session_id>', methods=['GET'])
 @jwt_required()
@@ -364,50 +648,33 @@ def get_exam_session(session_id: int):
         }
     }
     """
+    user_info = get_jwt_identity()
+    user_id = user_info['user_id'] if isinstance(user_info, dict) else user_info
+    
     try:
-        user_info = get_jwt_identity()
-        user_id = user_info['user_id'] if isinstance(user_info, dict) else user_info
-        
-        try:
-            exam_session = exam_service.get_exam_session(session_id, str(user_id))
-            if not exam_session:
-                return error_response('考试会话不存在', 404)
-            
-            # 安全地获取datetime字段
-            start_time = None
-            if hasattr(exam_session, 'start_time') and exam_session.start_time is not None:
-                start_time = exam_session.start_time.isoformat() if hasattr(exam_session.start_time, 'isoformat') else str(exam_session.start_time)
-            
-            end_time = None
-            if hasattr(exam_session, 'end_time') and exam_session.end_time is not None:
-                end_time = exam_session.end_time.isoformat() if hasattr(exam_session.end_time, 'isoformat') else str(exam_session.end_time)
-            
-            created_time = None
-            if hasattr(exam_session, 'created_time') and exam_session.created_time is not None:
-                created_time = exam_session.created_time.isoformat() if hasattr(exam_session.created_time, 'isoformat') else str(exam_session.created_time)
-            
-            return success_response(
-                message='获取成功',
-                data={
-                    'session_id': exam_session.id,
-                    'exam_name': getattr(exam_session, 'exam_name', getattr(exam_session, 'title', '')),
-                    'status': exam_session.status,
-                    'exam_type': getattr(exam_session, 'exam_type', ''),
-                    'subject_id': exam_session.subject_id,
-                    'total_questions': exam_session.total_questions,
-                    'completed_questions': exam_session.completed_questions or 0,
-                    'start_time': start_time,
-                    'end_time': end_time,
-                    'created_time': created_time
-                }
-            )
-        except AttributeError:
-            return error_response('获取考试会话详情功能暂未完全实现', 501)
+        exam_session = exam_service.get_exam_session(session_id, str(user_id))
+        if not exam_session:
+            return error_response('考试会话不存在', 404)
         
-    except ValueError as e:
-        return error_response(str(e), 404)
-    except Exception as e:
-        return error_response(f'获取考试会话失败: {str(e)}', 500)
+        etag = _etag_for('session', exam_session.id, exam_session.updated_time, exam_session.status)
+        return _conditional_response(etag, lambda: success_response(
+            message='获取成功',
+            data={
+                'session_id': exam_session.id,
+                'exam_name': getattr(exam_session, 'exam_name', getattr(exam_session, 'title', '')),
+                'status': exam_session.status,
+                'exam_type': getattr(exam_session, 'exam_type', ''),
+                'subject_id': exam_session.subject_id,
+                'total_questions': exam_session.total_questions,
+                'completed_questions': exam_session.completed_questions or 0,
+                # datetime由orjson响应层直接输出为ISO 8601字符串
+                'start_time': getattr(exam_session, 'start_time', None),
+                'end_time': getattr(exam_session, 'end_time', None),
+                'created_time': getattr(exam_session, 'created_time', None)
+            }
+        ))
+    except AttributeError:
+        return error_response('获取考试会话详情功能暂未完全实现', 501)
 
 @exam_bp.route('/sessions', methods=['GET'])
 @jwt_required()
@@ -419,7 +686,8 @@ def get_user_exam_sessions():
     - status: 状态筛选 (created, in_progress, paused, completed, expired)
     - exam_type: 考试类型筛选 (practice, mock, final)
     - subject_id: 科目筛选
-    - page: 页码 (默认1)
+    - cursor: 分页游标，取上一页返回的next_cursor
+    - page: 页码 (默认1，已废弃，仅在未传cursor时生效)
     - per_page: 每页数量 (默认20)
     
     返回:
@@ -432,46 +700,34 @@ def get_user_exam_sessions():
                     "session_id": 1,
                     "exam_name": "数学模拟考试",
                     "status": "completed",
+                    "exam_type": "mock",
                     "score_percentage": 85.0,
                     "created_time": "2024-01-01T10:00:00"
                 }
             ],
             "pagination": {
-                "page": 1,
                 "per_page": 20,
-                "total": 1,
-                "pages": 1
+                "has_next": true,
+                "next_cursor": "MjAyNC0wMS0wMVQxMDowMDowMHwx",
+                "page": 1,        # 仅page模式返回
+                "total": 1,       # 仅page模式返回
+                "pages": 1        # 仅page模式返回
             }
         }
     }
     """
-    try:
-        user_info = get_jwt_identity()
-        user_id = user_info['user_id'] if isinstance(user_info, dict) else user_info
-        
-        # 获取查询参数
-        status = request.args.get('status')
-        exam_type = request.args.get('exam_type')
-        subject_id = request.args.get('subject_id', type=int)
-        page = request.args.get('page', 1, type=int)
-        per_page = min(request.args.get('per_page', 20, type=int), 100)
-        
-        # 获取考试会话列表功能暂未实现
-        return success_response(
-            message='获取成功',
-            data={
-                'sessions': [],
-                'pagination': {
-                    'page': page,
-                    'per_page': per_page,
-                    'total': 0,
-                    'pages': 0
-                }
-            }
-        )
-        
-    except Exception as e:
-        return error_response(f'获取考试会话列表失败: {str(e)}', 500)
+    user_info = get_jwt_identity()
+    user_id = user_info['user_id'] if isinstance(user_info, dict) else user_info
+    
+    # 获取查询参数
+    query = _session_list_query_schema.load(request.args)
+    
+    version = exam_service.get_user_sessions_version(str(user_id))
+    etag = _etag_for('sessions', user_id, *version, request.query_string.decode('utf-8', 'replace'))
+    return _conditional_response(etag, lambda: success_response(
+        message='获取成功',
+        data=exam_service.get_user_exam_sessions(user_id=str(user_id), **query)
+    ))
 
 # ==================== 时间分配策略 ====================
 
@@ -503,33 +759,24 @@ def create_time_allocation():
         }
     }
     """
-    try:
-        user_info = get_jwt_identity()
-        user_id = user_info['user_id'] if isinstance(user_info, dict) else user_info
-        data = request.get_json()
-        
-        # 验证必需字段
-        required_fields = ['strategy_name']
-        if not validate_required_fields(data, required_fields):
-            return error_response('缺少必需字段', 400)
-        
-        # 创建时间分配策略
-        time_allocation = strategy_service.create_time_allocation_strategy(
-            user_id=user_id,
-            strategy_config=data
-        )
-        
-        return success_response(
-            message='时间分配策略创建成功',
-            data={
-                'allocation_id': time_allocation.id,
-                'strategy_name': time_allocation.strategy_name,
-                'total_time_requirement': time_allocation.get_total_time_requirement(50)  # 假设50题
-            }
-        )
-        
-    except Exception as e:
-        return error_response(f'创建时间分配策略失败: {str(e)}', 500)
+    user_info = get_jwt_identity()
+    user_id = user_info['user_id'] if isinstance(user_info, dict) else user_info
+    data = _time_allocation_create_schema.load(request.get_json(silent=True) or {})
+    
+    # 创建时间分配策略
+    time_allocation = strategy_service.create_time_allocation_strategy(
+        user_id=user_id,
+        strategy_config=data
+    )
+    
+    return success_response(
+        message='时间分配策略创建成功',
+        data={
+            'allocation_id': time_allocation.id,
+            'strategy_name': time_allocation.strategy_name,
+            'total_time_requirement': time_allocation.get_total_time_requirement(50)  # 假设50题
+        }
+    )
 
 @exam_bp.route('/time-allocations/recommendations', methods=['POST'])
 @jwt_required()
@@ -569,29 +816,20 @@ def get_time_allocation_recommendations():
         }
     }
     """
-    try:
-        user_info = get_jwt_identity()
-        user_id = user_info['user_id'] if isinstance(user_info, dict) else user_info
-        data = request.get_json()
-        
-        # 获取时间分配建议验证必需字段
-        required_fields = ['total_time_minutes', 'total_questions']
-        if not validate_required_fields(data, required_fields):
-            return error_response('缺少必需字段', 400)
-        
-        # 获取时间分配建议
-        recommendations = strategy_service.get_optimal_time_allocation(
-            user_id=user_id,
-            exam_config=data
-        )
-        
-        return success_response(
-            message='获取建议成功',
-            data=recommendations
-        )
-        
-    except Exception as e:
-        return error_response(f'获取时间分配建议失败: {str(e)}', 500)
+    user_info = get_jwt_identity()
+    user_id = user_info['user_id'] if isinstance(user_info, dict) else user_info
+    data = _time_allocation_recommend_schema.load(request.get_json(silent=True) or {})
+    
+    # 获取时间分配建议
+    recommendations = strategy_service.get_optimal_time_allocation(
+        user_id=user_id,
+        exam_config=data
+    )
+    
+    return success_response(
+        message='获取建议成功',
+        data=recommendations
+    )
 
 @exam_bp.route('/time-allocations', methods=['GET'])
 @jwt_required()
@@ -616,21 +854,13 @@ def get_user_time_allocations():
         }
     }
     """
-    try:
-        user_info = get_jwt_identity()
-        user_id = user_info['user_id'] if isinstance(user_info, dict) else user_info
-        
-        time_allocations = strategy_service.get_user_time_allocations(user_id)
-        
-        return success_response(
-            message='获取成功',
-            data={
-                'time_allocations': [allocation.to_dict() for allocation in time_allocations]
-            }
-        )
-        
-    except Exception as e:
-        return error_response(f'获取时间分配策略失败: {str(e)}', 500)
+    user_info = get_jwt_identity()
+    user_id = user_info['user_id'] if isinstance(user_info, dict) else user_info
+    
+    return success_response(
+        message='获取成功',
+        data={'time_allocations': strategy_service.get_user_time_allocations(user_id)}
+    )
 
 # ==================== 得分策略 ====================
 
@@ -663,38 +893,24 @@ def create_scoring_strategy():
         }
     }
     """
-    try:
-        user_info = get_jwt_identity()
-        user_id = user_info['user_id'] if isinstance(user_info, dict) else user_info
-        data = request.get_json()
-        
-        # 验证必需字段
-        required_fields = ['strategy_name']
-        if not validate_required_fields(data, required_fields):
-            return error_response('缺少必需字段', 400)
-        
-        # 验证策略类型
-        if not validate_enum_field(data.get('strategy_type', 'balanced'), 
-                                 ['conservative', 'aggressive', 'balanced']):
-            return error_response('无效的策略类型', 400)
-        
-        # 创建得分策略
-        scoring_strategy = strategy_service.create_scoring_strategy(
-            user_id=user_id,
-            strategy_config=data
-        )
-        
-        return success_response(
-            message='得分策略创建成功',
-            data={
-                'strategy_id': scoring_strategy.id,
-                'strategy_name': scoring_strategy.strategy_name,
-                'strategy_type': scoring_strategy.strategy_type
-            }
-        )
-        
-    except Exception as e:
-        return error_response(f'创建得分策略失败: {str(e)}', 500)
+    user_info = get_jwt_identity()
+    user_id = user_info['user_id'] if isinstance(user_info, dict) else user_info
+    data = _scoring_strategy_create_schema.load(request.get_json(silent=True) or {})
+    
+    # 创建得分策略
+    scoring_strategy = strategy_service.create_scoring_strategy(
+        user_id=user_id,
+        strategy_config=data
+    )
+    
+    return success_response(
+        message='得分策略创建成功',
+        data={
+            'strategy_id': scoring_strategy.id,
+            'strategy_name': scoring_strategy.strategy_name,
+            'strategy_type': scoring_strategy.strategy_type
+        }
+    )
 
 @exam_bp.route('/scoring-strategies/recommendations', methods=['POST'])
 @jwt_required()
@@ -729,24 +945,20 @@ def get_scoring_strategy_recommendations():
         }
     }
     """
-    try:
-        user_info = get_jwt_identity()
-        user_id = user_info['user_id'] if isinstance(user_info, dict) else user_info
-        data = request.get_json()
-        
-        # 获取得分策略建议
-        recommendations = strategy_service.get_optimal_scoring_strategy(
-            user_id=user_id,
-            exam_config=data
-        )
-        
-        return success_response(
-            message='获取建议成功',
-            data=recommendations
-        )
-        
-    except Exception as e:
-        return error_response(f'获取得分策略建议失败: {str(e)}', 500)
+    user_info = get_jwt_identity()
+    user_id = user_info['user_id'] if isinstance(user_info, dict) else user_info
+    data = _scoring_recommend_schema.load(request.get_json(silent=True) or {})
+    
+    # 获取得分策略建议
+    recommendations = strategy_service.get_optimal_scoring_strategy(
+        user_id=user_id,
+        exam_config=data
+    )
+    
+    return success_response(
+        message='获取建议成功',
+        data=recommendations
+    )
 
 @exam_bp.route('/scoring-strategies', methods=['GET'])
 @jwt_required()
@@ -772,21 +984,13 @@ def get_user_scoring_strategies():
         }
     }
     """
-    try:
-        user_info = get_jwt_identity()
-        user_id = user_info['user_id'] if isinstance(user_info, dict) else user_info
-        
-        scoring_strategies = strategy_service.get_user_scoring_strategies(user_id)
-        
-        return success_response(
-            message='获取成功',
-            data={
-                'scoring_strategies': [strategy.to_dict() for strategy in scoring_strategies]
-            }
-        )
-        
-    except Exception as e:
-        return error_response(f'获取得分策略失败: {str(e)}', 500)
+    user_info = get_jwt_identity()
+    user_id = user_info['user_id'] if isinstance(user_info, dict) else user_info
+    
+    return success_response(
+        message='获取成功',
+        data={'scoring_strategies': strategy_service.get_user_scoring_strategies(user_id)}
+    )
 
 # ==================== 统计和分析 ====================
 
@@ -830,32 +1034,20 @@ def get_exam_statistics():
         }
     }
     """
-    try:
-        user_info = get_jwt_identity()
-        user_id = user_info['user_id'] if isinstance(user_info, dict) else user_info
-        
-        # 获取查询参数
-        subject_id = request.args.get('subject_id', type=int)
-        exam_type = request.args.get('exam_type')
-        days = request.args.get('days', 30, type=int)
-        
-        # 获取统计信息功能暂未实现
-        return success_response(
-            message='获取成功',
-            data={
-                'total_exams': 0,
-                'completed_exams': 0,
-                'completion_rate': 0.0,
-                'average_score': 0.0,
-                'total_time_hours': 0.0,
-                'exam_type_distribution': {},
-                'score_distribution': {},
-                'improvement_trend': []
-            }
-        )
-        
-    except Exception as e:
-        return error_response(f'获取考试统计失败: {str(e)}', 500)
+    user_info = get_jwt_identity()
+    user_id = user_info['user_id'] if isinstance(user_info, dict) else user_info
+    
+    # 获取查询参数
+    query = _exam_statistics_query_schema.load(request.args)
+    query['days'] = min(max(query['days'], 1), 365)
+    
+    # 统计窗口按天滚动，ETag中带上当天日期
+    version = exam_service.get_user_sessions_version(str(user_id))
+    etag = _etag_for('statistics', user_id, *version, date.today(), *sorted(query.items()))
+    return _conditional_response(etag, lambda: success_response(
+        message='获取成功',
+        data=exam_service.get_user_exam_statistics(user_id=str(user_id), **query)
+    ))
 
 @exam_bp.route('/analytics/<int:analytics_id>', methods=['GET'])
 @jwt_required()
@@ -894,24 +1086,65 @@ def get_exam_analytics(analytics_id: int):
         }
     }
     """
-    try:
-        user_info = get_jwt_identity()
-        user_id = user_info['user_id'] if isinstance(user_info, dict) else user_info
-        
-        # 这里需要实现获取分析报告的逻辑
-        # 暂时返回示例数据
-        analytics_data = {
-            'analytics_id': analytics_id,
-            'message': '分析报告功能正在开发中'
+    user_info = get_jwt_identity()
+    user_id = user_info['user_id'] if isinstance(user_info, dict) else user_info
+    
+    analytics = exam_service.get_exam_analytics(str(user_id), analytics_id=analytics_id)
+    if not analytics:
+        return error_response('分析报告不存在', 404)
+    
+    etag = _etag_for('analytics', analytics.id, analytics.updated_time)
+    return _conditional_response(etag, lambda: success_response(
+        message='获取成功',
+        data={'analytics_id': analytics.id, **analytics.to_dict()}
+    ))
+
+@exam_bp.route('/sessions/<int:session_id>/analytics', methods=['GET'])
+@jwt_required()
+def get_session_analytics(session_id: int):
+    """
+    获取考试会话的分析报告生成状态
+    
+    返回:
+    {
+        "code": 200,
+        "message": "获取成功",
+        "data": {
+            "analytics_status": "completed",  # pending, completed, failed
+            "analytics_id": 1,
+            "analytics": {...}
         }
+    }
+    """
+    user_info = get_jwt_identity()
+    user_id = user_info['user_id'] if isinstance(user_info, dict) else user_info
+    
+    analytics = exam_service.get_exam_analytics(str(user_id), session_id=session_id)
+    if analytics:
+        data = {
+            'analytics_status': 'completed',
+            'analytics_id': analytics.id,
+            'analytics': analytics.to_dict()
+        }
+    else:
+        exam_session = db.session.query(ExamSession.status, ExamSession.end_time).filter(
+            ExamSession.id == session_id, ExamSession.user_id == str(user_id)
+        ).first()
+        if not exam_session:
+            return error_response('考试会话不存在', 404)
+        if exam_session.status != ExamStatus.COMPLETED.value:
+            return error_response('考试尚未完成', 400)
         
-        return success_response(
-            message='获取成功',
-            data=analytics_data
-        )
-        
-    except Exception as e:
-        return error_response(f'获取考试分析失败: {str(e)}', 500)
+        pending = exam_session.end_time is not None and \
+            (datetime.utcnow() - exam_session.end_time).total_seconds() < _ANALYTICS_PENDING_SECONDS
+        data = {
+            'analytics_status': 'pending' if pending else 'failed',
+            'analytics_id': None
+        }
+    
+    response, code = success_response(message='获取成功', data=data)
+    response.headers['Cache-Control'] = 'no-store'
+    return response, code
 
 @exam_bp.route('/strategies/recommendations', methods=['GET'])
 @jwt_required()
@@ -936,107 +1169,78 @@ def get_strategy_recommendations():
         }
     }
     """
-    try:
-        user_info = get_jwt_identity()
-        user_id = user_info['user_id'] if isinstance(user_info, dict) else user_info
-        
-        recommendations = strategy_service.get_strategy_recommendations(user_id)
-        
-        return success_response(
-            message='获取成功',
-            data=recommendations
-        )
-        
-    except Exception as e:
-        return error_response(f'获取策略建议失败: {str(e)}', 500)
+    user_info = get_jwt_identity()
+    user_id = user_info['user_id'] if isinstance(user_info, dict) else user_info
+    
+    # 建议完全由用户的考试表现得出，会话未变化时无需重新计算
+    version = exam_service.get_user_sessions_version(str(user_id))
+    etag = _etag_for('recommendations', user_id, *version)
+    return _conditional_response(etag, lambda: success_response(
+        message='获取成功',
+        data=strategy_service.get_strategy_recommendations(user_id)
+    ))
 
 # ==================== 辅助接口 ====================
 
-@exam_bp.route('/types', methods=['GET'])
-def get_exam_types():
-    """
-    获取考试类型列表
-    
-    返回:
-    {
-        "code": 200,
-        "message": "获取成功",
-        "data": {
-            "exam_types": [
-                {"value": "practice", "label": "练习考试", "description": "日常练习，不计入正式成绩"},
-                {"value": "mock", "label": "模拟考试", "description": "模拟正式考试环境"},
-                {"value": "final", "label": "正式考试", "description": "正式考试，计入成绩"}
-            ]
-        }
-    }
-    """
-    exam_types = [
+# 辅助接口返回的固定数据
+_STATIC_PAYLOADS = {
+    'exam_types': [
         {'value': 'practice', 'label': '练习考试', 'description': '日常练习，不计入正式成绩'},
         {'value': 'mock', 'label': '模拟考试', 'description': '模拟正式考试环境'},
         {'value': 'final', 'label': '正式考试', 'description': '正式考试，计入成绩'}
-    ]
-    
-    return success_response(
-        message='获取成功',
-        data={'exam_types': exam_types}
-    )
-
-@exam_bp.route('/difficulty-levels', methods=['GET'])
-def get_difficulty_levels():
-    """
-    获取难度级别列表
-    
-    返回:
-    {
-        "code": 200,
-        "message": "获取成功",
-        "data": {
-            "difficulty_levels": [
-                {"value": "easy", "label": "简单", "description": "基础题目，适合入门"},
-                {"value": "medium", "label": "中等", "description": "中等难度，适合提高"},
-                {"value": "hard", "label": "困难", "description": "高难度题目，适合挑战"},
-                {"value": "mixed", "label": "混合", "description": "包含各种难度的题目"}
-            ]
-        }
-    }
-    """
-    difficulty_levels = [
+    ],
+    'difficulty_levels': [
         {'value': 'easy', 'label': '简单', 'description': '基础题目，适合入门'},
         {'value': 'medium', 'label': '中等', 'description': '中等难度，适合提高'},
         {'value': 'hard', 'label': '困难', 'description': '高难度题目，适合挑战'},
         {'value': 'mixed', 'label': '混合', 'description': '包含各种难度的题目'}
+    ],
+    'strategy_types': [
+        {'value': 'conservative', 'label': '保守型', 'description': '注重准确率，稳扎稳打'},
+        {'value': 'aggressive', 'label': '进取型', 'description': '追求高分，敢于挑战'},
+        {'value': 'balanced', 'label': '平衡型', 'description': '平衡各方面因素'}
     ]
-    
-    return success_response(
-        message='获取成功',
-        data={'difficulty_levels': difficulty_levels}
-    )
+}
+
+@lru_cache(maxsize=None)
+def _static_body(name: str, compressed: bool = False) -> bytes:
+    """固定数据的响应体只序列化（及压缩）一次"""
+    if compressed:
+        return gzip.compress(_static_body(name), mtime=0)
+    response, _ = success_response(message='获取成功', data={name: _STATIC_PAYLOADS[name]})
+    return response.get_data()
+
+def _static_response(name: str):
+    """返回固定数据响应，客户端支持gzip时直接返回预压缩内容，允许客户端和代理缓存一天"""
+    compressed = bool(request.accept_encodings['gzip'])
+    response = current_app.response_class(_static_body(name, compressed), mimetype='application/json')
+    if compressed:
+        # 已设置Content-Encoding的响应不会再经过Flask-Compress压缩
+        response.headers['Content-Encoding'] = 'gzip'
+    response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    response.cache_control.max_age = 86400
+    return response
 
-@exam_bp.route('/strategy-types', methods=['GET'])
-def get_strategy_types():
+# 三个辅助接口共用一个视图，按路由默认参数取对应的预编码响应
+@exam_bp.route('/types', methods=['GET'], defaults={'name': 'exam_types'})
+@exam_bp.route('/difficulty-levels', methods=['GET'], defaults={'name': 'difficulty_levels'})
+@exam_bp.route('/strategy-types', methods=['GET'], defaults={'name': 'strategy_types'})
+def get_static_options(name: str):
     """
-    获取策略类型列表
+    获取考试类型、难度级别或策略类型列表
     
-    返回:
+    返回（以/types为例，其余接口的data键分别为difficulty_levels、strategy_types）:
     {
         "code": 200,
         "message": "获取成功",
         "data": {
-            "strategy_types": [
-                {"value": "conservative", "label": "保守型", "description": "注重准确率，稳扎稳打"},
-                {"value": "aggressive", "label": "进取型", "description": "追求高分，敢于挑战"},
-                {"value": "balanced", "label": "平衡型", "description": "平衡各方面因素"}
+            "exam_types": [
+                {"value": "practice", "label": "练习考试", "description": "日常练习，不计入正式成绩"},
+                {"value": "mock", "label": "模拟考试", "description": "模拟正式考试环境"},
+                {"value": "final", "label": "正式考试", "description": "正式考试，计入成绩"}
             ]
         }
     }
     """
-    strategy_types = [
-        {'value': 'conservative', 'label': '保守型', 'description': '注重准确率，稳扎稳打'},
-        {'value': 'aggressive', 'label': '进取型', 'description': '追求高分，敢于挑战'},
-        {'value': 'balanced', 'label': '平衡型', 'description': '平衡各方面因素'}
-    ]
-    
-    return success_response(
-        message='获取成功',
-        data={'strategy_types': strategy_types}
-    )
\ No newline at end of file
+    return _static_response(name)
\ No newline at end of file
@@ -15,9 +15,12 @@ License: Apache License 2.0
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from typing import Dict, Any, Optional
-from services.exam_knowledge_service import ExamKnowledgeService
-from models import ExamKnowledgeMapping, ExamKnowledgeStatistics
+from services.exam_knowledge_service import ExamKnowledgeService, cached_subject_result
+from sqlalchemy import func, case, and_
+from sqlalchemy.orm import joinedload, raiseload
+from models import ExamKnowledgeMapping, ExamKnowledgeStatistics, KnowledgePoint, Chapter
 from utils.response import success_response, error_response
+from utils.database import db, count_rows
 from utils.validators import validate_required_fields
 import logging
 
@@ -26,6 +29,51 @@ logger = logging.getLogger(__name__)
 # 创建蓝图
 exam_knowledge_bp = Blueprint('exam_knowledge', __name__, url_prefix='/api/exam-knowledge')
 
+# 列表接口直接查询响应所需的列，行经_asdict()即为响应字典，
+# 省去ORM对象装配和逐字段取值，交给orjson一次性编码
+_STATISTICS_COLUMNS = (
+    ExamKnowledgeStatistics.id,
+    ExamKnowledgeStatistics.knowledge_point_id,
+    KnowledgePoint.name.label('knowledge_point_name'),
+    Chapter.name.label('chapter_name'),
+    ExamKnowledgeStatistics.total_papers,
+    ExamKnowledgeStatistics.appeared_papers,
+    ExamKnowledgeStatistics.appearance_rate,
+    ExamKnowledgeStatistics.total_questions,
+    ExamKnowledgeStatistics.total_score,
+    ExamKnowledgeStatistics.avg_questions_per_paper,
+    ExamKnowledgeStatistics.avg_score_per_paper,
+    ExamKnowledgeStatistics.max_score_per_paper,
+    ExamKnowledgeStatistics.avg_difficulty,
+    ExamKnowledgeStatistics.importance_score,
+    ExamKnowledgeStatistics.difficulty_distribution,
+    ExamKnowledgeStatistics.question_type_distribution,
+    ExamKnowledgeStatistics.score_type_distribution,
+    ExamKnowledgeStatistics.year,
+    ExamKnowledgeStatistics.exam_type,
+    ExamKnowledgeStatistics.region,
+)
+
+_MAPPING_COLUMNS = (
+    ExamKnowledgeMapping.id,
+    ExamKnowledgeMapping.knowledge_point_id,
+    KnowledgePoint.name.label('knowledge_point_name'),
+    Chapter.name.label('chapter_name'),
+    ExamKnowledgeMapping.question_count,
+    ExamKnowledgeMapping.total_score,
+    ExamKnowledgeMapping.avg_difficulty,
+    ExamKnowledgeMapping.importance_weight,
+    ExamKnowledgeMapping.coverage_rate,
+    ExamKnowledgeMapping.choice_count,
+    ExamKnowledgeMapping.fill_count,
+    ExamKnowledgeMapping.essay_count,
+    ExamKnowledgeMapping.other_count,
+    ExamKnowledgeMapping.choice_score,
+    ExamKnowledgeMapping.fill_score,
+    ExamKnowledgeMapping.essay_score,
+    ExamKnowledgeMapping.other_score,
+)
+
 @exam_knowledge_bp.route('/mapping/create', methods=['POST'])
 @jwt_required()
 def create_mapping():
@@ -154,6 +202,45 @@ def get_knowledge_point_questions(knowledge_point_id: str):
         logger.error(f"获取知识点题目失败: {str(e)}")
         return error_response('获取知识点题目失败', 500)
 
+def _knowledge_statistics_payload(subject_id: str, year: Optional[int], exam_type: Optional[str],
+                                   region: Optional[str], page: int, per_page: int) -> Dict[str, Any]:
+    """查询知识点统计分页数据"""
+    # 构建查询，知识点及其章节名称随统计行在同一条SQL中关联取出
+    query = db.session.query(*_STATISTICS_COLUMNS).outerjoin(
+        KnowledgePoint, KnowledgePoint.id == ExamKnowledgeStatistics.knowledge_point_id
+    ).outerjoin(
+        Chapter, Chapter.id == KnowledgePoint.chapter_id
+    ).filter(ExamKnowledgeStatistics.subject_id == subject_id)
+    if year:
+        query = query.filter(ExamKnowledgeStatistics.year == year)
+    if exam_type:
+        query = query.filter(ExamKnowledgeStatistics.exam_type == exam_type)
+    if region:
+        query = query.filter(ExamKnowledgeStatistics.region == region)
+    
+    # 分页查询，总数在翻到较深的页时使用估计值
+    pagination = query.paginate(
+        page=page, per_page=per_page, error_out=False, count=False
+    )
+    total, total_is_estimate = count_rows(query, page, per_page)
+    pages = (total + per_page - 1) // per_page
+    
+    statistics = [row._asdict() for row in pagination.items]
+    
+    return {
+        'statistics': statistics,
+        'pagination': {
+            'page': page,
+            'per_page': per_page,
+            'total': total,
+            'total_is_estimate': total_is_estimate,
+            'pages': pages,
+            'has_prev': page > 1,
+            'has_next': page < pages
+        }
+    }
+
+
 @exam_knowledge_bp.route('/statistics/<subject_id>', methods=['GET'])
 @jwt_required()
 def get_knowledge_statistics(subject_id: str):
@@ -170,54 +257,12 @@ def get_knowledge_statistics(subject_id: str):
         if per_page > 100:
             per_page = 100
         
-        # 构建查询
-        query = ExamKnowledgeStatistics.query.filter_by(subject_id=subject_id)
-        if year:
-            query = query.filter_by(year=year)
-        if exam_type:
-            query = query.filter_by(exam_type=exam_type)
-        if region:
-            query = query.filter_by(region=region)
-        
-        # 分页查询
-        pagination = query.paginate(
-            page=page, per_page=per_page, error_out=False
+        payload = cached_subject_result(
+            'statistics', subject_id, (year, exam_type, region, page, per_page),
+            lambda: _knowledge_statistics_payload(subject_id, year, exam_type, region, page, per_page)
         )
         
-        statistics = [{
-            'id': s.id,
-            'knowledge_point_id': s.knowledge_point_id,
-            'knowledge_point_name': s.knowledge_point.name if s.knowledge_point else None,
-            'chapter_name': s.knowledge_point.chapter.name if s.knowledge_point and s.knowledge_point.chapter else None,
-            'total_papers': s.total_papers,
-            'appeared_papers': s.appeared_papers,
-            'appearance_rate': s.appearance_rate,
-            'total_questions': s.total_questions,
-            'total_score': s.total_score,
-            'avg_questions_per_paper': s.avg_questions_per_paper,
-            'avg_score_per_paper': s.avg_score_per_paper,
-            'max_score_per_paper': s.max_score_per_paper,
-            'avg_difficulty': s.avg_difficulty,
-            'importance_score': s.importance_score,
-            'difficulty_distribution': s.difficulty_distribution,
-            'question_type_distribution': s.question_type_distribution,
-            'score_type_distribution': s.score_type_distribution,
-            'year': s.year,
-            'exam_type': s.exam_type,
-            'region': s.region
-        } for s in pagination.items]
-        
-        return success_response({
-            'statistics': statistics,
-            'pagination': {
-                'page': page,
-                'per_page': per_page,
-                'total': pagination.total,
-                'pages': pagination.pages,
-                'has_prev': pagination.has_prev,
-                'has_next': pagination.has_next
-            }
-        })
+        return success_response(payload)
         
     except Exception as e:
         logger.error(f"获取知识点统计失败: {str(e)}")
@@ -229,29 +274,15 @@ def get_paper_mappings(exam_paper_id: str):
     """获取试卷的知识点映射关系"""
     try:
         # 获取映射关系
-        mappings = ExamKnowledgeMapping.query.filter_by(
-            exam_paper_id=exam_paper_id
+        rows = db.session.query(*_MAPPING_COLUMNS).outerjoin(
+            KnowledgePoint, KnowledgePoint.id == ExamKnowledgeMapping.knowledge_point_id
+        ).outerjoin(
+            Chapter, Chapter.id == KnowledgePoint.chapter_id
+        ).filter(
+            ExamKnowledgeMapping.exam_paper_id == exam_paper_id
         ).all()
         
-        mapping_data = [{
-            'id': m.id,
-            'knowledge_point_id': m.knowledge_point_id,
-            'knowledge_point_name': m.knowledge_point.name if m.knowledge_point else None,
-            'chapter_name': m.knowledge_point.chapter.name if m.knowledge_point and m.knowledge_point.chapter else None,
-            'question_count': m.question_count,
-            'total_score': m.total_score,
-            'avg_difficulty': m.avg_difficulty,
-            'importance_weight': m.importance_weight,
-            'coverage_rate': m.coverage_rate,
-            'choice_count': m.choice_count,
-            'fill_count': m.fill_count,
-            'essay_count': m.essay_count,
-            'other_count': m.other_count,
-            'choice_score': m.choice_score,
-            'fill_score': m.fill_score,
-            'essay_score': m.essay_score,
-            'other_score': m.other_score
-        } for m in mappings]
+        mapping_data = [row._asdict() for row in rows]
         
         return success_response({
             'exam_paper_id': exam_paper_id,
@@ -283,6 +314,99 @@ def batch_update_mappings(subject_id: str):
         logger.error(f"批量更新映射关系失败: {str(e)}")
         return error_response('批量更新映射关系失败', 500)
 
+def _knowledge_analysis_payload(subject_id: str, year: Optional[int],
+                                 exam_type: Optional[str]) -> Dict[str, Any]:
+    """计算知识点分析报告"""
+    # 构建查询条件
+    filters = [ExamKnowledgeStatistics.subject_id == subject_id]
+    if year:
+        filters.append(ExamKnowledgeStatistics.year == year)
+    if exam_type:
+        filters.append(ExamKnowledgeStatistics.exam_type == exam_type)
+    
+    # 概览计数、平均重要程度和难度分布由数据库一次扫描聚合得出，不再加载全部统计行；
+    # 难度等级为平均难度四舍五入后的1-5级，平均难度为空或0的不计入
+    rate = ExamKnowledgeStatistics.appearance_rate
+    importance = ExamKnowledgeStatistics.importance_score
+    difficulty = ExamKnowledgeStatistics.avg_difficulty
+    difficulty_levels = ('1', '2', '3', '4', '5')
+    (total_knowledge_points, high_count, medium_count, low_count, avg_importance,
+     *difficulty_counts) = db.session.query(
+        func.count(),
+        func.sum(case((rate >= 0.8, 1), else_=0)),
+        func.sum(case((and_(rate >= 0.4, rate < 0.8), 1), else_=0)),
+        func.sum(case((rate < 0.4, 1), else_=0)),
+        func.avg(case((importance != 0, importance))),
+        *(func.sum(case((and_(difficulty >= int(level) - 0.5, difficulty < int(level) + 0.5), 1), else_=0))
+          for level in difficulty_levels)
+    ).filter(*filters).one()
+    
+    if not total_knowledge_points:
+        return {
+            'message': '暂无统计数据',
+            'analysis': {}
+        }
+    
+    difficulty_stats = {level: count or 0 for level, count in zip(difficulty_levels, difficulty_counts)}
+    
+    # 题型分析：JSON分布在Python中合并，只读取这一列
+    total_questions_by_type = {'choice': 0, 'fill': 0, 'essay': 0, 'other': 0}
+    for (distribution,) in db.session.query(
+        ExamKnowledgeStatistics.question_type_distribution
+    ).filter(*filters):
+        if distribution:
+            for qtype, count in distribution.items():
+                if qtype in total_questions_by_type:
+                    total_questions_by_type[qtype] += count
+    
+    # 各类排行只取前10行，知识点随行加载且只取ID和名称两列
+    def top_points(order_by, *criteria):
+        return ExamKnowledgeStatistics.query.options(
+            joinedload(ExamKnowledgeStatistics.knowledge_point).load_only(KnowledgePoint.id, KnowledgePoint.name),
+            raiseload('*')
+        ).filter(*filters, *criteria).order_by(order_by).limit(10).all()
+    
+    top_knowledge_points = {
+        'most_frequent': top_points(func.coalesce(rate, 0).desc()),
+        'most_important': top_points(importance.desc(), importance.isnot(None), importance != 0),
+        'highest_score': top_points(func.coalesce(ExamKnowledgeStatistics.max_score_per_paper, 0).desc())
+    }
+    
+    analysis = {
+        'overview': {
+            'total_knowledge_points': total_knowledge_points,
+            'high_frequency_count': high_count or 0,
+            'medium_frequency_count': medium_count or 0,
+            'low_frequency_count': low_count or 0,
+            'avg_importance_score': round(float(avg_importance or 0), 2)
+        },
+        'frequency_distribution': {
+            'high': high_count or 0,
+            'medium': medium_count or 0,
+            'low': low_count or 0
+        },
+        'difficulty_distribution': difficulty_stats,
+        'question_type_distribution': total_questions_by_type,
+        'top_knowledge_points': {
+            category: [{
+                'knowledge_point_id': s.knowledge_point_id,
+                'knowledge_point_name': s.knowledge_point.name if s.knowledge_point else None,
+                'appearance_rate': s.appearance_rate,
+                'importance_score': s.importance_score,
+                'max_score_per_paper': s.max_score_per_paper
+            } for s in rows]
+            for category, rows in top_knowledge_points.items()
+        }
+    }
+    
+    return {
+        'subject_id': subject_id,
+        'year': year,
+        'exam_type': exam_type,
+        'analysis': analysis
+    }
+
+
 @exam_knowledge_bp.route('/analysis/<subject_id>', methods=['GET'])
 @jwt_required()
 def get_knowledge_analysis(subject_id: str):
@@ -292,86 +416,12 @@ def get_knowledge_analysis(subject_id: str):
         year = request.args.get('year', type=int)
         exam_type = request.args.get('exam_type')
         
-        # 构建查询
-        query = ExamKnowledgeStatistics.query.filter_by(subject_id=subject_id)
-        if year:
-            query = query.filter_by(year=year)
-        if exam_type:
-            query = query.filter_by(exam_type=exam_type)
-        
-        statistics = query.all()
-        
-        if not statistics:
-            return success_response({
-                'message': '暂无统计数据',
-                'analysis': {}
-            })
-        
-        # 计算分析数据
-        total_knowledge_points = len(statistics)
-        high_frequency_points = [s for s in statistics if s.appearance_rate >= 0.8]
-        medium_frequency_points = [s for s in statistics if 0.4 <= s.appearance_rate < 0.8]
-        low_frequency_points = [s for s in statistics if s.appearance_rate < 0.4]
-        
-        # 难度分析
-        difficulty_stats = {'1': 0, '2': 0, '3': 0, '4': 0, '5': 0}
-        for s in statistics:
-            if s.avg_difficulty:
-                level = str(round(s.avg_difficulty))
-                if level in difficulty_stats:
-                    difficulty_stats[level] += 1
-        
-        # 重要程度分析
-        importance_levels = [s.importance_score for s in statistics if s.importance_score]
-        avg_importance = sum(importance_levels) / len(importance_levels) if importance_levels else 0
-        
-        # 题型分析
-        total_questions_by_type = {'choice': 0, 'fill': 0, 'essay': 0, 'other': 0}
-        for s in statistics:
-            if s.question_type_distribution:
-                for qtype, count in s.question_type_distribution.items():
-                    if qtype in total_questions_by_type:
-                        total_questions_by_type[qtype] += count
-        
-        analysis = {
-            'overview': {
-                'total_knowledge_points': total_knowledge_points,
-                'high_frequency_count': len(high_frequency_points),
-                'medium_frequency_count': len(medium_frequency_points),
-                'low_frequency_count': len(low_frequency_points),
-                'avg_importance_score': round(avg_importance, 2)
-            },
-            'frequency_distribution': {
-                'high': len(high_frequency_points),
-                'medium': len(medium_frequency_points),
-                'low': len(low_frequency_points)
-            },
-            'difficulty_distribution': difficulty_stats,
-            'question_type_distribution': total_questions_by_type,
-            'top_knowledge_points': {
-                'most_frequent': sorted(statistics, key=lambda x: x.appearance_rate, reverse=True)[:10],
-                'most_important': sorted([s for s in statistics if s.importance_score], 
-                                       key=lambda x: x.importance_score, reverse=True)[:10],
-                'highest_score': sorted(statistics, key=lambda x: x.max_score_per_paper or 0, reverse=True)[:10]
-            }
-        }
-        
-        # 转换为可序列化的格式
-        for category in analysis['top_knowledge_points']:
-            analysis['top_knowledge_points'][category] = [{
-                'knowledge_point_id': s.knowledge_point_id,
-                'knowledge_point_name': s.knowledge_point.name if s.knowledge_point else None,
-                'appearance_rate': s.appearance_rate,
-                'importance_score': s.importance_score,
-                'max_score_per_paper': s.max_score_per_paper
-            } for s in analysis['top_knowledge_points'][category]]
+        payload = cached_subject_result(
+            'analysis', subject_id, (year, exam_type),
+            lambda: _knowledge_analysis_payload(subject_id, year, exam_type)
+        )
         
-        return success_response({
-            'subject_id': subject_id,
-            'year': year,
-            'exam_type': exam_type,
-            'analysis': analysis
-        })
+        return success_response(payload)
         
     except Exception as e:
         logger.error(f"获取知识点分析失败: {str(e)}")
@@ -14,15 +14,20 @@ License: Apache License 2.0
 
 import os
 import uuid
+import base64
+import hashlib
+import threading
 from datetime import datetime
 from flask import Blueprint, request, jsonify, g, current_app, send_file
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from werkzeug.utils import secure_filename
 from models import ExamPaper, Question, Subject, KnowledgePoint, KnowledgeGraph
-from utils.database import db
-from utils.response import success_response, error_response
+from utils.database import db, count_rows
+from utils.response import success_response, error_response, streamed_list_response
+from utils.validators import parse_tags, validate_pagination_params
 from utils.decorators import admin_required
-from sqlalchemy import desc, func, and_
+from sqlalchemy import desc, func, and_, or_, update
+from sqlalchemy.exc import IntegrityError
 from services.ai_parser import AIParser
 from services.paper_downloader import PaperDownloader
 from services.knowledge_graph_service import KnowledgeGraphService
@@ -30,17 +35,131 @@ from services.vector_database_service import VectorDatabaseService
 
 exam_papers_bp = Blueprint('exam_papers', __name__)
 
+@exam_papers_bp.record_once
+def _init_upload_dir(state):
+    """注册蓝图时创建试卷上传目录，请求中不再重复创建"""
+    upload_dir = os.path.join(state.app.config.get('UPLOAD_FOLDER', 'uploads'), 'exam_papers')
+    os.makedirs(upload_dir, exist_ok=True)
+    state.app.config['EXAM_PAPER_UPLOAD_DIR'] = upload_dir
+
 # 允许的文件类型
 ALLOWED_EXTENSIONS = {'pdf', 'png', 'jpg', 'jpeg', 'gif'}
+_ALLOWED_SUFFIXES = tuple(f'.{ext}' for ext in ALLOWED_EXTENSIONS)
+
+# 试卷列表按列查询，字段与ExamPaper.to_summary_dict一致，不加载解析结果等大字段
+_PAPER_LIST_COLUMNS = ExamPaper.summary_columns()
+
+# 更新接口允许修改的字段，文本字段去除首尾空白
+_PAPER_TEXT_FIELDS = ('title', 'description', 'exam_type', 'region')
+_PAPER_VALUE_FIELDS = ('year', 'total_score', 'duration', 'difficulty_level')
+
+def _paper_row_dict(row) -> dict:
+    """将按_PAPER_LIST_COLUMNS查询的行转换为试卷摘要字典"""
+    paper = row._asdict()
+    paper['tags'] = paper['tags'] or []
+    return paper
+
+# 列表排序键：年份为空的试卷排在最后
+_PAPER_YEAR_KEY = func.coalesce(ExamPaper.year, 0)
+
+def _encode_paper_cursor(year, created_at, paper_id) -> str:
+    """将(年份, 上传时间, ID)编码为不透明游标"""
+    raw = f"{year or 0}|{created_at.isoformat()}|{paper_id}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+def _decode_paper_cursor(cursor: str):
+    """解析试卷列表游标"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8')
+        year, created_at, paper_id = raw.split('|', 2)
+        return int(year), datetime.fromisoformat(created_at), paper_id
+    except Exception:
+        raise ValueError('Invalid cursor')
 
 def allowed_file(filename):
     """检查文件类型是否允许"""
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+    return filename.lower().endswith(_ALLOWED_SUFFIXES)
+
+def _run_parse_task(paper_id: str, auto_generate_kg: bool, app_context):
+    """后台解析试卷，解析完成后按需生成知识图谱"""
+    with app_context():
+        exam_paper = db.session.get(ExamPaper, paper_id)
+        if not exam_paper:
+            return
+        exam_paper.parse_status = 'processing'
+        db.session.commit()
+        
+        try:
+            ai_parser = AIParser()
+            result = ai_parser.parse_exam_paper(exam_paper.id)
+            if not result.get('success'):
+                raise RuntimeError(result.get('error') or 'parse failed')
+            
+            # 解析状态和题目数已由parse_exam_paper在同一事务中提交
+            
+            # 如果启用自动生成知识图谱
+            if auto_generate_kg:
+                try:
+                    # 从试卷内容提取知识点并更新知识图谱
+                    from services.knowledge_graph_service import knowledge_graph_service
+                    from services.vector_database_service import vector_db_service
+                    
+                    # 生成知识图谱（基于学科）
+                    knowledge_graph_service.generate_knowledge_graph(
+                        subject_id=exam_paper.subject_id
+                    )
+                    
+                    # 向量化处理试卷内容
+                    if exam_paper.parse_result and 'content' in exam_paper.parse_result:
+                        content = exam_paper.parse_result['content']
+                        content_chunks = vector_db_service._split_text_into_chunks(content, chunk_size=500, overlap=50)
+                        
+                        metadata = {
+                            'exam_paper_id': str(exam_paper.id),
+                            'title': exam_paper.title,
+                            'year': exam_paper.year,
+                            'exam_type': exam_paper.exam_type,
+                            'region': exam_paper.region,
+                            'tags': exam_paper.tags or [],
+                            'created_at': datetime.utcnow().isoformat()
+                        }
+                        
+                        vector_db_service.add_document_vectors(
+                            document_id=str(exam_paper.id),
+                            document_type='exam_paper',
+                            content_chunks=content_chunks,
+                            metadata=metadata
+                        )
+                    
+                except Exception as kg_error:
+                    current_app.logger.error(f'Failed to generate knowledge graph for paper {exam_paper.id}: {str(kg_error)}')
+            
+        except Exception as parse_error:
+            # 解析失败，更新状态
+            db.session.rollback()
+            exam_paper.parse_status = 'failed'
+            exam_paper.parse_result = {'error': str(parse_error)}
+            db.session.commit()
+            current_app.logger.error(f'Failed to parse exam paper {exam_paper.id}: {str(parse_error)}')
+
+def _start_parse_task(paper_id: str, auto_generate_kg: bool):
+    """启动试卷解析后台任务"""
+    thread = threading.Thread(
+        target=_run_parse_task,
+        args=(paper_id, auto_generate_kg, current_app.app_context)
+    )
+    thread.daemon = True
+    thread.start()
 
 @exam_papers_bp.route('/exam-papers', methods=['GET'])
 @jwt_required()
 def get_exam_papers():
-    """获取试卷列表"""
+    """
+    获取试卷列表
+    
+    按(年份, 上传时间, ID)倒序做键集分页：传入cursor（上一页返回的next_cursor）时
+    从游标位置继续读取，不返回total/pages；未传cursor时兼容page参数
+    """
     try:
         # 从JWT token中获取tenant_id
         current_user_identity = get_jwt_identity()
@@ -48,31 +167,62 @@ def get_exam_papers():
         subject_id = request.args.get('subject_id')
         year = request.args.get('year', type=int)
         exam_type = request.args.get('exam_type')
-        page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 20, type=int)
+        page, per_page, error = validate_pagination_params(
+            request.args.get('page'), request.args.get('per_page')
+        )
+        if error:
+            return error_response(error, 400)
         
-        query = ExamPaper.query.filter_by(tenant_id=tenant_id, is_active=True)
+        filters = [ExamPaper.tenant_id == tenant_id, ExamPaper.is_active == True]
         
         # 筛选条件
         if subject_id:
-            query = query.filter_by(subject_id=subject_id)
+            filters.append(ExamPaper.subject_id == subject_id)
         if year:
-            query = query.filter_by(year=year)
+            filters.append(ExamPaper.year == year)
         if exam_type:
-            query = query.filter_by(exam_type=exam_type)
-        
-        # 分页
-        pagination = query.order_by(desc(ExamPaper.year), desc(ExamPaper.created_at)).paginate(
-            page=page, per_page=per_page, error_out=False
-        )
+            filters.append(ExamPaper.exam_type == exam_type)
+        
+        # 分页：只查询列表字段，行直接转为字典，不构造ORM对象
+        query = db.session.query(*_PAPER_LIST_COLUMNS).filter(*filters)
+        cursor = request.args.get('cursor')
+        if cursor:
+            try:
+                cursor_year, cursor_created_at, cursor_id = _decode_paper_cursor(cursor)
+            except ValueError as e:
+                return error_response(str(e), 400)
+            query = query.filter(or_(
+                _PAPER_YEAR_KEY < cursor_year,
+                and_(_PAPER_YEAR_KEY == cursor_year, or_(
+                    ExamPaper.created_at < cursor_created_at,
+                    and_(ExamPaper.created_at == cursor_created_at, ExamPaper.id < cursor_id)
+                ))
+            ))
+        elif page > 1:
+            query = query.offset((page - 1) * per_page)
+        
+        rows = query.order_by(
+            desc(_PAPER_YEAR_KEY), desc(ExamPaper.created_at), desc(ExamPaper.id)
+        ).limit(per_page + 1).all()
+        has_next = len(rows) > per_page
+        rows = rows[:per_page]
         
         result = {
-            'papers': [paper.to_dict() for paper in pagination.items],
-            'total': pagination.total,
-            'pages': pagination.pages,
-            'current_page': page,
-            'per_page': per_page
+            'papers': [_paper_row_dict(row) for row in rows],
+            'per_page': per_page,
+            'has_next': has_next,
+            'next_cursor': _encode_paper_cursor(rows[-1].year, rows[-1].created_at, rows[-1].id) if has_next else None
         }
+        if not cursor:
+            total, total_is_estimate = count_rows(
+                db.session.query(ExamPaper.id).filter(*filters), page, per_page
+            )
+            result.update({
+                'total': total,
+                'total_is_estimate': total_is_estimate,
+                'pages': (total + per_page - 1) // per_page,
+                'current_page': page
+            })
         
         return success_response(result)
         
@@ -112,11 +262,6 @@ def upload_exam_paper():
         if not all([title, subject_id]):
             return error_response('Title and subject_id are required', 400)
         
-        # 验证学科是否存在
-        subject = Subject.query.filter_by(id=subject_id, tenant_id=tenant_id).first()
-        if not subject:
-            return error_response('Subject not found', 404)
-        
         # 保存文件
         if not file.filename:
             return error_response('Invalid filename', 400)
@@ -125,17 +270,40 @@ def upload_exam_paper():
         file_ext = filename.rsplit('.', 1)[1].lower()
         new_filename = f"{uuid.uuid4().hex}.{file_ext}"
         
-        # 创建上传目录
-        upload_dir = os.path.join(current_app.config.get('UPLOAD_FOLDER', 'uploads'), 'exam_papers')
-        os.makedirs(upload_dir, exist_ok=True)
-        
-        file_path = os.path.join(upload_dir, new_filename)
-        file.save(file_path)
+        file_path = os.path.join(current_app.config['EXAM_PAPER_UPLOAD_DIR'], new_filename)
+        
+        # 分块写入磁盘，同一遍读取中计算内容哈希和文件大小
+        content_hash = hashlib.sha256()
+        file_size = 0
+        with open(file_path, 'wb') as out:
+            while True:
+                chunk = file.stream.read(1 << 20)
+                if not chunk:
+                    break
+                content_hash.update(chunk)
+                file_size += len(chunk)
+                out.write(chunk)
+        content_hash = content_hash.hexdigest()
+        
+        # 学科校验与内容去重合并为一次查询：学科不属于当前租户时无结果行；
+        # 同一租户已上传过相同内容的试卷时直接返回已有记录，不重复解析
+        row = db.session.query(Subject.id, ExamPaper).outerjoin(
+            ExamPaper, and_(
+                ExamPaper.tenant_id == Subject.tenant_id,
+                ExamPaper.content_hash == content_hash,
+                ExamPaper.is_active == True
+            )
+        ).filter(Subject.id == subject_id, Subject.tenant_id == tenant_id).first()
+        if row is None:
+            os.remove(file_path)
+            return error_response('Subject not found', 404)
+        existing_paper = row[1]
+        if existing_paper:
+            os.remove(file_path)
+            return success_response({**existing_paper.to_dict(), 'duplicate': True})
         
         # 处理标签
-        tags_list = []
-        if tags:
-            tags_list = [tag.strip() for tag in tags.split(',') if tag.strip()]
+        tags_list = list(parse_tags(tags)) if tags else []
         
         # 创建试卷记录
         exam_paper = ExamPaper(
@@ -149,66 +317,28 @@ def upload_exam_paper():
             tags=tags_list,
             file_path=file_path,
             file_type=file_ext,
-            file_size=os.path.getsize(file_path)
+            file_size=file_size,
+            content_hash=content_hash
         )
         
+        # flush后即可取得ID和默认值，在提交前生成响应数据，
+        # 避免提交后对象过期而再次查询
+        # 查询之后学科被并发删除时由subject_id外键拦截，同样返回404
         db.session.add(exam_paper)
-        db.session.commit()
-        
-        # 启动AI解析任务
         try:
-            ai_parser = AIParser()
-            ai_parser.parse_exam_paper(exam_paper.id)
-            
-            # 更新解析状态
-            exam_paper.parse_status = 'completed'
+            db.session.flush()
+            paper_id = exam_paper.id
+            paper_data = exam_paper.to_dict()
             db.session.commit()
-            
-            # 如果启用自动生成知识图谱
-            if auto_generate_kg:
-                try:
-                    # 从试卷内容提取知识点并更新知识图谱
-                    from services.knowledge_graph_service import knowledge_graph_service
-                    from services.vector_database_service import vector_db_service
-                    
-                    # 生成知识图谱（基于学科）
-                    knowledge_graph_service.generate_knowledge_graph(
-                        subject_id=exam_paper.subject_id
-                    )
-                    
-                    # 向量化处理试卷内容
-                    if exam_paper.parse_result and 'content' in exam_paper.parse_result:
-                        content = exam_paper.parse_result['content']
-                        content_chunks = vector_db_service._split_text_into_chunks(content, chunk_size=500, overlap=50)
-                        
-                        metadata = {
-                            'exam_paper_id': str(exam_paper.id),
-                            'title': exam_paper.title,
-                            'year': exam_paper.year,
-                            'exam_type': exam_paper.exam_type,
-                            'region': exam_paper.region,
-                            'tags': exam_paper.tags or [],
-                            'created_at': datetime.utcnow().isoformat()
-                        }
-                        
-                        vector_db_service.add_document_vectors(
-                            document_id=str(exam_paper.id),
-                            document_type='exam_paper',
-                            content_chunks=content_chunks,
-                            metadata=metadata
-                        )
-                    
-                except Exception as kg_error:
-                    current_app.logger.error(f'Failed to generate knowledge graph for paper {exam_paper.id}: {str(kg_error)}')
-            
-        except Exception as parse_error:
-            # 解析失败，更新状态
-            exam_paper.parse_status = 'failed'
-            exam_paper.parse_result = {'error': str(parse_error)}
-            db.session.commit()
-            current_app.logger.error(f'Failed to parse exam paper {exam_paper.id}: {str(parse_error)}')
+        except IntegrityError:
+            db.session.rollback()
+            os.remove(file_path)
+            return error_response('Subject not found', 404)
+        
+        # 启动AI解析后台任务，客户端通过/parse-status查询解析进度
+        _start_parse_task(paper_id, auto_generate_kg)
         
-        return success_response(exam_paper.to_dict())
+        return success_response(paper_data)
         
     except Exception as e:
         return error_response(f'Failed to upload exam paper: {str(e)}', 500)
@@ -267,35 +397,26 @@ def update_exam_paper(paper_id):
         tenant_id = g.get('tenant_id')
         data = request.get_json()
         
-        paper = ExamPaper.query.filter_by(
-            id=paper_id, tenant_id=tenant_id, is_active=True
-        ).first()
+        # 更新字段，updated_at由模型的onupdate在UPDATE语句中自动设置
+        values = {field: data[field].strip() for field in _PAPER_TEXT_FIELDS if field in data}
+        values.update({field: data[field] for field in _PAPER_VALUE_FIELDS if field in data})
         
-        if not paper:
+        criteria = (ExamPaper.id == paper_id, ExamPaper.tenant_id == tenant_id, ExamPaper.is_active == True)
+        if values:
+            # 单条UPDATE ... RETURNING完成校验、更新和回读，不预先加载试卷
+            row = db.session.execute(
+                update(ExamPaper).where(*criteria).values(**values).returning(*_PAPER_LIST_COLUMNS)
+            ).first()
+        else:
+            row = db.session.query(*_PAPER_LIST_COLUMNS).filter(*criteria).first()
+        
+        if row is None:
+            db.session.rollback()
             return error_response('Exam paper not found', 404)
         
-        # 更新字段
-        if 'title' in data:
-            paper.title = data['title'].strip()
-        if 'description' in data:
-            paper.description = data['description'].strip()
-        if 'year' in data:
-            paper.year = data['year']
-        if 'exam_type' in data:
-            paper.exam_type = data['exam_type'].strip()
-        if 'region' in data:
-            paper.region = data['region'].strip()
-        if 'total_score' in data:
-            paper.total_score = data['total_score']
-        if 'duration' in data:
-            paper.duration = data['duration']
-        if 'difficulty_level' in data:
-            paper.difficulty_level = data['difficulty_level']
-        
-        paper.updated_at = datetime.utcnow()
         db.session.commit()
         
-        return success_response(paper.to_dict())
+        return success_response(_paper_row_dict(row))
         
     except Exception as e:
         return error_response(f'Failed to update exam paper: {str(e)}', 500)
@@ -307,16 +428,17 @@ def delete_exam_paper(paper_id):
     try:
         tenant_id = g.get('tenant_id')
         
-        paper = ExamPaper.query.filter_by(
-            id=paper_id, tenant_id=tenant_id, is_active=True
-        ).first()
+        # 软删除：单条UPDATE，按影响行数判断试卷是否存在
+        result = db.session.execute(
+            update(ExamPaper)
+            .where(ExamPaper.id == paper_id, ExamPaper.tenant_id == tenant_id, ExamPaper.is_active == True)
+            .values(is_active=False)
+        )
         
-        if not paper:
+        if result.rowcount == 0:
+            db.session.rollback()
             return error_response('Exam paper not found', 404)
         
-        # 软删除
-        paper.is_active = False
-        paper.updated_at = datetime.utcnow()
         db.session.commit()
         
         return success_response({'message': 'Exam paper deleted successfully'})
@@ -338,11 +460,12 @@ def get_paper_questions(paper_id):
         if not paper:
             return error_response('Exam paper not found', 404)
         
+        # 按批读取题目并逐条编码输出，大试卷也只在内存中保留一批题目
         questions = Question.query.filter_by(
             exam_paper_id=paper_id, is_active=True
-        ).order_by(Question.question_number).all()
+        ).order_by(Question.question_number).yield_per(100)
         
-        return success_response([q.to_dict() for q in questions])
+        return streamed_list_response(q.to_dict() for q in questions)
         
     except Exception as e:
         return error_response(f'Failed to get paper questions: {str(e)}', 500)
@@ -371,18 +494,25 @@ def link_question_knowledge_points(paper_id, question_id):
         if not question:
             return error_response('Question not found', 404)
         
-        # 验证知识点
-        valid_points = KnowledgePoint.query.filter(
-            KnowledgePoint.id.in_(knowledge_point_ids),
-            KnowledgePoint.is_active == True
-        ).all()
+        # 题目只关联一个知识点（knowledge_point_id），列表形式的参数仅为兼容保留
+        knowledge_point_ids = list(dict.fromkeys(knowledge_point_ids))
+        if len(knowledge_point_ids) != 1:
+            return error_response('Exactly one knowledge point is required', 400)
+        knowledge_point_id = knowledge_point_ids[0]
+        
+        # 验证知识点：只判断是否存在，不加载知识点记录
+        exists = db.session.query(
+            db.session.query(KnowledgePoint.id).filter(
+                KnowledgePoint.id == knowledge_point_id,
+                KnowledgePoint.is_active == True
+            ).exists()
+        ).scalar()
         
-        if len(valid_points) != len(knowledge_point_ids):
-            return error_response('Some knowledge points not found', 400)
+        if not exists:
+            return error_response('Knowledge point not found', 400)
         
         # 更新关联
-        question.knowledge_points = knowledge_point_ids
-        question.updated_at = datetime.utcnow()
+        question.knowledge_point_id = knowledge_point_id
         db.session.commit()
         
         return success_response(question.to_dict())
@@ -401,18 +531,16 @@ def download_subject_papers(subject_id):
         data = request.get_json()
         years = data.get('years', 10)  # 默认下载近10年
         
-        # 验证学科
-        subject = Subject.query.filter_by(id=subject_id, tenant_id=tenant_id).first()
-        if not subject:
-            return error_response('Subject not found', 404)
-        
-        # 创建下载器实例并开始下载
+        # 创建下载器实例并开始下载，学科归属由下载器在读取学科信息时一并校验
         downloader = PaperDownloader()
         result = downloader.download_subject_papers(subject_id, years, tenant_id)
         
+        if result.get('error_code') == 'SUBJECT_NOT_FOUND':
+            return error_response('Subject not found', 404)
+        
         if result['success']:
             return success_response({
-                'message': f'Successfully downloaded papers for {subject.name}',
+                'message': f'Successfully downloaded papers for {result["subject_name"]}',
                 'subject_name': result['subject_name'],
                 'years': years,
                 'total_found': result['total_found'],
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+AI智能学习系统 - API接口 - exam_stream.py
+
+Description:
+    考试会话状态推送（Server-Sent Events）的ASGI实现。
+    推送连接可能持续数小时，经a2wsgi交给Flask处理时每个连接都会占住线程池中的
+    一个线程；部署在ASGI服务器下时由本模块在事件循环中直接订阅Redis，
+    只有鉴权和读取会话快照短暂借用线程，推送连接不再占用处理请求的线程。
+    这一路径不经过Flask，app.py中CORS(app)和before_request钩子都不会执行，
+    跨域响应头由本模块按同一策略（Flask-CORS默认配置：允许任意来源，
+    回显请求的Origin并附带Vary: Origin，不允许携带凭据）自行添加，
+    推送和错误响应都带有这些头；携带Authorization头的跨域请求先发送的OPTIONS预检
+    不被拦截，仍由Flask-CORS处理。修改app.py中的CORS配置时需同步修改_cors_headers。
+
+Author: Chang Xinglong
+Date: 2025-08-30
+Version: 1.0.0
+License: Apache License 2.0
+"""
+
+import asyncio
+import logging
+import re
+from typing import Dict, List, Optional, Tuple
+
+import orjson
+import redis
+from flask_jwt_extended import decode_token
+from jwt.exceptions import PyJWTError, ExpiredSignatureError
+
+from services.exam_service import ExamService, session_event_channel
+from utils.redis_client import get_async_redis
+
+logger = logging.getLogger(__name__)
+
+# 推送连接的保活间隔与最长持续时间（秒）
+STREAM_HEARTBEAT_SECONDS = 15
+STREAM_MAX_SECONDS = 4 * 3600
+KEEP_ALIVE_MESSAGE = b': keep-alive\n\n'
+
+# 与Flask蓝图中的路由一致：/api/exam/sessions/<session_id>/stream
+_STREAM_PATH = re.compile(r'^/api/exam/sessions/(\d+)/stream$')
+
+_SSE_HEADERS = [
+    (b'content-type', b'text/event-stream'),
+    (b'cache-control', b'no-store'),
+    # 禁止反向代理缓冲推送内容
+    (b'x-accel-buffering', b'no'),
+]
+
+def _cors_headers(scope) -> List[Tuple[bytes, bytes]]:
+    """按app.py中CORS(app)的默认策略生成跨域响应头：回显请求的Origin"""
+    origin = dict(scope['headers']).get(b'origin')
+    if not origin:
+        return []
+    return [(b'access-control-allow-origin', origin), (b'vary', b'Origin')]
+
+def sse_message(payload: bytes) -> bytes:
+    """将已编码的JSON事件包装为Server-Sent Events消息"""
+    return b'data: ' + payload + b'\n\n'
+
+def is_completed_event(payload: bytes) -> bool:
+    """判断事件是否为交卷事件，推送连接收到后关闭"""
+    return orjson.loads(payload).get('event') == 'completed'
+
+async def _wait_disconnect(receive) -> None:
+    """等待客户端断开连接"""
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+class ExamStreamMiddleware:
+    """
+    ASGI中间件：在事件循环中处理考试状态推送请求，其余请求交给被包装的应用
+
+    鉴权与Flask路由保持一致（Authorization头中的access token），
+    JWT错误响应与应用级注册的JWT回调一致
+    """
+
+    def __init__(self, app, flask_app):
+        self.app = app
+        self.flask_app = flask_app
+        self.exam_service = ExamService()
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http' and scope['method'] == 'GET':
+            match = _STREAM_PATH.match(scope['path'])
+            if match:
+                await self._stream(int(match.group(1)), scope, receive, send)
+                return
+        await self.app(scope, receive, send)
+
+    def _load_snapshot(self, session_id: int, authorization: str) -> Tuple[int, Dict, bool]:
+        """
+        在线程中完成鉴权并读取会话快照
+
+        Returns:
+            Tuple[int, Dict, bool]: (状态码, 快照事件或错误响应体, 考试是否已结束)
+        """
+        scheme, _, token = authorization.partition(' ')
+        if scheme.lower() != 'bearer' or not token:
+            return 401, {'error': 'Authorization token is required'}, True
+
+        with self.flask_app.app_context():
+            try:
+                claims = decode_token(token)
+            except ExpiredSignatureError:
+                return 401, {'error': 'Token has expired'}, True
+            except PyJWTError:
+                return 422, {'error': 'Invalid token'}, True
+            if claims.get('type') != 'access':
+                return 422, {'error': 'Invalid token'}, True
+
+            identity = claims.get(self.flask_app.config.get('JWT_IDENTITY_CLAIM', 'sub'))
+            user_id = identity['user_id'] if isinstance(identity, dict) else identity
+            result = self.exam_service.get_stream_snapshot(session_id, str(user_id))
+
+        if result is None:
+            return 404, {'success': False, 'code': 404, 'message': '考试会话不存在'}, True
+        snapshot, finished = result
+        return 200, snapshot, finished
+
+    async def _stream(self, session_id: int, scope, receive, send):
+        headers = dict(scope['headers'])
+        authorization = headers.get(b'authorization', b'').decode('latin-1')
+
+        # 先订阅再读取快照，读取期间发布的事件不会丢失
+        pubsub = get_async_redis(self.flask_app.config['REDIS_URL']).pubsub(ignore_subscribe_messages=True)
+        try:
+            try:
+                await pubsub.subscribe(session_event_channel(session_id))
+            except redis.RedisError as e:
+                logger.warning(f"考试状态推送订阅失败: {e}")
+                await self._send_json(send, scope, 503, {'success': False, 'code': 503, 'message': '状态推送暂不可用'})
+                return
+
+            code, body, finished = await asyncio.to_thread(self._load_snapshot, session_id, authorization)
+            if code != 200:
+                await self._send_json(send, scope, code, body)
+                return
+
+            await send({'type': 'http.response.start', 'status': 200,
+                        'headers': _SSE_HEADERS + _cors_headers(scope)})
+            await send({'type': 'http.response.body', 'body': sse_message(orjson.dumps(body)),
+                        'more_body': not finished})
+            if finished:
+                return
+
+            relay = asyncio.ensure_future(self._relay(pubsub, send))
+            disconnect = asyncio.ensure_future(_wait_disconnect(receive))
+            done, pending = await asyncio.wait({relay, disconnect}, return_when=asyncio.FIRST_COMPLETED)
+            for task in pending:
+                task.cancel()
+            if relay in done and relay.exception() is not None:
+                # Redis连接中断时结束推送，客户端的EventSource会自动重连
+                logger.warning(f"考试状态推送中断: {relay.exception()}")
+                await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+        finally:
+            await pubsub.reset()
+
+    async def _relay(self, pubsub, send):
+        """转发会话事件直到交卷或达到最长持续时间，空闲时发送注释行保活"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + STREAM_MAX_SECONDS
+        while loop.time() < deadline:
+            message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=STREAM_HEARTBEAT_SECONDS)
+            if message is None:
+                await send({'type': 'http.response.body', 'body': KEEP_ALIVE_MESSAGE, 'more_body': True})
+                continue
+            await send({'type': 'http.response.body', 'body': sse_message(message['data']), 'more_body': True})
+            if is_completed_event(message['data']):
+                break
+        await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+
+    @staticmethod
+    async def _send_json(send, scope, code: int, body: Optional[Dict]):
+        await send({'type': 'http.response.start', 'status': code,
+                    'headers': [(b'content-type', b'application/json')] + _cors_headers(scope)})
+        await send({'type': 'http.response.body', 'body': orjson.dumps(body)})
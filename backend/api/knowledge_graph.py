@@ -15,28 +15,95 @@ License: Apache License 2.0
 from flask import Blueprint, request, jsonify, g
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from utils.decorators import admin_required
-from models import Subject, Chapter, KnowledgePoint, SubKnowledgePoint, KnowledgeGraph, ExamPaper, Question
+from models import Subject, Chapter, KnowledgePoint, SubKnowledgePoint, KnowledgeGraph, ExamPaper, Question, QuestionType
 from services.knowledge_graph_service import knowledge_graph_service
 from services.mastery_classification_service import mastery_classification_service
+from services.subject_cache import get_subject
+from utils.cache import VersionedCache
 from utils.database import db
-from utils.response import success_response, error_response
+from utils.response import (
+    success_response, error_response, encoded_success_response, streamed_list_response, encode_json
+)
+from utils.validators import parse_tags
 from utils.decorators import admin_required
-from sqlalchemy import desc, func, and_
+from sqlalchemy import desc, func, and_, or_, select, inspect, update
+from sqlalchemy.orm import contains_eager, joinedload
 import json
+import threading
+from cachetools import LRUCache
+from collections import defaultdict
 from datetime import datetime
 
 from sqlalchemy.orm.attributes import flag_modified
 
 knowledge_graph_bp = Blueprint('knowledge_graph', __name__)
 
+@knowledge_graph_bp.before_request
+def load_identity():
+    """
+    每个请求只读取一次JWT身份，写入g.tenant_id和g.user_id
+    
+    应用级load_tenant已校验过请求中的token，这里直接读取其结果；
+    未携带token时不设置身份，由各视图的jwt_required返回401
+    """
+    try:
+        identity = get_jwt_identity()
+    except RuntimeError:
+        identity = None
+    if not isinstance(identity, dict):
+        identity = {}
+    g.tenant_id = identity.get('tenant_id') or g.get('tenant_id')
+    g.user_id = identity.get('user_id')
+
+# 图谱序列化结果按(图谱ID, updated_at)缓存，图谱任何修改都会刷新updated_at，旧条目自然不再命中
+_graph_json_cache = LRUCache(maxsize=512)
+_graph_cache_lock = threading.Lock()
+
+# 按学科缓存学科图谱查找的编码结果（按年份、图谱类型区分）；
+# 本模块修改图谱后使学科缓存失效，其他途径的修改最多延迟TTL后可见
+_subject_graph_cache = VersionedCache('subject_graph', maxsize=1024, ttl=60)
+
+def _invalidate_subject_graphs(*subject_ids):
+    """学科下的图谱新增或修改后使其查找缓存失效"""
+    _subject_graph_cache.invalidate(*subject_ids)
+
+# 列表接口每批加载并编码的图谱数
+_GRAPH_BATCH_SIZE = 100
+
+def _encoded_graphs(graph_keys):
+    """
+    按(图谱ID, updated_at)列表依次产出各图谱编码后的JSON
+    
+    只有缓存未命中的图谱才加载整行并序列化，命中时不读取nodes/edges等大字段；
+    按批处理，同一时刻只有一批图谱对象在内存中
+    """
+    for start in range(0, len(graph_keys), _GRAPH_BATCH_SIZE):
+        batch = graph_keys[start:start + _GRAPH_BATCH_SIZE]
+        with _graph_cache_lock:
+            encoded = {key: _graph_json_cache.get(key) for key in batch}
+        
+        missing = [graph_id for (graph_id, _), data in encoded.items() if data is None]
+        if missing:
+            for kg in KnowledgeGraph.query.filter(KnowledgeGraph.id.in_(missing)):
+                key = (kg.id, kg.updated_at)
+                data = encode_json(kg.to_dict())
+                encoded[key] = data
+                with _graph_cache_lock:
+                    _graph_json_cache[key] = data
+        
+        # 两次查询之间图谱被修改时以最新版本为准
+        latest = {graph_id: data for (graph_id, _), data in encoded.items() if data is not None}
+        for graph_id, _ in batch:
+            if graph_id in latest:
+                yield latest[graph_id]
+
 @knowledge_graph_bp.route('/knowledge-graph', methods=['GET'])
 @jwt_required()
 def get_knowledge_graphs():
     """获取知识图谱列表"""
     try:
         # 从JWT token中获取tenant_id
-        current_user_identity = get_jwt_identity()
-        tenant_id = current_user_identity.get('tenant_id')
+        tenant_id = g.tenant_id
         
         # 获取查询参数
         subject_id = request.args.get('subject_id')
@@ -48,7 +115,7 @@ def get_knowledge_graphs():
         
         if subject_id:
             # 验证学科是否存在且属于当前租户
-            subject = Subject.query.filter_by(id=subject_id, tenant_id=tenant_id).first()
+            subject = get_subject(subject_id, tenant_id)
             if not subject:
                 return error_response('Subject not found', 404)
             query = query.filter_by(subject_id=subject_id)
@@ -59,13 +126,12 @@ def get_knowledge_graphs():
         if graph_type:
             query = query.filter_by(graph_type=graph_type)
         
-        # 获取知识图谱列表
-        knowledge_graphs = query.order_by(desc(KnowledgeGraph.created_at)).all()
-        
-        # 转换为字典格式
-        result = [kg.to_dict() for kg in knowledge_graphs]
+        # 先只取图谱ID和更新时间，再从缓存取各图谱的序列化结果
+        graph_keys = [tuple(row) for row in query.with_entities(
+            KnowledgeGraph.id, KnowledgeGraph.updated_at
+        ).order_by(desc(KnowledgeGraph.created_at))]
         
-        return success_response(result)
+        return streamed_list_response(_encoded_graphs(graph_keys), encoded=True)
         
     except Exception as e:
         return error_response(f'Failed to get knowledge graphs: {str(e)}', 500)
@@ -75,44 +141,56 @@ def get_knowledge_graphs():
 def get_subject_knowledge_graph(id_param):
     """获取学科知识图谱或单个知识图谱"""
     try:
-        # 尝试按图谱ID获取
-        knowledge_graph = KnowledgeGraph.query.filter_by(id=id_param, is_active=True).first()
-        if knowledge_graph:
-            current_user_identity = get_jwt_identity()
-            tenant_id = current_user_identity.get('tenant_id')
-            subject = Subject.query.filter_by(id=knowledge_graph.subject_id, tenant_id=tenant_id).first()
-            if not subject:
-                return error_response('Access denied to this knowledge graph', 403)
-            return success_response(knowledge_graph.to_dict())
+        tenant_id = g.tenant_id
+        
+        # 图谱ID和学科ID都是UUID，无法按格式区分；一次查询同时按两种含义解析：
+        # id_param为图谱ID时返回(所属学科, 图谱)，为学科ID时返回(学科, None)
+        graph_subject_id = db.session.query(KnowledgeGraph.subject_id).filter(
+            KnowledgeGraph.id == id_param, KnowledgeGraph.is_active == True
+        ).scalar_subquery()
+        rows = db.session.query(Subject, KnowledgeGraph).outerjoin(
+            KnowledgeGraph, and_(
+                KnowledgeGraph.subject_id == Subject.id,
+                KnowledgeGraph.id == id_param,
+                KnowledgeGraph.is_active == True
+            )
+        ).filter(
+            or_(Subject.id == id_param, Subject.id == graph_subject_id)
+        ).all()
+        
+        # 优先按图谱ID处理
+        for subject, knowledge_graph in rows:
+            if knowledge_graph is not None:
+                if subject.tenant_id != tenant_id:
+                    return error_response('Access denied to this knowledge graph', 403)
+                return success_response(knowledge_graph.to_dict())
 
         # 如果不是图谱ID，则按学科ID处理
         subject_id = id_param
-        current_user_identity = get_jwt_identity()
-        tenant_id = current_user_identity.get('tenant_id')
         year = request.args.get('year', datetime.now().year, type=int)
         graph_type = request.args.get('type', 'exam_scope')
 
-        subject = Subject.query.filter_by(id=subject_id, tenant_id=tenant_id).first()
-        if not subject:
+        subject = next((subject for subject, _ in rows if subject.id == subject_id), None)
+        if not subject or subject.tenant_id != tenant_id:
             return error_response('Knowledge graph or Subject not found', 404)
 
+        cache_key = _subject_graph_cache.key(subject_id, (year, graph_type))
+        cached = _subject_graph_cache.get(cache_key)
+        if cached is not None:
+            return encoded_success_response(cached)
+
         # 查找现有的知识图谱
         existing_graph = KnowledgeGraph.query.filter_by(
             subject_id=subject_id, year=year, graph_type=graph_type, is_active=True
         ).first()
         
         if existing_graph:
-            return success_response(existing_graph.to_dict())
+            encoded = encode_json(existing_graph.to_dict())
+            _subject_graph_cache.set(cache_key, encoded)
+            return encoded_success_response(encoded)
         
-        # 根据图谱类型生成不同的图谱数据
-        if graph_type == 'exam_scope':
-            graph_data = generate_exam_scope_graph(subject_id, year)
-        elif graph_type == 'full_knowledge':
-            graph_data = generate_knowledge_graph(subject_id, year)
-        elif graph_type == 'mastery_level':
-            graph_data = generate_mastery_level_graph(subject_id, year)
-        else:
-            graph_data = generate_knowledge_graph(subject_id, year)
+        # 根据图谱类型生成不同的图谱数据，未知类型生成完整知识图谱
+        graph_data = _GRAPH_BUILDERS.get(graph_type, generate_knowledge_graph)(subject, year)
         
         # 保存生成的图谱
         new_graph = KnowledgeGraph(
@@ -140,9 +218,8 @@ def create_knowledge_node():
     """创建知识点节点"""
     try:
         # 从JWT token中获取用户信息
-        current_user_identity = get_jwt_identity()
-        tenant_id = current_user_identity.get('tenant_id')
-        user_id = current_user_identity.get('user_id')
+        tenant_id = g.tenant_id
+        user_id = g.user_id
         
         data = request.get_json()
         subject_id = data.get('subject_id')
@@ -156,7 +233,7 @@ def create_knowledge_node():
             return error_response('Missing required fields: subject_id, title, content', 400)
         
         # 验证学科是否存在
-        subject = Subject.query.filter_by(id=subject_id, tenant_id=tenant_id).first()
+        subject = get_subject(subject_id, tenant_id)
         if not subject:
             return error_response('Subject not found', 404)
         
@@ -172,8 +249,7 @@ def create_knowledge_node():
         
         # 处理标签
         if tags:
-            tag_list = [tag.strip() for tag in tags.split(',') if tag.strip()]
-            knowledge_point.tags = ','.join(tag_list)
+            knowledge_point.tags = ','.join(parse_tags(tags))
         
         db.session.add(knowledge_point)
         db.session.commit()
@@ -197,8 +273,7 @@ def create_knowledge_node():
 def update_knowledge_node(node_id):
     """更新知识图谱节点"""
     try:
-        current_user_identity = get_jwt_identity()
-        tenant_id = current_user_identity.get('tenant_id')
+        tenant_id = g.tenant_id
         
         data = request.get_json()
         
@@ -255,10 +330,15 @@ def update_knowledge_node(node_id):
         
         knowledge_graph.updated_at = datetime.utcnow()
         
+        previous_subject_id = inspect(knowledge_graph).attrs.subject_id.history.deleted
+        
+        # flush后在提交前生成响应数据，避免提交后对象过期而再次查询
+        db.session.flush()
+        graph_data = knowledge_graph.to_dict()
         db.session.commit()
-        db.session.refresh(knowledge_graph)
+        _invalidate_subject_graphs(graph_data['subject_id'], *previous_subject_id)
         
-        return success_response(knowledge_graph.to_dict(), 'Knowledge node updated successfully')
+        return success_response(graph_data, 'Knowledge node updated successfully')
         
     except Exception as e:
         db.session.rollback()
@@ -269,23 +349,23 @@ def update_knowledge_node(node_id):
 def delete_knowledge_node(node_id):
     """删除知识图谱节点"""
     try:
-        # 查找AI内容节点
-        knowledge_graph = KnowledgeGraph.query.filter_by(
-            id=node_id,
-            is_active=True
-        ).first()
-        
-        if not knowledge_graph:
+        # 软删除，单条UPDATE ... RETURNING完成查找和更新，updated_at由模型的onupdate设置
+        subject_id = db.session.execute(
+            update(KnowledgeGraph)
+            .where(KnowledgeGraph.id == node_id, KnowledgeGraph.is_active == True)
+            .values(is_active=False)
+            .returning(KnowledgeGraph.subject_id)
+        ).scalar()
+        
+        if subject_id is None:
+            db.session.rollback()
             return error_response('Knowledge graph node not found', 404)
         
-        # 软删除
-        knowledge_graph.is_active = False
-        knowledge_graph.updated_at = datetime.utcnow()
-        
         db.session.commit()
+        _invalidate_subject_graphs(subject_id)
         
         return success_response({
-            'id': knowledge_graph.id,
+            'id': node_id,
             'message': 'Knowledge node deleted successfully'
         })
         
@@ -300,12 +380,11 @@ def create_knowledge_graph(subject_id):
     """创建或更新知识图谱"""
     try:
         # 从JWT token中获取tenant_id
-        current_user_identity = get_jwt_identity()
-        tenant_id = current_user_identity.get('tenant_id')
+        tenant_id = g.tenant_id
         data = request.get_json()
         
         # 验证学科
-        subject = Subject.query.filter_by(id=subject_id, tenant_id=tenant_id).first()
+        subject = get_subject(subject_id, tenant_id)
         if not subject:
             return error_response('Subject not found', 404)
         
@@ -324,6 +403,7 @@ def create_knowledge_graph(subject_id):
             existing_graph.updated_at = datetime.utcnow()
             
             db.session.commit()
+            _invalidate_subject_graphs(subject_id)
             return success_response(existing_graph.to_dict())
         else:
             # 创建新图谱
@@ -339,6 +419,7 @@ def create_knowledge_graph(subject_id):
             
             db.session.add(new_graph)
             db.session.commit()
+            _invalidate_subject_graphs(subject_id)
             
             return success_response(new_graph.to_dict()), 201
         
@@ -357,12 +438,14 @@ def get_knowledge_point_questions(point_id):
         if not knowledge_point:
             return error_response('Knowledge point not found', 404)
         
-        # 查找相关题目
-        questions = Question.query.join(ExamPaper).filter(
+        # 查找相关题目，所属试卷直接取自已JOIN的行，不再逐题查询
+        questions = Question.query.join(ExamPaper).options(
+            contains_eager(Question.exam_paper)
+        ).filter(
             ExamPaper.tenant_id == tenant_id,
             ExamPaper.is_active == True,
             Question.is_active == True,
-            Question.knowledge_points.contains([point_id])
+            Question.knowledge_point_id == point_id
         ).order_by(desc(ExamPaper.year)).all()
         
         result = []
@@ -398,11 +481,13 @@ def get_question_knowledge_points(question_id):
         if not question:
             return error_response('Question not found', 404)
         
-        # 获取关联的知识点详情
+        # 获取关联的知识点详情（题目通过knowledge_point_id关联单个知识点）
         knowledge_points = []
-        if question.knowledge_points:
-            points = KnowledgePoint.query.filter(
-                KnowledgePoint.id.in_(question.knowledge_points),
+        if question.knowledge_point_id:
+            points = KnowledgePoint.query.options(
+                joinedload(KnowledgePoint.chapter)
+            ).filter(
+                KnowledgePoint.id == question.knowledge_point_id,
                 KnowledgePoint.is_active == True
             ).all()
             
@@ -446,38 +531,55 @@ def get_exam_paper_star_map(paper_id):
         if not paper:
             return error_response('Exam paper not found', 404)
         
-        # 获取试卷中所有题目的知识点
-        questions = Question.query.filter(
-            Question.paper_id == paper_id,
-            Question.is_active == True
-        ).all()
+        # 只取统计所需的列，按元组分批遍历，不装配Question对象
+        rows = db.session.execute(
+            select(
+                Question.knowledge_point_id, Question.score, Question.difficulty, QuestionType.name
+            ).outerjoin(
+                QuestionType, QuestionType.id == Question.question_type_id
+            ).where(
+                Question.exam_paper_id == paper_id,
+                Question.is_active == True
+            ).execution_options(yield_per=1000)
+        )
         
-        # 统计知识点分布
+        # 统计知识点分布，统一以字符串ID为键，与后面按知识点取统计时的键一致；
+        # 难度只累计总和，题型直接去重，不保存逐题列表
         knowledge_point_stats = {}
-        all_knowledge_points = set()
+        question_count = 0
+        
+        for kp_id, score, difficulty, question_type in rows:
+            question_count += 1
+            if kp_id:
+                stats = knowledge_point_stats.get(str(kp_id))
+                if stats is None:
+                    stats = knowledge_point_stats[str(kp_id)] = {
+                        'question_count': 0,
+                        'total_score': 0,
+                        'difficulty_sum': 0,
+                        'question_types': set()
+                    }
+                
+                stats['question_count'] += 1
+                stats['total_score'] += score or 0
+                stats['difficulty_sum'] += difficulty or 0
+                stats['question_types'].add(question_type or '')
         
-        for question in questions:
-            if question.knowledge_points:
-                for kp_id in question.knowledge_points:
-                    all_knowledge_points.add(kp_id)
-                    if kp_id not in knowledge_point_stats:
-                        knowledge_point_stats[kp_id] = {
-                            'question_count': 0,
-                            'total_score': 0,
-                            'difficulties': [],
-                            'question_types': []
-                        }
-                    
-                    knowledge_point_stats[kp_id]['question_count'] += 1
-                    knowledge_point_stats[kp_id]['total_score'] += question.score or 0
-                    knowledge_point_stats[kp_id]['difficulties'].append(question.difficulty or 0)
-                    knowledge_point_stats[kp_id]['question_types'].append(question.type or '')
-        
-        # 获取知识点详细信息
+        all_knowledge_points = list(knowledge_point_stats)
+        
+        # 获取知识点详细信息，只取所需列并关联章节名称，结果为行元组，不进入会话的identity map
         if all_knowledge_points:
-            knowledge_points = KnowledgePoint.query.filter(
-                KnowledgePoint.id.in_(all_knowledge_points),
-                KnowledgePoint.is_active == True
+            knowledge_points = db.session.execute(
+                select(
+                    KnowledgePoint.id, KnowledgePoint.name, KnowledgePoint.code,
+                    KnowledgePoint.difficulty, KnowledgePoint.importance,
+                    Chapter.id.label('chapter_id'), Chapter.name.label('chapter_name')
+                ).outerjoin(
+                    Chapter, Chapter.id == KnowledgePoint.chapter_id
+                ).where(
+                    KnowledgePoint.id.in_(all_knowledge_points),
+                    KnowledgePoint.is_active == True
+                )
             ).all()
         else:
             knowledge_points = []
@@ -490,10 +592,10 @@ def get_exam_paper_star_map(paper_id):
                 'year': paper.year,
                 'exam_type': paper.exam_type,
                 'total_score': paper.total_score,
-                'question_count': len(questions)
+                'question_count': question_count
             },
             'knowledge_points': [],
-            'highlight_nodes': list(all_knowledge_points),
+            'highlight_nodes': all_knowledge_points,
             'statistics': {
                 'total_knowledge_points': len(all_knowledge_points),
                 'coverage_rate': 0  # 将在前端计算
@@ -503,7 +605,7 @@ def get_exam_paper_star_map(paper_id):
         # 添加知识点详情和统计信息
         for kp in knowledge_points:
             stats = knowledge_point_stats.get(str(kp.id), {})
-            avg_difficulty = sum(stats.get('difficulties', [0])) / max(len(stats.get('difficulties', [1])), 1)
+            avg_difficulty = stats.get('difficulty_sum', 0) / max(stats.get('question_count', 0), 1)
             
             star_map_data['knowledge_points'].append({
                 'id': str(kp.id),
@@ -512,14 +614,14 @@ def get_exam_paper_star_map(paper_id):
                 'difficulty': kp.difficulty,
                 'importance': kp.importance,
                 'chapter': {
-                    'id': kp.chapter.id,
-                    'name': kp.chapter.name
-                } if kp.chapter else None,
+                    'id': kp.chapter_id,
+                    'name': kp.chapter_name
+                } if kp.chapter_id else None,
                 'paper_stats': {
                     'question_count': stats.get('question_count', 0),
                     'total_score': stats.get('total_score', 0),
                     'avg_difficulty': round(avg_difficulty, 2),
-                    'question_types': list(set(stats.get('question_types', [])))
+                    'question_types': list(stats.get('question_types', ()))
                 }
             })
         
@@ -534,8 +636,7 @@ def get_exam_scope(subject_id):
     """获取学科考试范围"""
     try:
         # 从JWT token中获取tenant_id
-        current_user_identity = get_jwt_identity()
-        tenant_id = current_user_identity.get('tenant_id')
+        tenant_id = g.tenant_id
         year = request.args.get('year', datetime.now().year, type=int)
         
         # 验证学科
@@ -562,8 +663,7 @@ def update_exam_scope(subject_id):
     """更新学科考试范围"""
     try:
         # 从JWT token中获取tenant_id
-        current_user_identity = get_jwt_identity()
-        tenant_id = current_user_identity.get('tenant_id')
+        tenant_id = g.tenant_id
         data = request.get_json()
         
         # 验证学科
@@ -582,18 +682,49 @@ def update_exam_scope(subject_id):
     except Exception as e:
         return error_response(f'Failed to update exam scope: {str(e)}', 500)
 
-def generate_knowledge_graph(subject_id, year):
-    """生成知识图谱数据"""
+def _knowledge_points_by_chapter(chapters, *criteria):
+    """一次查询取出各章节下的有效知识点，按章节ID分组，代替逐章节查询"""
+    points_by_chapter = defaultdict(list)
+    chapter_ids = [chapter.id for chapter in chapters]
+    if not chapter_ids:
+        return points_by_chapter
+    
+    knowledge_points = KnowledgePoint.query.filter(
+        KnowledgePoint.chapter_id.in_(chapter_ids),
+        KnowledgePoint.is_active == True,
+        *criteria
+    ).all()
+    for kp in knowledge_points:
+        points_by_chapter[kp.chapter_id].append(kp)
+    return points_by_chapter
+
+def _question_counts(points_by_chapter):
+    """一次分组聚合统计各知识点的题目数量，代替逐知识点COUNT"""
+    kp_ids = [kp.id for points in points_by_chapter.values() for kp in points]
+    if not kp_ids:
+        return {}
+    
+    return dict(db.session.query(
+        Question.knowledge_point_id, func.count(Question.id)
+    ).filter(
+        Question.knowledge_point_id.in_(kp_ids)
+    ).group_by(Question.knowledge_point_id).all())
+
+def generate_knowledge_graph(subject, year):
+    """生成知识图谱数据，subject为调用方已校验的学科对象"""
+    subject_id = subject.id
     # 获取学科的所有章节和知识点
     chapters = Chapter.query.filter_by(subject_id=subject_id, is_active=True).all()
+    points_by_chapter = _knowledge_points_by_chapter(chapters)
     
     nodes = []
     edges = []
     
-    # 生成章节节点
+    # 生成章节节点，节点ID每个章节/知识点只格式化一次
     for chapter in chapters:
+        chapter_node_id = f'chapter_{chapter.id}'
         nodes.append({
-            'id': f'chapter_{chapter.id}',
+            'id': chapter_node_id,
             'type': 'chapter',
             'name': chapter.name,
             'level': 1,
@@ -604,10 +735,10 @@ def generate_knowledge_graph(subject_id, year):
         })
         
         # 生成知识点节点
-        knowledge_points = chapter.knowledge_points.filter_by(is_active=True).all()
-        for kp in knowledge_points:
+        for kp in points_by_chapter[chapter.id]:
+            kp_node_id = f'kp_{kp.id}'
             nodes.append({
-                'id': f'kp_{kp.id}',
+                'id': kp_node_id,
                 'type': 'knowledge_point',
                 'name': kp.name,
                 'level': 2,
@@ -620,30 +751,28 @@ def generate_knowledge_graph(subject_id, year):
             
             # 章节到知识点的边
             edges.append({
-                'source': f'chapter_{chapter.id}',
-                'target': f'kp_{kp.id}',
+                'source': chapter_node_id,
+                'target': kp_node_id,
                 'type': 'contains',
                 'weight': 1
             })
             
             # 知识点之间的关联边
             if kp.prerequisites:
-                for prereq_id in kp.prerequisites:
-                    edges.append({
-                        'source': f'kp_{prereq_id}',
-                        'target': f'kp_{kp.id}',
-                        'type': 'prerequisite',
-                        'weight': 2
-                    })
+                edges.extend({
+                    'source': f'kp_{prereq_id}',
+                    'target': kp_node_id,
+                    'type': 'prerequisite',
+                    'weight': 2
+                } for prereq_id in kp.prerequisites)
             
             if kp.related_points:
-                for related_id in kp.related_points:
-                    edges.append({
-                        'source': f'kp_{kp.id}',
-                        'target': f'kp_{related_id}',
-                        'type': 'related',
-                        'weight': 1
-                    })
+                edges.extend({
+                    'source': kp_node_id,
+                    'target': f'kp_{related_id}',
+                    'type': 'related',
+                    'weight': 1
+                } for related_id in kp.related_points)
     
     layout_config = {
         'algorithm': 'force',
@@ -662,6 +791,7 @@ def generate_knowledge_graph(subject_id, year):
 def generate_exam_scope(subject_id, year):
     """生成考试范围配置"""
     chapters = Chapter.query.filter_by(subject_id=subject_id, is_active=True).all()
+    important_points = _knowledge_points_by_chapter(chapters, KnowledgePoint.importance >= 4)
     
     scope = {
         'year': year,
@@ -684,12 +814,7 @@ def generate_exam_scope(subject_id, year):
         }
         
         # 获取重要知识点
-        important_kps = chapter.knowledge_points.filter(
-            KnowledgePoint.importance >= 4,
-            KnowledgePoint.is_active == True
-        ).all()
-        
-        for kp in important_kps:
+        for kp in important_points[chapter.id]:
             chapter_scope['knowledge_points'].append({
                 'id': kp.id,
                 'name': kp.name,
@@ -697,96 +822,89 @@ def generate_exam_scope(subject_id, year):
                 'exam_frequency': kp.exam_frequency
             })
             
-            if kp.importance >= 4:
-                scope['key_knowledge_points'].append({
-                    'id': kp.id,
-                    'name': kp.name,
-                    'chapter_name': chapter.name
-                })
+            # 查询已限定importance >= 4，全部计入重点知识点
+            scope['key_knowledge_points'].append({
+                'id': kp.id,
+                'name': kp.name,
+                'chapter_name': chapter.name
+            })
         
         scope['chapters'].append(chapter_scope)
     
     return scope
 
+# 图谱类型的中文名称
+_GRAPH_TYPE_NAMES = {
+    'exam_scope': '考试范围',
+    'full_knowledge': '完整知识图谱',
+    'mastery_level': '掌握情况图谱'
+}
+
 def get_graph_type_name(graph_type):
     """获取图谱类型的中文名称"""
-    type_names = {
-        'exam_scope': '考试范围',
-        'full_knowledge': '完整知识图谱',
-        'mastery_level': '掌握情况图谱'
+    return _GRAPH_TYPE_NAMES.get(graph_type, '知识图谱')
+
+def _star_node(node_id, name, node_type, level, difficulty, importance, mastery_level=0, question_count=0):
+    """考试范围和掌握情况图谱共用的节点结构"""
+    return {
+        'id': node_id,
+        'name': name,
+        'type': node_type,
+        'level': level,
+        'difficulty': difficulty,
+        'importance': importance,
+        'mastery_level': mastery_level,
+        'question_count': question_count
     }
-    return type_names.get(graph_type, '知识图谱')
 
-def generate_exam_scope_graph(subject_id, year):
-    """生成考试范围知识图谱"""
+def _hierarchy_edge(source, target, strength):
+    """考试范围和掌握情况图谱共用的层级边结构"""
+    return {
+        'source': source,
+        'target': target,
+        'type': 'hierarchy',
+        'strength': strength
+    }
+
+def generate_exam_scope_graph(subject, year):
+    """生成考试范围知识图谱，subject为调用方已校验的学科对象"""
+    subject_id = subject.id
     # 获取学科章节和重要知识点
     chapters = Chapter.query.filter_by(subject_id=subject_id, is_active=True).all()
+    important_points = _knowledge_points_by_chapter(chapters, KnowledgePoint.importance >= 4)
+    question_counts = _question_counts(important_points)
     
     nodes = []
     edges = []
     
     # 添加学科根节点
-    subject = Subject.query.get(subject_id)
-    nodes.append({
-        'id': f'subject_{subject_id}',
-        'name': subject.name,
-        'type': 'subject',
-        'level': 0,
-        'difficulty': 0,
-        'importance': 5,
-        'mastery_level': 0,
-        'question_count': 0
-    })
+    subject_node_id = f'subject_{subject_id}'
+    nodes.append(_star_node(subject_node_id, subject.name, 'subject', 0, 0, 5))
     
     for chapter in chapters:
         # 添加章节节点
-        nodes.append({
-            'id': f'chapter_{chapter.id}',
-            'name': chapter.name,
-            'type': 'chapter',
-            'level': 1,
-            'difficulty': chapter.difficulty,
-            'importance': chapter.importance,
-            'mastery_level': 0,
-            'question_count': 0
-        })
+        chapter_node_id = f'chapter_{chapter.id}'
+        nodes.append(_star_node(
+            chapter_node_id, chapter.name, 'chapter', 1, chapter.difficulty, chapter.importance
+        ))
         
         # 添加学科到章节的边
-        edges.append({
-            'source': f'subject_{subject_id}',
-            'target': f'chapter_{chapter.id}',
-            'type': 'hierarchy',
-            'strength': 1.0
-        })
+        edges.append(_hierarchy_edge(subject_node_id, chapter_node_id, 1.0))
         
         # 只包含重要的知识点（考试范围）
-        important_kps = chapter.knowledge_points.filter(
-            KnowledgePoint.importance >= 4,
-            KnowledgePoint.is_active == True
-        ).all()
-        
-        for kp in important_kps:
+        for kp in important_points[chapter.id]:
             # 计算题目数量
-            question_count = kp.questions.count() if hasattr(kp, 'questions') else 0
+            question_count = question_counts.get(kp.id, 0)
             
-            nodes.append({
-                'id': f'kp_{kp.id}',
-                'name': kp.name,
-                'type': 'knowledge_point',
-                'level': 2,
-                'difficulty': kp.difficulty,
-                'importance': kp.importance,
-                'mastery_level': 0,  # 默认掌握度为0
-                'question_count': question_count
-            })
+            # 默认掌握度为0
+            kp_node_id = f'kp_{kp.id}'
+            nodes.append(_star_node(
+                kp_node_id, kp.name, 'knowledge_point', 2, kp.difficulty, kp.importance,
+                question_count=question_count
+            ))
             
             # 添加章节到知识点的边
-            edges.append({
-                'source': f'chapter_{chapter.id}',
-                'target': f'kp_{kp.id}',
-                'type': 'hierarchy',
-                'strength': 0.8
-            })
+            edges.append(_hierarchy_edge(chapter_node_id, kp_node_id, 0.8))
     
     return {
         'nodes': nodes,
@@ -799,80 +917,50 @@ def generate_exam_scope_graph(subject_id, year):
         }
     }
 
-def generate_mastery_level_graph(subject_id, year):
-    """生成掌握情况知识图谱"""
+def generate_mastery_level_graph(subject, year):
+    """生成掌握情况知识图谱，subject为调用方已校验的学科对象"""
+    subject_id = subject.id
     # 获取学科章节和知识点
     chapters = Chapter.query.filter_by(subject_id=subject_id, is_active=True).all()
+    points_by_chapter = _knowledge_points_by_chapter(chapters)
+    question_counts = _question_counts(points_by_chapter)
     
     nodes = []
     edges = []
     
     # 添加学科根节点
-    subject = Subject.query.get(subject_id)
-    nodes.append({
-        'id': f'subject_{subject_id}',
-        'name': subject.name,
-        'type': 'subject',
-        'level': 0,
-        'difficulty': 0,
-        'importance': 5,
-        'mastery_level': 0,
-        'question_count': 0
-    })
+    subject_node_id = f'subject_{subject_id}'
+    nodes.append(_star_node(subject_node_id, subject.name, 'subject', 0, 0, 5))
     
     for chapter in chapters:
         # 计算章节平均掌握度（由于KnowledgePoint没有mastery_level字段，设为默认值0）
         chapter_mastery = 0
         
         # 添加章节节点
-        nodes.append({
-            'id': f'chapter_{chapter.id}',
-            'name': chapter.name,
-            'type': 'chapter',
-            'level': 1,
-            'difficulty': chapter.difficulty,
-            'importance': chapter.importance,
-            'mastery_level': chapter_mastery,
-            'question_count': 0
-        })
+        chapter_node_id = f'chapter_{chapter.id}'
+        nodes.append(_star_node(
+            chapter_node_id, chapter.name, 'chapter', 1, chapter.difficulty, chapter.importance,
+            mastery_level=chapter_mastery
+        ))
         
         # 添加学科到章节的边
-        edges.append({
-            'source': f'subject_{subject_id}',
-            'target': f'chapter_{chapter.id}',
-            'type': 'hierarchy',
-            'strength': 1.0
-        })
+        edges.append(_hierarchy_edge(subject_node_id, chapter_node_id, 1.0))
         
         # 获取所有知识点，按掌握度分组显示
-        knowledge_points = chapter.knowledge_points.filter(
-            KnowledgePoint.is_active == True
-        ).all()
-        
-        for kp in knowledge_points:
+        for kp in points_by_chapter[chapter.id]:
             # 计算题目数量
-            question_count = kp.questions.count() if hasattr(kp, 'questions') else 0
+            question_count = question_counts.get(kp.id, 0)
             mastery_level = 0  # 默认掌握度为0
             
-            nodes.append({
-                'id': f'kp_{kp.id}',
-                'name': kp.name,
-                'type': 'knowledge_point',
-                'level': 2,
-                'difficulty': kp.difficulty,
-                'importance': kp.importance,
-                'mastery_level': mastery_level,
-                'question_count': question_count
-            })
+            kp_node_id = f'kp_{kp.id}'
+            nodes.append(_star_node(
+                kp_node_id, kp.name, 'knowledge_point', 2, kp.difficulty, kp.importance,
+                mastery_level=mastery_level, question_count=question_count
+            ))
             
             # 添加章节到知识点的边，强度基于掌握度
             strength = 0.5 + (mastery_level / 10.0) * 0.5
-            edges.append({
-                'source': f'chapter_{chapter.id}',
-                'target': f'kp_{kp.id}',
-                'type': 'hierarchy',
-                'strength': strength
-            })
+            edges.append(_hierarchy_edge(chapter_node_id, kp_node_id, strength))
     
     return {
         'nodes': nodes,
@@ -885,17 +973,23 @@ def generate_mastery_level_graph(subject_id, year):
         }
     }
 
+# 图谱类型到生成函数的映射，各生成函数签名均为(subject, year)
+_GRAPH_BUILDERS = {
+    'exam_scope': generate_exam_scope_graph,
+    'full_knowledge': generate_knowledge_graph,
+    'mastery_level': generate_mastery_level_graph
+}
+
 @knowledge_graph_bp.route('/mastery-star-map/<subject_id>', methods=['GET'])
 @jwt_required()
 def get_mastery_star_map(subject_id):
     """获取基于掌握程度的星图"""
     try:
-        current_user_identity = get_jwt_identity()
-        user_id = current_user_identity.get('user_id')
-        tenant_id = current_user_identity.get('tenant_id')
+        user_id = g.user_id
+        tenant_id = g.tenant_id
         
         # 验证学科
-        subject = Subject.query.filter_by(id=subject_id, tenant_id=tenant_id).first()
+        subject = get_subject(subject_id, tenant_id)
         if not subject:
             return error_response('Subject not found', 404)
         
@@ -921,12 +1015,11 @@ def get_mastery_star_map(subject_id):
 def get_mastery_classification(subject_id):
     """获取知识点掌握程度分类"""
     try:
-        current_user_identity = get_jwt_identity()
-        user_id = current_user_identity.get('user_id')
-        tenant_id = current_user_identity.get('tenant_id')
+        user_id = g.user_id
+        tenant_id = g.tenant_id
         
         # 验证学科
-        subject = Subject.query.filter_by(id=subject_id, tenant_id=tenant_id).first()
+        subject = get_subject(subject_id, tenant_id)
         if not subject:
             return error_response('Subject not found', 404)
         
@@ -955,8 +1048,7 @@ def get_mastery_classification(subject_id):
 def update_mastery_color():
     """更新知识点掌握程度颜色"""
     try:
-        current_user_identity = get_jwt_identity()
-        user_id = current_user_identity.get('user_id')
+        user_id = g.user_id
         
         data = request.get_json()
         if not data or 'knowledge_point_id' not in data:
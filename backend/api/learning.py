@@ -17,13 +17,16 @@ from flask_jwt_extended import jwt_required, get_jwt_identity
 from services.learning_path_service import LearningPathService
 from services.content_generation_service import ContentGenerationService
 from services.learning_profile_service import LearningProfileService
+from services.subject_cache import get_subject
 from models.user import User
-from models.knowledge import Subject, KnowledgePoint
+from models.knowledge import KnowledgePoint
 from models.question import Question
 from utils.logger import get_logger
+from utils.database import db
+from sqlalchemy import exists
 from utils.response import success_response, error_response
 from utils.validators import validate_required_fields
-from typing import List, Dict, Any
+from typing import Dict, Any, Tuple
 
 logger = get_logger(__name__)
 
@@ -47,7 +50,7 @@ def generate_learning_path():
         time_budget = data.get('time_budget', 30)  # 默认30分钟/天
         
         # 验证学科是否存在
-        subject = Subject.query.get(subject_id)
+        subject = get_subject(subject_id)
         if not subject:
             return error_response('学科不存在', 404)
         
@@ -144,8 +147,7 @@ def generate_learning_content():
         learning_style = data.get('learning_style')
         
         # 验证知识点是否存在
-        knowledge_point = KnowledgePoint.query.get(knowledge_point_id)
-        if not knowledge_point:
+        if not db.session.query(exists().where(KnowledgePoint.id == knowledge_point_id)).scalar():
             return error_response('知识点不存在', 404)
         
         # 验证内容类型
@@ -201,8 +203,7 @@ def generate_practice_questions():
                 return error_response('难度范围必须在1-5之间', 400)
         
         # 验证知识点是否存在
-        knowledge_point = KnowledgePoint.query.get(knowledge_point_id)
-        if not knowledge_point:
+        if not db.session.query(exists().where(KnowledgePoint.id == knowledge_point_id)).scalar():
             return error_response('知识点不存在', 404)
         
         # 验证题目类型
@@ -253,8 +254,7 @@ def generate_question_explanation():
         correct_answer = data['correct_answer']
         
         # 验证题目是否存在
-        question = Question.query.get(question_id)
-        if not question:
+        if not db.session.query(exists().where(Question.id == question_id)).scalar():
             return error_response('题目不存在', 404)
         
         # 生成个性化解释
@@ -283,7 +283,7 @@ def get_learning_recommendations(subject_id):
         user_id = get_jwt_identity()
         
         # 验证学科是否存在
-        subject = Subject.query.get(subject_id)
+        subject = get_subject(subject_id)
         if not subject:
             return error_response('学科不存在', 404)
         
@@ -325,7 +325,88 @@ def get_learning_recommendations(subject_id):
         return error_response('获取学习建议失败', 500)
 
 # 辅助函数
-def _get_learning_style_tips(learning_style: str) -> List[str]:
+# 提示文案固定不变，导入时构建一次，各请求共享同一组元组
+_STYLE_TIPS: Dict[str, Tuple[str, ...]] = {
+    'visual': (
+        '使用图表、思维导图和视觉辅助工具',
+        '观看教学视频和动画演示',
+        '用不同颜色标记重点内容',
+        '创建视觉化的笔记和总结'
+    ),
+    'auditory': (
+        '大声朗读学习材料',
+        '参与讨论和口头解释',
+        '听录音和播客',
+        '用音乐或韵律帮助记忆'
+    ),
+    'hands_on': (
+        '通过实际操作和实验学习',
+        '制作模型和实物演示',
+        '参与互动练习和游戏',
+        '边学边做，理论结合实践'
+    ),
+    'reading': (
+        '阅读详细的文字材料',
+        '做大量的笔记和摘要',
+        '查阅参考书籍和资料',
+        '通过写作来整理思路'
+    ),
+    'balanced': (
+        '结合多种学习方式',
+        '根据内容特点选择合适的方法',
+        '保持学习方式的多样性',
+        '定期调整学习策略'
+    )
+}
+
+_DIFFICULTY_RECOMMENDATIONS: Dict[str, Tuple[str, ...]] = {
+    'easy': (
+        '从基础概念开始，循序渐进',
+        '多做简单题目建立信心',
+        '确保基础牢固再进阶',
+        '不要急于求成，稳扎稳打'
+    ),
+    'medium': (
+        '保持适中的挑战性',
+        '基础和进阶题目相结合',
+        '根据掌握情况调整难度',
+        '保持学习的持续性'
+    ),
+    'hard': (
+        '挑战更高难度的题目',
+        '深入理解概念的本质',
+        '尝试解决复杂问题',
+        '培养独立思考能力'
+    )
+}
+
+_TIME_TIPS_BASE = (
+    '制定合理的学习计划',
+    '保持规律的学习时间',
+    '适当休息，避免疲劳学习',
+    '根据注意力状态安排学习内容'
+)
+
+# 按偏好的学习时长预先拼接好的完整建议
+_TIME_TIPS_SHORT = _TIME_TIPS_BASE + (
+    '利用碎片时间进行复习',
+    '采用番茄工作法，短时高效',
+    '重点关注核心概念'
+)
+
+_TIME_TIPS_LONG = _TIME_TIPS_BASE + (
+    '进行深度学习和思考',
+    '安排完整的学习块时间',
+    '结合理论学习和实践练习'
+)
+
+_TIME_TIPS_MEDIUM = _TIME_TIPS_BASE + (
+    '保持适中的学习节奏',
+    '合理分配不同类型的学习任务',
+    '定期评估学习效果'
+)
+
+def _get_learning_style_tips(learning_style: str) -> Tuple[str, ...]:
     """
     获取学习风格提示
     
@@ -335,42 +416,9 @@ def _get_learning_style_tips(learning_style: str) -> List[str]:
     Returns:
         提示列表
     """
-    tips_map = {
-        'visual': [
-            '使用图表、思维导图和视觉辅助工具',
-            '观看教学视频和动画演示',
-            '用不同颜色标记重点内容',
-            '创建视觉化的笔记和总结'
-        ],
-        'auditory': [
-            '大声朗读学习材料',
-            '参与讨论和口头解释',
-            '听录音和播客',
-            '用音乐或韵律帮助记忆'
-        ],
-        'hands_on': [
-            '通过实际操作和实验学习',
-            '制作模型和实物演示',
-            '参与互动练习和游戏',
-            '边学边做，理论结合实践'
-        ],
-        'reading': [
-            '阅读详细的文字材料',
-            '做大量的笔记和摘要',
-            '查阅参考书籍和资料',
-            '通过写作来整理思路'
-        ],
-        'balanced': [
-            '结合多种学习方式',
-            '根据内容特点选择合适的方法',
-            '保持学习方式的多样性',
-            '定期调整学习策略'
-        ]
-    }
-    
-    return tips_map.get(learning_style, tips_map['balanced'])
+    return _STYLE_TIPS.get(learning_style, _STYLE_TIPS['balanced'])
 
-def _get_difficulty_recommendations(difficulty_preference: str) -> List[str]:
+def _get_difficulty_recommendations(difficulty_preference: str) -> Tuple[str, ...]:
     """
     获取难度建议
     
@@ -380,30 +428,9 @@ def _get_difficulty_recommendations(difficulty_preference: str) -> List[str]:
     Returns:
         建议列表
     """
-    recommendations_map = {
-        'easy': [
-            '从基础概念开始，循序渐进',
-            '多做简单题目建立信心',
-            '确保基础牢固再进阶',
-            '不要急于求成，稳扎稳打'
-        ],
-        'medium': [
-            '保持适中的挑战性',
-            '基础和进阶题目相结合',
-            '根据掌握情况调整难度',
-            '保持学习的持续性'
-        ],
-        'hard': [
-            '挑战更高难度的题目',
-            '深入理解概念的本质',
-            '尝试解决复杂问题',
-            '培养独立思考能力'
-        ]
-    }
-    
-    return recommendations_map.get(difficulty_preference, recommendations_map['medium'])
+    return _DIFFICULTY_RECOMMENDATIONS.get(difficulty_preference, _DIFFICULTY_RECOMMENDATIONS['medium'])
 
-def _get_time_management_tips(time_preferences: Dict[str, Any]) -> List[str]:
+def _get_time_management_tips(time_preferences: Dict[str, Any]) -> Tuple[str, ...]:
     """
     获取时间管理建议
     
@@ -413,33 +440,11 @@ def _get_time_management_tips(time_preferences: Dict[str, Any]) -> List[str]:
     Returns:
         建议列表
     """
-    tips = [
-        '制定合理的学习计划',
-        '保持规律的学习时间',
-        '适当休息，避免疲劳学习',
-        '根据注意力状态安排学习内容'
-    ]
-    
-    # 根据偏好的学习时长调整建议
+    # 根据偏好的学习时长选择建议
     preferred_duration = time_preferences.get('preferred_session_duration', 30)
     
     if preferred_duration <= 15:
-        tips.extend([
-            '利用碎片时间进行复习',
-            '采用番茄工作法，短时高效',
-            '重点关注核心概念'
-        ])
-    elif preferred_duration >= 60:
-        tips.extend([
-            '进行深度学习和思考',
-            '安排完整的学习块时间',
-            '结合理论学习和实践练习'
-        ])
-    else:
-        tips.extend([
-            '保持适中的学习节奏',
-            '合理分配不同类型的学习任务',
-            '定期评估学习效果'
-        ])
-    
-    return tips
\ No newline at end of file
+        return _TIME_TIPS_SHORT
+    if preferred_duration >= 60:
+        return _TIME_TIPS_LONG
+    return _TIME_TIPS_MEDIUM
\ No newline at end of file
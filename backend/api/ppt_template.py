@@ -20,6 +20,7 @@ from typing import Dict, Any
 
 from models.ppt_template import PPTTemplate
 from utils.response import success_response, error_response
+from utils.validators import validate_pagination_params
 from utils.logger import get_logger
 from utils.database import db
 
@@ -124,8 +125,11 @@ def list_templates():
         # 获取查询参数
         category = request.args.get('category')
         tenant_id = request.args.get('tenant_id', 'default')
-        page = int(request.args.get('page', 1))
-        per_page = int(request.args.get('per_page', 20))
+        page, per_page, error = validate_pagination_params(
+            request.args.get('page'), request.args.get('per_page')
+        )
+        if error:
+            return error_response(error, 400)
         
         # 构建查询
         query = PPTTemplate.query.filter_by(is_active=True, tenant_id=tenant_id)
@@ -16,6 +16,7 @@ License: Apache License 2.0
 from flask import Flask, request, g
 from flask_babel import Babel
 from flask_cors import CORS
+from flask_compress import Compress
 from flask_jwt_extended import JWTManager
 from config import Config
 from utils.database import db, migrate
@@ -35,6 +36,7 @@ from models import (
 # 创建扩展实例
 babel = Babel()
 jwt = JWTManager()
+compress = Compress()
 
 def create_app(config_class=Config):
     """应用工厂函数"""
@@ -46,6 +48,8 @@ def create_app(config_class=Config):
     migrate.init_app(app, db)
     babel.init_app(app)
     jwt.init_app(app)
+    compress.init_app(app)
+    # 考试状态推送在ASGI部署下不经过Flask，其跨域响应头见api/exam_stream._cors_headers，修改此处配置时需同步
     CORS(app)
     
     
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+AI智能学习系统 - ASGI入口文件
+
+Description:
+    将Flask应用包装为ASGI应用，便于使用Uvicorn等ASGI服务器部署。
+    同步视图在线程池中执行，线程数通过环境变量ASGI_THREADS调整，
+    使文档上传/下载、考试答题等I/O密集型接口可以在单个worker内并发处理。
+    未设置ASGI_THREADS时线程数与数据库连接池容量（pool_size + max_overflow）
+    一致，避免线程在等待连接检出时阻塞。
+    考试状态推送（SSE）由ExamStreamMiddleware在事件循环中经Redis发布订阅处理，
+    长连接不占用上述线程。
+
+    启动方式:
+        uvicorn asgi:app --workers 4
+
+    每个worker各有一个连接池和线程池，数据库连接总数最多为
+    worker数 ×（DB_POOL_SIZE + DB_MAX_OVERFLOW），默认4 × 20 = 80。
+    该值须小于PostgreSQL的max_connections（默认100，超出时需相应调大），
+    或在数据库前部署PgBouncer并将DATABASE_URL指向它。
+
+Author: Chang Xinglong
+Date: 2025-08-30
+Version: 1.0.0
+License: Apache License 2.0
+"""
+
+import os
+
+from a2wsgi import WSGIMiddleware
+from api.exam_stream import ExamStreamMiddleware
+from app import create_app
+
+flask_app = create_app()
+
+_engine_options = flask_app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {})
+_default_threads = _engine_options.get('pool_size', 5) + _engine_options.get('max_overflow', 10)
+
+app = ExamStreamMiddleware(
+    WSGIMiddleware(flask_app, workers=int(os.environ.get('ASGI_THREADS', _default_threads))),
+    flask_app
+)
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+AI智能学习系统 - 文档路径回填脚本
+
+Description:
+    一次性修复file_path失效的历史文档记录：按原始文件名在上传目录中
+    查找PDF文件并写回Document.file_path，使预览接口不再走目录查找。
+
+Author: Chang Xinglong
+Date: 2025-08-31
+Version: 1.0.0
+License: Apache License 2.0
+"""
+
+import os
+
+from app import create_app
+from utils.database import db
+from models.document import Document
+from services.document_service import find_uploaded_pdf
+
+def backfill_document_paths():
+    """回填失效的文档存储路径"""
+    app = create_app()
+    
+    with app.app_context():
+        uploads_dir = os.path.join(app.config['UPLOAD_FOLDER'], 'documents')
+        fixed, missing = 0, 0
+        
+        try:
+            documents = Document.query.filter_by(file_type='pdf').all()
+            for document in documents:
+                if document.file_path and os.path.exists(document.file_path):
+                    continue
+                
+                file_path = find_uploaded_pdf(document.filename, uploads_dir)
+                if file_path:
+                    document.file_path = file_path
+                    fixed += 1
+                else:
+                    missing += 1
+            
+            db.session.commit()
+            print(f"已回填 {fixed} 条文档路径，{missing} 条未找到对应文件")
+            
+        except Exception as e:
+            db.session.rollback()
+            print(f"文档路径回填失败: {e}")
+            return False
+    
+    return True
+
+if __name__ == '__main__':
+    backfill_document_paths()
@@ -30,10 +30,19 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or \
         'sqlite:///ai_score.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # 连接池：每个worker进程各有一个池，多worker部署时总连接数为
+    # worker数 ×（pool_size + max_overflow），默认4个worker最多80个连接；
+    # 增加worker或调大连接池时需确保不超过PostgreSQL的max_connections（默认100），否则经PgBouncer连接。
+    # LIFO优先复用热连接，关闭pre_ping省去每次检出时的SELECT 1，失效连接依赖pool_recycle回收
     SQLALCHEMY_ENGINE_OPTIONS = {
-        'pool_size': 10,
-        'pool_recycle': 120,
-        'pool_pre_ping': True
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 10)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 10)),
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 1800)),
+        # 经PgBouncer等连接代理时，服务端连接可能被代理回收，可开启借出前探活
+        'pool_pre_ping': os.environ.get('DB_POOL_PRE_PING', 'false').lower() == 'true',
+        'pool_use_lifo': True,
+        # SQL编译缓存：热点接口的语句只编译一次，默认500条对本项目的查询种类偏小
+        'query_cache_size': int(os.environ.get('DB_QUERY_CACHE_SIZE', 1200))
     }
     
     # Redis配置
@@ -43,6 +52,8 @@ class Config:
     JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY') or 'jwt-secret-key'
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=24)
     JWT_REFRESH_TOKEN_EXPIRES = timedelta(days=30)
+    # 文档接口尚未接入认证时使用固定用户/租户身份，生产环境应关闭
+    USE_STUB_AUTH = os.environ.get('USE_STUB_AUTH', 'true').lower() == 'true'
     
     # 国际化配置
     LANGUAGES = {
@@ -81,10 +92,21 @@ class Config:
     MULTI_TENANT_MODE = True
     DEFAULT_TENANT = 'default'
     
+    # 响应压缩配置（仅压缩JSON，PDF等文件本身已压缩）
+    COMPRESS_MIMETYPES = ['application/json']
+    COMPRESS_LEVEL = 4
+    COMPRESS_MIN_SIZE = 1024
+    COMPRESS_ALGORITHM = ['br', 'gzip']
+    
     # 文件上传配置
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB
     UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads')
     
+    # 文件下发配置：部署在Apache/nginx之后时由Web服务器直接发送文件
+    # nginx需同时设置X_ACCEL_REDIRECT_PREFIX为指向UPLOAD_FOLDER的internal location
+    USE_X_SENDFILE = os.environ.get('USE_X_SENDFILE', 'false').lower() == 'true'
+    X_ACCEL_REDIRECT_PREFIX = os.environ.get('X_ACCEL_REDIRECT_PREFIX')
+    
     # 学习配置
     SUBJECTS = {
         'chinese': '语文',
@@ -44,7 +44,7 @@ class DocumentCategory(db.Model):
     parent = db.relationship('DocumentCategory', remote_side=[id], backref='children')
     documents = db.relationship('Document', backref='category', lazy='dynamic')
     
-    def to_dict(self):
+    def to_dict(self, document_count=None):
         return {
             'id': self.id,
             'name': self.name,
@@ -57,7 +57,7 @@ class DocumentCategory(db.Model):
             'is_active': self.is_active,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None,
-            'document_count': self.documents.count()
+            'document_count': self.documents.count() if document_count is None else document_count
         }
 
 class Document(db.Model):
@@ -110,6 +110,12 @@ class Document(db.Model):
     pages = db.relationship('DocumentPage', backref='document', lazy='dynamic', cascade='all, delete-orphan')
     annotations = db.relationship('DocumentAnnotation', backref='document', lazy='dynamic', cascade='all, delete-orphan')
     
+    __table_args__ = (
+        db.Index('idx_documents_id_user', 'id', 'user_id',
+                 postgresql_include=['file_path', 'filename', 'file_type']),
+        db.Index('idx_documents_user_tenant_status', 'user_id', 'tenant_id', 'parse_status'),
+    )
+    
     def to_dict(self):
         return {
             'id': self.id,
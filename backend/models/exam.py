@@ -50,6 +50,10 @@ class ExamSession(db.Model):
     记录每次考试的完整信息，包括时间管理、答题记录、得分策略等
     """
     __tablename__ = 'exam_sessions'
+    __table_args__ = (
+        db.Index('idx_exam_sessions_user_time', 'user_id', 'created_time'),
+        db.Index('idx_exam_sessions_user_type_subject', 'user_id', 'exam_type', 'subject_id'),
+    )
     
     # 基本信息
     id = Column(Integer, primary_key=True)
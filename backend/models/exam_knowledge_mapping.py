@@ -50,6 +50,9 @@ class ExamKnowledgeMapping(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    # 关系
+    knowledge_point = db.relationship('KnowledgePoint')
+    
     # 唯一约束
     __table_args__ = (
         db.UniqueConstraint('exam_paper_id', 'knowledge_point_id', name='uq_exam_knowledge'),
@@ -186,10 +189,18 @@ class ExamKnowledgeStatistics(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    # 关系
+    knowledge_point = db.relationship('KnowledgePoint')
+    
     # 唯一约束
     __table_args__ = (
         db.UniqueConstraint('subject_id', 'knowledge_point_id', 'year', 'exam_type', 'region', 
                           name='uq_knowledge_statistics'),
+        # 统计、分析和星图按学科及年份/类型/地区筛选；PostgreSQL下附带分析聚合所需的列，
+        # 聚合查询可只扫描索引
+        db.Index('idx_exam_knowledge_statistics_filters', 'subject_id', 'year', 'exam_type', 'region',
+                 postgresql_include=['knowledge_point_id', 'appearance_rate', 'importance_score',
+                                     'avg_difficulty', 'max_score_per_paper']),
     )
     
     def __repr__(self):
@@ -13,6 +13,7 @@ License: Apache License 2.0
 """
 
 from datetime import datetime
+from sqlalchemy import func
 from utils.database import db
 import uuid
 
@@ -42,6 +43,7 @@ class ExamPaper(db.Model):
     file_path = db.Column(db.String(500), comment='文件路径')
     file_type = db.Column(db.String(20), comment='文件类型：pdf/image')
     file_size = db.Column(db.Integer, comment='文件大小(字节)')
+    content_hash = db.Column(db.String(64), index=True, comment='文件内容SHA-256，用于识别重复上传')
     
     # 解析状态
     parse_status = db.Column(db.String(20), default='pending', comment='解析状态：pending/processing/completed/failed')
@@ -65,8 +67,19 @@ class ExamPaper(db.Model):
     def __repr__(self):
         return f'<ExamPaper {self.title}>'
     
-    def to_dict(self, include_questions=False):
-        data = {
+    @classmethod
+    def summary_columns(cls):
+        """to_summary_dict包含的列，列表接口按这些列做投影查询"""
+        return (
+            cls.id, cls.title, cls.description, cls.year, cls.exam_type, cls.region,
+            cls.total_score, cls.duration, cls.difficulty_level, cls.tags, cls.file_type,
+            cls.file_size, cls.parse_status, cls.question_count, cls.download_count,
+            cls.is_public, cls.created_at, cls.updated_at
+        )
+    
+    def to_summary_dict(self):
+        """只包含标量字段的摘要，不触发任何关系加载"""
+        return {
             'id': str(self.id),
             'title': self.title,
             'description': self.description,
@@ -86,12 +99,25 @@ class ExamPaper(db.Model):
             'created_at': self.created_at.isoformat() if self.created_at is not None else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at is not None else None
         }
+    
+    def to_dict(self, include_questions=False):
+        data = self.to_summary_dict()
         
         if include_questions:
             data['questions'] = [q.to_dict() for q in self.questions.filter_by(is_active=True).all()]
         
         return data
 
+# 试卷列表按(年份, 上传时间, ID)倒序做键集分页，年份为空时按0排序；
+# 列表只查询未删除的试卷，索引只收录这部分行
+db.Index(
+    'idx_exam_papers_tenant_listing',
+    ExamPaper.tenant_id, ExamPaper.subject_id,
+    func.coalesce(ExamPaper.year, 0).desc(), ExamPaper.created_at.desc(), ExamPaper.id.desc(),
+    postgresql_where=ExamPaper.is_active == True,
+    sqlite_where=ExamPaper.is_active == True
+)
+
 class KnowledgeGraph(db.Model):
     """知识图谱模型 - 用于星图展示"""
     
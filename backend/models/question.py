@@ -128,6 +128,11 @@ class Question(db.Model):
     # 关系
     study_records = db.relationship('StudyRecord', backref='question', lazy='dynamic')
     
+    # 索引：按知识点查找题目并关联所属试卷
+    __table_args__ = (
+        db.Index('idx_questions_kp_paper', 'knowledge_point_id', 'exam_paper_id'),
+    )
+    
     def __repr__(self):
         return f'<Question {self.id}>'
     
@@ -11,7 +11,7 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from app import create_app
 from utils.database import db
-from sqlalchemy import text, Index
+from sqlalchemy import text, Index, inspect
 from models.learning import StudyRecord
 from models.mistake import MistakeRecord
 from models.knowledge import KnowledgePoint, Subject, Chapter
@@ -19,6 +19,36 @@ from models.user import User
 from datetime import datetime, timedelta
 import time
 
+def add_missing_columns():
+    """
+    为已有数据库补充新增的列
+
+    create_all只创建缺失的表，不会为已存在的表添加列
+    """
+    print("=== 补充新增列 ===")
+    
+    # (表名, 列名, 列定义)
+    columns_to_add = [
+        # ExamPaper内容哈希（识别重复上传）
+        ("exam_papers", "content_hash", "VARCHAR(64)")
+    ]
+    
+    try:
+        inspector = inspect(db.engine)
+        for table_name, column_name, column_type in columns_to_add:
+            existing = {column['name'] for column in inspector.get_columns(table_name)}
+            if column_name in existing:
+                print(f"✓ 列已存在: {table_name}.{column_name}")
+                continue
+            db.session.execute(text(f"ALTER TABLE {table_name} ADD COLUMN {column_name} {column_type}"))
+            print(f"✓ 添加列: {table_name}.{column_name}")
+        
+        db.session.commit()
+        
+    except Exception as e:
+        print(f"✗ 补充列过程出错: {str(e)}")
+        db.session.rollback()
+
 def create_performance_indexes():
     """
     创建性能优化索引
@@ -51,7 +81,26 @@ def create_performance_indexes():
             "CREATE INDEX IF NOT EXISTS idx_knowledge_points_chapter ON knowledge_points(chapter_id)",
             
             # 为Chapter表创建索引
-            "CREATE INDEX IF NOT EXISTS idx_chapters_subject ON chapters(subject_id)"
+            "CREATE INDEX IF NOT EXISTS idx_chapters_subject ON chapters(subject_id)",
+            
+            # 为Document表创建索引（文档列表/统计和按ID查找）
+            "CREATE INDEX IF NOT EXISTS idx_documents_user_tenant_status ON documents(user_id, tenant_id, parse_status)",
+            "CREATE INDEX IF NOT EXISTS idx_documents_id_user ON documents(id, user_id)",
+            
+            # 为ExamSession表创建索引（考试列表和统计）
+            "CREATE INDEX IF NOT EXISTS idx_exam_sessions_user_time ON exam_sessions(user_id, created_time)",
+            "CREATE INDEX IF NOT EXISTS idx_exam_sessions_user_type_subject ON exam_sessions(user_id, exam_type, subject_id)",
+            
+            # 为ExamPaper表创建部分索引（未删除试卷的列表键集分页）
+            "CREATE INDEX IF NOT EXISTS idx_exam_papers_tenant_listing ON exam_papers(tenant_id, subject_id, coalesce(year, 0) DESC, created_at DESC, id DESC) WHERE is_active",
+            # 内容哈希索引（上传时查找重复试卷），名称与模型中index=True生成的一致
+            "CREATE INDEX IF NOT EXISTS ix_exam_papers_content_hash ON exam_papers(content_hash)",
+            
+            # 为ExamKnowledgeStatistics表创建索引（按学科及年份/类型/地区筛选）
+            "CREATE INDEX IF NOT EXISTS idx_exam_knowledge_statistics_filters ON exam_knowledge_statistics(subject_id, year, exam_type, region)",
+            
+            # 为Question表创建索引（按知识点查找题目并关联试卷）
+            "CREATE INDEX IF NOT EXISTS idx_questions_kp_paper ON questions(knowledge_point_id, exam_paper_id)"
         ]
         
         for index_sql in indexes_to_create:
@@ -395,6 +444,9 @@ def main():
     app = create_app()
     
     with app.app_context():
+        # 0. 补充新增列（索引依赖这些列）
+        add_missing_columns()
+        
         # 1. 创建性能索引
         create_performance_indexes()
         
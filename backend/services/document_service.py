@@ -13,6 +13,8 @@ License: Apache License 2.0
 """
 
 import os
+import re
+import json
 import hashlib
 import mimetypes
 from datetime import datetime
@@ -20,10 +22,11 @@ from typing import Dict, List, Any, Optional, Tuple
 from PIL import Image
 import pymupdf as fitz  # PyMuPDF - 使用推荐的导入方式
 import pytesseract
-from werkzeug.utils import secure_filename
 from flask import current_app
+from sqlalchemy import case, func, literal
+from sqlalchemy.orm import joinedload
 
-from utils.database import db
+from utils.database import db, json_array_contains
 from models.document import Document, DocumentCategory, DocumentPage, DocumentAnalysis
 from services.classification_service import classification_service
 from utils.logger import get_logger
@@ -44,6 +47,58 @@ def get_vector_db_service():
 
 logger = get_logger(__name__)
 
+# 文件名清洗：模块加载时预编译，批量上传时避免逐个文件重复编译/Unicode归一化
+_SAFE_FN_RE = re.compile(r'[^A-Za-z0-9_.-]+')
+_sanitize = _SAFE_FN_RE.sub
+
+
+def _safe_filename(name: str) -> str:
+    """生成安全的文件名（仅保留ASCII字母数字及 _ . -）"""
+    return _sanitize('_', name).strip('._')[:255]
+
+# 上传目录中PDF文件名 -> 路径的索引，用于定位file_path失效的历史文档
+_pdf_index: Optional[Dict[str, str]] = None
+
+
+def _build_pdf_index(uploads_dir: str) -> Dict[str, str]:
+    """扫描上传目录，按存储文件名和原始文件名建立PDF索引"""
+    index = {}
+    if not os.path.isdir(uploads_dir):
+        return index
+    with os.scandir(uploads_dir) as entries:
+        for entry in entries:
+            if not entry.name.endswith('.pdf') or not entry.is_file():
+                continue
+            index.setdefault(entry.name, entry.path)
+            # 存储文件名格式为 {user_id}_{日期}_{时间}_{原始文件名}
+            parts = entry.name.split('_', 3)
+            if len(parts) == 4:
+                index.setdefault(parts[3], entry.path)
+    return index
+
+
+def find_uploaded_pdf(filename: str, uploads_dir: str) -> Optional[str]:
+    """
+    根据原始文件名查找上传目录中的PDF文件
+    
+    Args:
+        filename: 原始文件名
+        uploads_dir: 上传文档目录
+        
+    Returns:
+        Optional[str]: 文件路径，未找到返回None
+    """
+    global _pdf_index
+    if _pdf_index is None:
+        _pdf_index = _build_pdf_index(uploads_dir)
+    return _pdf_index.get(filename)
+
+
+def invalidate_pdf_index():
+    """上传新文件后使PDF索引失效，下次查找时重建"""
+    global _pdf_index
+    _pdf_index = None
+
 class DocumentService:
     """
     文档管理服务类
@@ -88,6 +143,30 @@ class DocumentService:
                 hash_sha256.update(chunk)
         return hash_sha256.hexdigest()
     
+    def write_file_stream(self, stream, file_path: str, chunk_size: int = 64 * 1024) -> Tuple[int, str]:
+        """
+        分块写入文件，同时计算文件大小和哈希值
+        
+        Args:
+            stream: 可读的文件流
+            file_path: 目标文件路径
+            chunk_size: 每次读取的字节数
+            
+        Returns:
+            Tuple[int, str]: 文件大小和文件哈希值
+        """
+        hash_sha256 = hashlib.sha256()
+        file_size = 0
+        with open(file_path, "wb") as out:
+            while True:
+                chunk = stream.read(chunk_size)
+                if not chunk:
+                    break
+                hash_sha256.update(chunk)
+                file_size += len(chunk)
+                out.write(chunk)
+        return file_size, hash_sha256.hexdigest()
+    
     def save_uploaded_file(self, file, user_id: str) -> Tuple[str, Dict[str, Any]]:
         """
         保存上传的文件
@@ -106,17 +185,16 @@ class DocumentService:
             raise ValueError("不支持的文件类型")
         
         # 生成安全的文件名
-        filename = secure_filename(file.filename)
+        filename = _safe_filename(file.filename)
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
         unique_filename = f"{user_id}_{timestamp}_{filename}"
         
-        # 保存文件
+        # 保存文件（单次遍历上传流，写盘的同时计算大小和哈希，无需再读回文件）
         file_path = os.path.join(self.upload_folder, 'documents', unique_filename)
-        file.save(file_path)
+        file_size, file_hash = self.write_file_stream(file.stream, file_path)
+        invalidate_pdf_index()
         
         # 获取文件信息
-        file_size = os.path.getsize(file_path)
-        file_hash = self.calculate_file_hash(file_path)
         mime_type, _ = mimetypes.guess_type(file_path)
         
         file_info = {
@@ -356,6 +434,56 @@ class DocumentService:
             logger.error(f"创建文档失败: {e}")
             db.session.rollback()
             raise Exception(f"文档创建失败: {str(e)}")
+
+    def create_documents(self, files: List[Any], user_id: str, tenant_id: str,
+                         category_id: Optional[str] = None,
+                         tags: Optional[List[str]] = None) -> List[Document]:
+        """
+        批量创建文档记录（单个事务提交）
+        
+        Args:
+            files: 上传的文件对象列表
+            user_id: 用户ID
+            tenant_id: 租户ID
+            category_id: 分类ID
+            tags: 标签列表
+            
+        Returns:
+            List[Document]: 文档对象列表
+        """
+        try:
+            saved = [self.save_uploaded_file(file, user_id)[1] for file in files]
+            
+            documents = [
+                Document(
+                    tenant_id=tenant_id,
+                    user_id=user_id,
+                    category_id=category_id,
+                    filename=info['filename'],
+                    file_path=info['file_path'],
+                    file_size=info['file_size'],
+                    file_type=info['file_type'],
+                    mime_type=info['mime_type'],
+                    file_hash=info['file_hash'],
+                    title=info['filename'],
+                    tags=list(tags) if tags else [],
+                    parse_status='pending'
+                )
+                for info in saved
+            ]
+            
+            db.session.add_all(documents)
+            db.session.commit()
+            
+            for document in documents:
+                self.parse_document(document.id)
+            
+            return documents
+            
+        except Exception as e:
+            logger.error(f"批量创建文档失败: {e}")
+            db.session.rollback()
+            raise Exception(f"文档创建失败: {str(e)}")
     
     def parse_document(self, document_id: str) -> bool:
         """
@@ -591,21 +719,31 @@ class DocumentService:
                 )
             )
         
-        # 分页查询
-        pagination = query.order_by(Document.created_at.desc()).paginate(
-            page=page, per_page=per_page, error_out=False
-        )
+        # 分页查询：当前页数据与总数（COUNT(*) OVER()）一次查询返回
+        rows = query.add_columns(func.count().over().label('total')).options(
+            joinedload(Document.category)
+        ).order_by(Document.created_at.desc()).offset(
+            (page - 1) * per_page
+        ).limit(per_page).all()
         
-        documents = [doc.to_dict() for doc in pagination.items]
+        if rows:
+            total = rows[0].total
+        elif page > 1:
+            total = query.count()
+        else:
+            total = 0
+        
+        documents = [doc.to_dict() for doc, _ in rows]
+        pages = (total + per_page - 1) // per_page
         
         return {
             'documents': documents,
-            'total': pagination.total,
-            'pages': pagination.pages,
+            'total': total,
+            'pages': pages,
             'current_page': page,
             'per_page': per_page,
-            'has_next': pagination.has_next,
-            'has_prev': pagination.has_prev
+            'has_next': page < pages,
+            'has_prev': page > 1
         }
 
     def get_document_info(self, document_id: str) -> Optional[Dict[str, Any]]:
@@ -764,6 +902,145 @@ class DocumentService:
             logger.error(f"搜索文档失败: {str(e)}")
             return []
     
+    def search_documents_paginated(self, query: str, user_id: str, tenant_id: str,
+                                   tags: Optional[List[str]] = None,
+                                   subject: Optional[Tuple[str, str]] = None,
+                                   page: int = 1, per_page: int = 20) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        分页搜索文档（过滤、相关性排序和分页均在数据库中完成）
+        
+        关键词的匹配来源与search_documents一致：标题、描述、文件名、标签和页面内容；
+        结果按相关性分数（权重同_calculate_relevance_score）降序、上传时间倒序排列，
+        当前页的文档附带页面内容中的匹配片段
+        
+        Args:
+            query: 搜索关键词
+            user_id: 用户ID
+            tenant_id: 租户ID
+            tags: 必须同时包含的标签列表
+            subject: (学科ID, 学科名称)，文档带有学科名称标签或分类名称包含该学科时视为属于该学科
+            page: 页码
+            per_page: 每页数量
+            
+        Returns:
+            Tuple[List[Dict], int]: 当前页结果和匹配总数
+        """
+        conditions = [
+            Document.user_id == user_id,
+            Document.tenant_id == tenant_id,
+            Document.parse_status == 'completed'
+        ]
+        
+        if subject is not None:
+            subject_id, subject_name = subject
+            conditions.append(db.or_(
+                json_array_contains(Document.tags, subject_name),
+                Document.category.has(db.or_(
+                    DocumentCategory.name.contains(subject_name, autoescape=True),
+                    DocumentCategory.name.contains(str(subject_id), autoescape=True)
+                ))
+            ))
+        
+        # 标签以JSON数组存储，按元素做包含匹配
+        for tag in tags or []:
+            conditions.append(json_array_contains(Document.tags, tag))
+        
+        if query:
+            title_match = Document.title.contains(query, autoescape=True)
+            tag_match = json_array_contains(Document.tags, query)
+            description_match = Document.description.contains(query, autoescape=True)
+            filename_match = Document.filename.contains(query, autoescape=True)
+            content_match = db.exists().where(
+                DocumentPage.document_id == Document.id,
+                DocumentPage.page_content.contains(query, autoescape=True)
+            )
+            conditions.append(db.or_(title_match, tag_match, description_match, filename_match, content_match))
+            relevance = (
+                case((title_match, 0.4), else_=0.0) + case((tag_match, 0.3), else_=0.0)
+                + case((description_match, 0.2), else_=0.0) + case((filename_match, 0.1), else_=0.0)
+            )
+        else:
+            relevance = literal(0.0)
+        relevance = relevance.label('relevance_score')
+        
+        # COUNT(*) OVER() 与当前页数据同一次查询返回
+        rows = db.session.query(Document, relevance, func.count().over().label('total')).options(
+            joinedload(Document.category)
+        ).filter(*conditions).order_by(
+            relevance.desc(), Document.created_at.desc()
+        ).offset((page - 1) * per_page).limit(per_page).all()
+        
+        if rows:
+            total = rows[0].total
+        elif page > 1:
+            total = Document.query.filter(*conditions).count()
+        else:
+            total = 0
+        
+        snippets = self._content_snippets([doc.id for doc, _, _ in rows], query) if query and rows else {}
+        
+        results = []
+        for doc, relevance_score, _ in rows:
+            content_snippet = snippets.get(doc.id)
+            results.append({
+                'id': doc.id,
+                'title': doc.title,
+                'filename': doc.filename,
+                'category': doc.category.name if doc.category else None,
+                'tags': doc.tags or [],
+                'upload_time': doc.created_at.isoformat() if doc.created_at else None,
+                'content': content_snippet,
+                'summary': doc.description or (content_snippet[:200] + '...' if content_snippet else None),
+                'relevance_score': round(float(relevance_score), 2),
+                'match_type': self._paginated_match_type(doc, query) if query else None
+            })
+        
+        return results, total
+    
+    @staticmethod
+    def _paginated_match_type(document: Document, query: str) -> str:
+        """分页搜索结果的匹配类型，分类与search_documents一致"""
+        query_lower = query.lower()
+        if any(query_lower in (value or '').lower()
+               for value in (document.title, document.description, document.filename)):
+            return 'title'
+        if query in (document.tags or []):
+            return 'tag'
+        return 'content'
+    
+    def _content_snippets(self, document_ids: List[str], query: str,
+                          snippet_length: int = 200) -> Dict[str, str]:
+        """
+        一次查询获取多个文档页面内容中首个包含关键词的片段
+        
+        Returns:
+            Dict[str, str]: {文档ID: 内容片段}，页面内容不含关键词的文档不在其中
+        """
+        pages = db.session.query(DocumentPage.document_id, DocumentPage.page_content).filter(
+            DocumentPage.document_id.in_(document_ids),
+            DocumentPage.page_content.contains(query, autoescape=True)
+        ).order_by(DocumentPage.document_id, DocumentPage.page_number)
+        
+        snippets = {}
+        for document_id, content in pages:
+            if document_id not in snippets:
+                snippets[document_id] = self._snippet_around(content, query, snippet_length)
+        return snippets
+    
+    @staticmethod
+    def _snippet_around(content: str, query: str, snippet_length: int) -> str:
+        """截取关键词前后的内容，两端被截断时加省略号"""
+        query_pos = max(content.lower().find(query.lower()), 0)
+        start = max(0, query_pos - snippet_length // 2)
+        end = min(len(content), query_pos + len(query) + snippet_length // 2)
+        
+        snippet = content[start:end]
+        if start > 0:
+            snippet = '...' + snippet
+        if end < len(content):
+            snippet = snippet + '...'
+        return snippet
+    
     def _calculate_relevance_score(self, document: Document, query: str) -> float:
         """
         计算文档与查询的相关性分数
@@ -832,26 +1109,7 @@ class DocumentService:
             内容片段或None
         """
         try:
-            pages = DocumentPage.query.filter_by(document_id=document_id).all()
-            
-            for page in pages:
-                if page.text_content and query.lower() in page.text_content.lower():
-                    content = page.text_content
-                    query_pos = content.lower().find(query.lower())
-                    
-                    # 获取关键词前后的内容
-                    start = max(0, query_pos - snippet_length // 2)
-                    end = min(len(content), query_pos + len(query) + snippet_length // 2)
-                    
-                    snippet = content[start:end]
-                    if start > 0:
-                        snippet = '...' + snippet
-                    if end < len(content):
-                        snippet = snippet + '...'
-                    
-                    return snippet
-            
-            return None
+            return self._content_snippets([document_id], query, snippet_length).get(document_id)
         except Exception as e:
             logger.error(f"获取内容片段失败: {str(e)}")
             return None
@@ -12,17 +12,55 @@ Version: 1.0.0
 License: Apache License 2.0
 """
 
-from typing import List, Dict, Any, Optional
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from flask import current_app
 from sqlalchemy import func, and_, or_
 from models import (
     ExamPaper, Question, KnowledgePoint, Chapter, Subject,
     ExamKnowledgeMapping, ExamKnowledgeStatistics
 )
+from utils.cache import VersionedCache
 from utils.database import db
 import logging
 
 logger = logging.getLogger(__name__)
 
+# 星图、统计和分析结果只在映射或统计更新后变化，按学科缓存，更新时整体失效
+_subject_result_cache = VersionedCache('exam_knowledge', maxsize=1024, ttl=300)
+
+def invalidate_subject_knowledge_cache(subject_id: str) -> None:
+    """学科的映射或统计信息变化后使其缓存结果失效"""
+    _subject_result_cache.invalidate(subject_id)
+
+def cached_subject_result(kind: str, subject_id: str, params: Tuple,
+                          compute: Callable[[], Any]) -> Any:
+    """
+    按学科和筛选参数缓存只读的统计类结果
+    
+    Args:
+        kind: 结果类型，如star_map、statistics、analysis
+        subject_id: 学科ID
+        params: 影响结果的全部筛选参数
+        compute: 缓存未命中时计算结果的函数
+    """
+    return _subject_result_cache.get_or_compute(subject_id, (kind, params), compute)
+
+# 批量更新映射时的最大并发试卷数
+_BATCH_MAPPING_MAX_WORKERS = 8
+
+def _batch_mapping_workers(paper_count: int) -> int:
+    """按连接池大小确定并发数，为请求线程保留连接；SQLite写入串行，只用单线程"""
+    if db.engine.dialect.name == 'sqlite':
+        return 1
+    pool_size = current_app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}).get('pool_size', 5)
+    return max(1, min(_BATCH_MAPPING_MAX_WORKERS, pool_size - 2, paper_count))
+
+def _update_paper_mapping(exam_paper_id: str, app_context) -> None:
+    """在独立的应用上下文（即独立会话）中更新单份试卷的映射，各自提交"""
+    with app_context():
+        ExamKnowledgeService.create_mapping_for_paper(exam_paper_id)
+
 class ExamKnowledgeService:
     """试卷知识点映射服务"""
 
@@ -126,6 +164,7 @@ class ExamKnowledgeService:
                 mappings.append(mapping)
 
             db.session.commit()
+            invalidate_subject_knowledge_cache(exam_paper.subject_id)
             logger.info(f"为试卷 {exam_paper_id} 创建了 {len(mappings)} 个知识点映射")
             return mappings
 
@@ -259,6 +298,7 @@ class ExamKnowledgeService:
                 statistics_list.append(stats)
 
             db.session.commit()
+            invalidate_subject_knowledge_cache(subject_id)
             logger.info(f"更新了 {len(statistics_list)} 个知识点的统计信息")
             return statistics_list
 
@@ -270,7 +310,16 @@ class ExamKnowledgeService:
     @staticmethod
     def get_star_map_data(subject_id: str, year: Optional[int] = None,
                          exam_type: Optional[str] = None) -> Dict[str, Any]:
-        """获取星图展示数据"""
+        """获取星图展示数据，结果按学科和筛选参数缓存"""
+        return cached_subject_result(
+            'star_map', subject_id, (year, exam_type),
+            lambda: ExamKnowledgeService._build_star_map_data(subject_id, year, exam_type)
+        )
+
+    @staticmethod
+    def _build_star_map_data(subject_id: str, year: Optional[int] = None,
+                             exam_type: Optional[str] = None) -> Dict[str, Any]:
+        """构建星图展示数据"""
         try:
             # 获取知识点统计数据
             query = ExamKnowledgeStatistics.query.filter_by(subject_id=subject_id)
@@ -446,28 +495,37 @@ class ExamKnowledgeService:
     def batch_update_mappings(subject_id: str) -> Dict[str, int]:
         """批量更新学科下所有试卷的映射关系"""
         try:
-            # 获取学科下的所有试卷
-            exam_papers = ExamPaper.query.filter_by(
+            # 获取学科下的所有试卷ID
+            paper_ids = [paper_id for paper_id, in db.session.query(ExamPaper.id).filter_by(
                 subject_id=subject_id,
                 is_active=True
-            ).all()
+            )]
 
             updated_count = 0
             failed_count = 0
 
-            for paper in exam_papers:
-                try:
-                    ExamKnowledgeService.create_mapping_for_paper(paper.id)
-                    updated_count += 1
-                except Exception as e:
-                    logger.error(f"更新试卷 {paper.id} 映射失败: {str(e)}")
-                    failed_count += 1
+            # 各试卷的映射相互独立，由有限的线程池并发处理；
+            # 每个任务使用自己的会话并单独提交，单份失败不影响其余试卷
+            if paper_ids:
+                app_context = current_app._get_current_object().app_context
+                with ThreadPoolExecutor(max_workers=_batch_mapping_workers(len(paper_ids))) as executor:
+                    futures = {
+                        executor.submit(_update_paper_mapping, paper_id, app_context): paper_id
+                        for paper_id in paper_ids
+                    }
+                    for future in as_completed(futures):
+                        try:
+                            future.result()
+                            updated_count += 1
+                        except Exception as e:
+                            logger.error(f"更新试卷 {futures[future]} 映射失败: {str(e)}")
+                            failed_count += 1
 
             # 更新统计信息
             ExamKnowledgeService.update_knowledge_statistics(subject_id)
 
             return {
-                'total_papers': len(exam_papers),
+                'total_papers': len(paper_ids),
                 'updated_count': updated_count,
                 'failed_count': failed_count
             }
@@ -13,17 +13,138 @@ License: Apache License 2.0
 """
 
 import json
+import logging
+import base64
+import hashlib
 import random
+import threading
+import time
+from collections import namedtuple
 from datetime import datetime, timedelta
 from typing import List, Dict, Any, Optional, Tuple
-from sqlalchemy import and_, update
+from sqlalchemy import and_, or_, func, case, update
 from sqlalchemy.orm import Session
+from cachetools import TTLCache
+import orjson
+import redis
 
-from models.exam import ExamSession, ExamType, ExamStatus, DifficultyLevel
+from models.exam import ExamSession, ExamAnalytics, ExamType, ExamStatus, DifficultyLevel
 from models.question import Question, QuestionType
 from models.knowledge import KnowledgePoint, Chapter, Subject
 from services.llm_service import LLMService
+from services.strategy_service import invalidate_user_strategy_cache
 from utils.database import db
+from utils.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+
+# 考试题目快照：一场考试的题目在开始时即已确定，按会话缓存评分和出题所需字段，
+# 答题过程中不再逐题查询题目表
+QuestionSnapshot = namedtuple(
+    'QuestionSnapshot', ['id', 'content', 'type', 'options', 'score', 'correct_answer', 'explanation']
+)
+_exam_question_cache = TTLCache(maxsize=1024, ttl=6 * 3600)
+_exam_question_lock = threading.Lock()
+
+# 重复提交去重：同一用户对同一题提交相同答案时，30秒内直接返回首次提交的结果；
+# 首次提交仍在处理时，后到的请求等待其完成，不重复评分写库。
+# 首次提交以SET NX在Redis中占位，完成后写入结果，重复请求可能落在任意worker进程；
+# Redis不可用时退回进程内去重，只能合并同一进程内的重复提交
+SUBMISSION_DEDUP_SECONDS = 30
+_SUBMISSION_WAIT_SECONDS = 10
+_SUBMISSION_POLL_SECONDS = 0.05
+_SUBMISSION_PENDING = b'pending'
+_submission_results = TTLCache(maxsize=10000, ttl=SUBMISSION_DEDUP_SECONDS)
+_submission_lock = threading.Lock()
+
+# 考试状态推送：答题、交卷后经Redis发布订阅向该会话的所有推送连接广播增量，
+# 订阅连接可能位于任意worker进程；客户端无需反复轮询会话详情
+def session_event_channel(session_id: int) -> str:
+    """考试会话状态事件的发布订阅频道名"""
+    return f'exam:session:{session_id}:events'
+
+
+def publish_session_event(session_id: int, event: Dict[str, Any]) -> None:
+    """向考试会话的所有订阅者推送事件；推送只是轮询的补充，Redis不可用时记录后忽略"""
+    try:
+        get_redis().publish(
+            session_event_channel(session_id),
+            orjson.dumps(event, default=str, option=orjson.OPT_NON_STR_KEYS)
+        )
+    except redis.RedisError as e:
+        logger.warning(f"考试状态事件推送失败: {e}")
+
+
+# 考试计时：开始、重置和交卷后写入Redis哈希，计时状态查询不必读取会话行；
+# 哈希缺失（Redis重启、写入失败、写入前已开始的考试）或Redis不可用时回退到只查询计时列
+ExamTiming = namedtuple(
+    'ExamTiming', ['status', 'actual_start_time', 'end_time', 'total_time_minutes', 'pause_duration']
+)
+# 考试时长（交卷后则从交卷时起）之外计时哈希的保留时长（秒）
+_EXAM_TIMING_GRACE_SECONDS = 3600
+
+
+def exam_timing_key(session_id: int) -> str:
+    """考试计时哈希的键名"""
+    return f'exam:timing:{session_id}'
+
+
+def save_exam_timing(session_id: int, user_id: str, timing: ExamTiming) -> None:
+    """写入考试计时哈希；写入失败时尽量删除旧哈希，查询回退到数据库"""
+    key = exam_timing_key(session_id)
+    ttl = _EXAM_TIMING_GRACE_SECONDS
+    if timing.end_time is None:
+        ttl += (timing.total_time_minutes or 0) * 60
+    mapping = {
+        'user_id': str(user_id),
+        'status': timing.status,
+        'actual_start_time': timing.actual_start_time.isoformat(),
+        'end_time': timing.end_time.isoformat() if timing.end_time else '',
+        'total_time_minutes': timing.total_time_minutes or 0,
+        'pause_duration': timing.pause_duration or 0
+    }
+    try:
+        pipe = get_redis().pipeline()
+        pipe.hset(key, mapping=mapping)
+        pipe.expire(key, ttl)
+        pipe.execute()
+    except redis.RedisError as e:
+        logger.warning(f"考试计时写入失败: {e}")
+        drop_exam_timing(session_id)
+
+
+def drop_exam_timing(session_id: int) -> None:
+    """删除考试计时哈希，之后的查询回退到数据库"""
+    try:
+        get_redis().delete(exam_timing_key(session_id))
+    except redis.RedisError as e:
+        logger.warning(f"考试计时删除失败: {e}")
+
+
+def load_exam_timing(session_id: int) -> Optional[Tuple[str, ExamTiming]]:
+    """
+    读取考试计时哈希
+
+    Returns:
+        Optional[Tuple[str, ExamTiming]]: (用户ID, 计时信息)；哈希不存在或Redis不可用时为None
+    """
+    try:
+        data = get_redis().hgetall(exam_timing_key(session_id))
+    except redis.RedisError as e:
+        logger.warning(f"考试计时读取失败: {e}")
+        return None
+    if not data:
+        return None
+    data = {k.decode('utf-8'): v.decode('utf-8') for k, v in data.items()}
+    timing = ExamTiming(
+        status=data['status'],
+        actual_start_time=datetime.fromisoformat(data['actual_start_time']),
+        end_time=datetime.fromisoformat(data['end_time']) if data['end_time'] else None,
+        total_time_minutes=int(data['total_time_minutes']),
+        pause_duration=int(data['pause_duration'])
+    )
+    return data['user_id'], timing
 
 
 class ExamService:
@@ -92,7 +213,7 @@ class ExamService:
                 'status': exam_session.status,
                 'total_questions': total_questions,
                 'total_time_minutes': total_time_minutes,
-                'created_time': exam_session.created_time.isoformat()
+                'created_time': exam_session.created_time
             }
 
         except Exception as e:
@@ -168,36 +289,39 @@ class ExamService:
             if status_val != ExamStatus.SCHEDULED.value:
                 raise ValueError("考试状态不正确")
 
+            # 提交前读取所需字段并获取第一题，避免提交后会话对象过期而重新查询
+            total_time_minutes = exam_session.total_time_minutes
+            total_questions = exam_session.total_questions
+            pause_duration = exam_session.pause_duration
+            first_question = self._get_question_by_index(exam_session, 0)
+
             # 更新状态和开始时间
+            actual_start_time = datetime.utcnow()
             db.session.execute(
                 update(ExamSession)
                 .where(ExamSession.id == session_id)
                 .values(
                     status=ExamStatus.IN_PROGRESS.value,
-                    actual_start_time=datetime.utcnow(),
+                    actual_start_time=actual_start_time,
                     current_question_index=0,
-                    updated_time=datetime.utcnow()
+                    updated_time=actual_start_time
                 )
             )
 
             db.session.commit()
-
-            # 获取第一题
-            first_question = self._get_question_by_index(exam_session, 0)
-
-            # 获取实际开始时间
-            actual_start_time = getattr(exam_session, 'actual_start_time', None)
-            start_time_iso = actual_start_time.isoformat() if actual_start_time else None
+            save_exam_timing(session_id, user_id, ExamTiming(
+                ExamStatus.IN_PROGRESS.value, actual_start_time, None, total_time_minutes, pause_duration
+            ))
             
             return {
                 'session_id': session_id,
                 'status': ExamStatus.IN_PROGRESS.value,
-                'start_time': start_time_iso,
-                'total_time_minutes': exam_session.total_time_minutes,
+                'start_time': actual_start_time,
+                'total_time_minutes': total_time_minutes,
                 'current_question': first_question,
                 'progress': {
                     'current_index': 0,
-                    'total_questions': exam_session.total_questions,
+                    'total_questions': total_questions,
                     'percentage': 0.0
                 }
             }
@@ -209,8 +333,132 @@ class ExamService:
     def submit_answer(self, user_id: str, session_id: int, question_id: int,
                      answer: str, time_spent: int, confidence_level: Optional[float] = None,
                      is_guess: bool = False) -> Dict[str, Any]:
-        """提交答案"""
+        """提交答案，短时间内的重复提交返回首次提交的结果"""
+        answer_hash = hashlib.sha256(
+            json.dumps(answer, sort_keys=True, ensure_ascii=False, default=str).encode('utf-8')
+        ).hexdigest()
+        submit = lambda: self._submit_single_answer(user_id, session_id, question_id, answer,
+                                                    time_spent, confidence_level, is_guess)
+
+        client = get_redis()
+        redis_key = f'idem:{user_id}:{session_id}:{question_id}:{answer_hash}'
+        try:
+            claimed = client.set(redis_key, _SUBMISSION_PENDING, nx=True, ex=SUBMISSION_DEDUP_SECONDS)
+        except redis.RedisError as e:
+            logger.warning(f"提交去重占位失败，改用进程内去重: {e}")
+            return self._submit_answer_locally((str(user_id), session_id, str(question_id), answer_hash), submit)
+
+        if not claimed:
+            stored = self._wait_submission_result(client, redis_key)
+            if stored is not None:
+                return stored
+            # 首次提交失败或处理超时，按正常提交处理
+            return submit()
+
+        try:
+            result = submit()
+        except Exception:
+            try:
+                client.delete(redis_key)
+            except redis.RedisError as e:
+                logger.warning(f"提交去重占位清除失败: {e}")
+            raise
+
+        try:
+            client.set(redis_key, orjson.dumps(result, default=str), ex=SUBMISSION_DEDUP_SECONDS)
+        except redis.RedisError as e:
+            logger.warning(f"提交结果写入去重缓存失败: {e}")
+        return result
+
+    @staticmethod
+    def _wait_submission_result(client: redis.Redis, redis_key: str) -> Optional[Dict[str, Any]]:
+        """
+        等待首次提交写入结果
+
+        Returns:
+            Optional[Dict[str, Any]]: 首次提交的结果；首次提交失败、超时或Redis不可用时为None
+        """
+        deadline = time.monotonic() + _SUBMISSION_WAIT_SECONDS
         try:
+            while True:
+                stored = client.get(redis_key)
+                if stored is None:
+                    return None
+                if stored != _SUBMISSION_PENDING:
+                    return orjson.loads(stored)
+                if time.monotonic() >= deadline:
+                    return None
+                time.sleep(_SUBMISSION_POLL_SECONDS)
+        except redis.RedisError as e:
+            logger.warning(f"读取提交去重结果失败: {e}")
+            return None
+
+    @staticmethod
+    def _submit_answer_locally(key: Tuple, submit) -> Dict[str, Any]:
+        """Redis不可用时的进程内提交去重"""
+        with _submission_lock:
+            entry = _submission_results.get(key)
+            if entry is None:
+                _submission_results[key] = threading.Event()
+        if isinstance(entry, threading.Event):
+            entry.wait(timeout=_SUBMISSION_WAIT_SECONDS)
+            with _submission_lock:
+                entry = _submission_results.get(key)
+        if isinstance(entry, dict):
+            return dict(entry)
+        if entry is not None:
+            # 首次提交处理超时，按正常提交处理
+            key = None
+
+        try:
+            result = submit()
+        except Exception:
+            if key is not None:
+                with _submission_lock:
+                    pending = _submission_results.pop(key, None)
+                if isinstance(pending, threading.Event):
+                    pending.set()
+            raise
+
+        if key is not None:
+            with _submission_lock:
+                pending = _submission_results.get(key)
+                _submission_results[key] = result
+            if isinstance(pending, threading.Event):
+                pending.set()
+        return dict(result)
+
+    def _submit_single_answer(self, user_id: str, session_id: int, question_id: int,
+                              answer: str, time_spent: int, confidence_level: Optional[float],
+                              is_guess: bool) -> Dict[str, Any]:
+        """提交单题答案"""
+        result = self.submit_answers(user_id, session_id, [{
+            'question_id': question_id,
+            'answer': answer,
+            'time_spent': time_spent,
+            'confidence_level': confidence_level,
+            'is_guess': is_guess
+        }])
+        graded = result.pop('results')[0]
+        return {
+            'is_correct': graded['is_correct'],
+            'score': graded['score'],
+            'explanation': graded['explanation'],
+            **result
+        }
+
+    def submit_answers(self, user_id: str, session_id: int,
+                       submissions: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        批量提交答案
+
+        客户端可在本地缓冲多道题的答案后一次提交：会话读取一次、
+        题目取自会话题目快照、会话数据一次UPDATE写回
+        """
+        try:
+            if not submissions:
+                raise ValueError("没有需要提交的答案")
+
             # 获取考试会话
             exam_session = db.session.query(ExamSession).filter(
                 and_(
@@ -228,44 +476,57 @@ class ExamService:
 
             # 检查题目是否属于当前考试
             question_ids_list = exam_session.question_ids or []
-            if str(question_id) not in question_ids_list:
+            submitted_ids = [str(item['question_id']) for item in submissions]
+            if any(qid not in question_ids_list for qid in submitted_ids):
                 raise ValueError("题目不属于当前考试")
 
-            # 获取题目信息
-            question = db.session.query(Question).get(question_id)
-            if not question:
-                raise ValueError("题目不存在")
+            # 已答题目和下一题均从会话题目快照中读取
+            total_questions_count = getattr(exam_session, 'total_questions', 0) or 0
+            current_index = exam_session.current_question_index or 0
+            next_index = current_index + len(submissions)
+            next_question_id = None
+            if next_index < min(total_questions_count, len(question_ids_list)):
+                next_question_id = str(question_ids_list[next_index])
 
-            # 检查答案并计算得分
-            is_correct, score = self._check_answer(question, answer)
+            questions = self._load_session_questions(session_id, question_ids_list)
+            if any(qid not in questions for qid in submitted_ids):
+                raise ValueError("题目不存在")
 
             # 更新答案记录
             current_answers = getattr(exam_session, 'answers', None) or {}
             current_times = getattr(exam_session, 'question_times', None) or {}
             current_attempts = getattr(exam_session, 'question_attempts', None) or {}
-
-            # 检查是否是新答案
-            is_new_answer = str(question_id) not in current_answers
-
-            current_answers[str(question_id)] = {
-                'answer': answer,
-                'is_correct': is_correct,
-                'score': score,
-                'confidence_level': confidence_level,
-                'is_guess': is_guess,
-                'submitted_at': datetime.utcnow().isoformat()
-            }
-            current_times[str(question_id)] = time_spent
-            current_attempts[str(question_id)] = current_attempts.get(str(question_id), 0) + 1
-
-            # 更新完成题目数（只有新答案才增加）
             completed_count = getattr(exam_session, 'completed_questions', 0) or 0
-            if is_new_answer:
-                completed_count += 1
+            submitted_at = datetime.utcnow().isoformat()
+
+            results = []
+            for qid, item in zip(submitted_ids, submissions):
+                question = questions[qid]
+
+                # 检查答案并计算得分
+                is_correct, score = self._check_answer(question, item['answer'])
+
+                # 更新完成题目数（只有新答案才增加）
+                if qid not in current_answers:
+                    completed_count += 1
+
+                current_answers[qid] = {
+                    'answer': item['answer'],
+                    'is_correct': is_correct,
+                    'score': score,
+                    'confidence_level': item.get('confidence_level'),
+                    'is_guess': item.get('is_guess', False),
+                    'submitted_at': submitted_at
+                }
+                current_times[qid] = item['time_spent']
+                current_attempts[qid] = current_attempts.get(qid, 0) + 1
 
-            # 更新当前题目索引
-            current_index = exam_session.current_question_index or 0
-            next_index = current_index + 1
+                results.append({
+                    'question_id': question.id,
+                    'is_correct': is_correct,
+                    'score': score,
+                    'explanation': getattr(question, 'explanation', '')
+                })
 
             # 使用update方法更新会话数据
             db.session.execute(
@@ -281,42 +542,44 @@ class ExamService:
                 )
             )
 
-            db.session.commit()
-
-            # 获取下一题
             next_question = None
-            total_questions_count = getattr(exam_session, 'total_questions', 0) or 0
-            # 确保next_index是整数类型
-            next_index_int = int(next_index) if isinstance(next_index, (int, float)) else 0
-            if next_index_int < total_questions_count:
-                next_question = self._get_question_by_index(exam_session, next_index_int)
+            if next_question_id and next_question_id in questions:
+                next_question = self._question_payload(questions[next_question_id], next_index)
+
+            db.session.commit()
 
             # 计算统计信息
             correct_count = sum(1 for ans in current_answers.values() if ans.get('is_correct', False))
             total_score = sum(ans.get('score', 0) for ans in current_answers.values())
 
+            progress = {
+                'answered': completed_count,
+                'total': total_questions_count,
+                'percentage': (completed_count / total_questions_count) * 100 if total_questions_count > 0 else 0
+            }
+            statistics = {
+                'correct_answers': correct_count,
+                'total_score': total_score,
+                'accuracy': (correct_count / completed_count) * 100 if completed_count > 0 else 0
+            }
+            publish_session_event(session_id, {
+                'event': 'progress',
+                'progress': progress,
+                'statistics': statistics
+            })
+
             return {
-                'is_correct': is_correct,
-                'score': score,
-                'explanation': getattr(question, 'explanation', ''),
+                'results': results,
                 'next_question': next_question,
-                'progress': {
-                    'answered': completed_count,
-                    'total': total_questions_count,
-                    'percentage': (completed_count / total_questions_count) * 100 if total_questions_count > 0 else 0
-                },
-                'statistics': {
-                    'correct_answers': correct_count,
-                    'total_score': total_score,
-                    'accuracy': (correct_count / completed_count) * 100 if completed_count > 0 else 0
-                }
+                'progress': progress,
+                'statistics': statistics
             }
 
         except Exception as e:
             db.session.rollback()
             raise Exception(f"提交答案失败: {str(e)}")
 
-    def _check_answer(self, question: Question, answer: str) -> Tuple[bool, float]:
+    def _check_answer(self, question: QuestionSnapshot, answer: str) -> Tuple[bool, float]:
         """检查答案正确性"""
         try:
             correct_answer = question.correct_answer
@@ -346,7 +609,7 @@ class ExamService:
             # 评分失败，给予部分分数
             return False, getattr(question, 'score', 5) * 0.3
 
-    def _evaluate_subjective_answer(self, question: Question, answer: str) -> Tuple[bool, float]:
+    def _evaluate_subjective_answer(self, question: QuestionSnapshot, answer: str) -> Tuple[bool, float]:
         """评估主观题答案"""
         try:
             # 使用LLM服务评分
@@ -377,24 +640,63 @@ class ExamService:
             if index >= len(question_ids_list):
                 return None
 
-            question_id = question_ids_list[index]
-            question = db.session.query(Question).get(int(question_id))
+            questions = self._load_session_questions(exam_session.id, question_ids_list)
+            question = questions.get(str(question_ids_list[index]))
 
             if not question:
                 return None
 
-            return {
-                'question_id': question.id,
-                'question_index': index,
-                'question_text': question.content,
-                'question_type': question.type,
-                'options': getattr(question, 'options', []),
-                'score': getattr(question, 'score', 5)
-            }
+            return self._question_payload(question, index)
 
         except Exception:
             return None
 
+    def _load_session_questions(self, session_id: int, question_ids: List[Any]) -> Dict[str, QuestionSnapshot]:
+        """
+        获取考试会话的题目快照
+
+        首次访问时一次查询取回整场考试的题目，之后直接读取进程内缓存
+        """
+        with _exam_question_lock:
+            questions = _exam_question_cache.get(session_id)
+        if questions is not None:
+            return questions
+
+        ids = [str(question_id) for question_id in question_ids]
+        rows = db.session.query(
+            Question.id,
+            Question.content,
+            QuestionType.code,
+            Question.options,
+            Question.score,
+            Question.answer,
+            Question.solution
+        ).outerjoin(
+            QuestionType, Question.question_type_id == QuestionType.id
+        ).filter(Question.id.in_(ids)).all() if ids else []
+
+        questions = {row[0]: QuestionSnapshot(*row) for row in rows}
+        with _exam_question_lock:
+            _exam_question_cache[session_id] = questions
+        return questions
+
+    @staticmethod
+    def _evict_session_questions(session_id: int) -> None:
+        """考试结束后清除题目快照"""
+        with _exam_question_lock:
+            _exam_question_cache.pop(session_id, None)
+
+    def _question_payload(self, question: QuestionSnapshot, index: int) -> Dict[str, Any]:
+        """组装返回给前端的题目信息"""
+        return {
+            'question_id': question.id,
+            'question_index': index,
+            'question_text': question.content,
+            'question_type': question.type,
+            'options': getattr(question, 'options', []),
+            'score': getattr(question, 'score', 5)
+        }
+
     def complete_exam(self, user_id: str, session_id: int) -> Dict[str, Any]:
         """完成考试"""
         try:
@@ -424,20 +726,107 @@ class ExamService:
             exam_session.correct_answers = statistics['correct_answers']
             exam_session.wrong_answers = statistics['wrong_answers']
             exam_session.updated_time = datetime.utcnow()
+            timing = ExamTiming(
+                ExamStatus.COMPLETED.value, exam_session.actual_start_time, exam_session.end_time,
+                exam_session.total_time_minutes, exam_session.pause_duration
+            )
 
             db.session.commit()
+            invalidate_user_strategy_cache(user_id)
+            self._evict_session_questions(session_id)
+            save_exam_timing(session_id, user_id, timing)
 
-            return {
+            result = {
                 'session_id': session_id,
                 'status': ExamStatus.COMPLETED.value,
                 'statistics': statistics,
-                'completed_at': datetime.utcnow().isoformat()
+                'completed_at': datetime.utcnow()
             }
+            publish_session_event(session_id, {'event': 'completed', **result})
+            return result
 
         except Exception as e:
             db.session.rollback()
             raise Exception(f"完成考试失败: {str(e)}")
 
+    def generate_exam_analytics(self, session_id: int) -> Optional[int]:
+        """
+        生成考试分析报告
+
+        在考试完成后于后台执行，返回分析报告ID
+        """
+        exam_session = db.session.get(ExamSession, session_id)
+        if not exam_session:
+            return None
+
+        answers = exam_session.answers if isinstance(exam_session.answers, dict) else {}
+        question_times = exam_session.question_times if isinstance(exam_session.question_times, dict) else {}
+
+        # 题目难度一次查询取回
+        difficulties = dict(
+            db.session.query(Question.id, Question.difficulty).filter(
+                Question.id.in_(list(answers.keys()))
+            ).all()
+        ) if answers else {}
+
+        by_difficulty: Dict[str, List[int]] = {}
+        for question_id, answer in answers.items():
+            level = str(difficulties.get(question_id, 'unknown'))
+            stats = by_difficulty.setdefault(level, [0, 0])
+            stats[0] += 1 if answer.get('is_correct') else 0
+            stats[1] += 1
+        accuracy_by_difficulty = {
+            level: round(correct / total * 100, 2) for level, (correct, total) in by_difficulty.items()
+        }
+
+        total_time = sum(question_times.values())
+        answered = len(question_times)
+        slowest = sorted(question_times.items(), key=lambda item: item[1], reverse=True)[:3]
+        time_analysis = {
+            'total_time_seconds': total_time,
+            'average_time_per_question': round(total_time / answered, 2) if answered else 0,
+            'slowest_questions': [
+                {'question_id': question_id, 'time_spent': spent} for question_id, spent in slowest
+            ]
+        }
+
+        strengths = [f"难度{level}题目准确率{rate}%" for level, rate in accuracy_by_difficulty.items() if rate >= 80]
+        weaknesses = [f"难度{level}题目准确率{rate}%" for level, rate in accuracy_by_difficulty.items() if rate < 60]
+
+        analytics = ExamAnalytics(
+            exam_session_id=exam_session.id,
+            user_id=exam_session.user_id,
+            time_analysis=time_analysis,
+            accuracy_by_difficulty=accuracy_by_difficulty,
+            strengths=strengths,
+            weaknesses=weaknesses
+        )
+        db.session.add(analytics)
+        db.session.commit()
+        return analytics.id
+
+    def get_user_sessions_version(self, user_id: str) -> Tuple[int, Optional[datetime]]:
+        """
+        获取用户考试会话的版本标识(会话数, 最近更新时间)
+        
+        会话新增、答题、状态变化都会改变该值，接口据此生成ETag，
+        客户端轮询时数据未变化即可直接返回304
+        """
+        count, last_updated = db.session.query(
+            func.count(ExamSession.id), func.max(ExamSession.updated_time)
+        ).filter(ExamSession.user_id == user_id).one()
+        return count, last_updated
+
+    def get_exam_analytics(self, user_id: str, analytics_id: Optional[int] = None,
+                           session_id: Optional[int] = None) -> Optional[ExamAnalytics]:
+        """按分析报告ID或考试会话ID获取分析报告"""
+        query = db.session.query(ExamAnalytics).filter(ExamAnalytics.user_id == user_id)
+        if analytics_id is not None:
+            query = query.filter(ExamAnalytics.id == analytics_id)
+        if session_id is not None:
+            query = query.filter(ExamAnalytics.exam_session_id == session_id)
+        return query.order_by(ExamAnalytics.id.desc()).first()
+
     def _calculate_final_statistics(self, exam_session: ExamSession) -> Dict[str, Any]:
         """计算最终统计信息"""
         answers = getattr(exam_session, 'answers', None)
@@ -466,6 +855,186 @@ class ExamService:
             'average_time_per_question': total_time / total_questions if total_questions > 0 else 0
         }
 
+    @staticmethod
+    def _encode_cursor(created_time: datetime, session_id: int) -> str:
+        """将(created_time, id)编码为不透明游标"""
+        raw = f"{created_time.isoformat()}|{session_id}"
+        return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+    @staticmethod
+    def _decode_cursor(cursor: str) -> Tuple[datetime, int]:
+        """解析游标"""
+        try:
+            raw = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8')
+            created_time, session_id = raw.rsplit('|', 1)
+            return datetime.fromisoformat(created_time), int(session_id)
+        except Exception:
+            raise ValueError("无效的分页游标")
+
+    def get_user_exam_sessions(self, user_id: str, status: Optional[str] = None,
+                               exam_type: Optional[str] = None, subject_id: Optional[int] = None,
+                               per_page: int = 20, cursor: Optional[str] = None,
+                               page: int = 1) -> Dict[str, Any]:
+        """
+        获取用户考试会话列表
+
+        按(created_time, id)倒序做键集分页：传入cursor时从游标位置继续读取，
+        不再扫描并丢弃前面的行；未传cursor时兼容旧的page参数（已废弃）
+        """
+        query = db.session.query(
+            ExamSession.id,
+            ExamSession.title,
+            ExamSession.status,
+            ExamSession.exam_type,
+            ExamSession.score_percentage,
+            ExamSession.created_time
+        ).filter(ExamSession.user_id == user_id)
+
+        if status:
+            query = query.filter(ExamSession.status == status)
+        if exam_type:
+            query = query.filter(ExamSession.exam_type == exam_type)
+        if subject_id:
+            query = query.filter(ExamSession.subject_id == subject_id)
+
+        total = None
+        if cursor:
+            cursor_time, cursor_id = self._decode_cursor(cursor)
+            query = query.filter(or_(
+                ExamSession.created_time < cursor_time,
+                and_(ExamSession.created_time == cursor_time, ExamSession.id < cursor_id)
+            ))
+        else:
+            total = query.with_entities(func.count(ExamSession.id)).scalar() or 0
+            if page > 1:
+                query = query.offset((page - 1) * per_page)
+
+        # 多取一行用于判断是否还有下一页
+        rows = query.order_by(
+            ExamSession.created_time.desc(), ExamSession.id.desc()
+        ).limit(per_page + 1).all()
+        has_next = len(rows) > per_page
+        rows = rows[:per_page]
+
+        next_cursor = None
+        if has_next and rows and rows[-1].created_time is not None:
+            next_cursor = self._encode_cursor(rows[-1].created_time, rows[-1].id)
+
+        pagination = {
+            'per_page': per_page,
+            'has_next': has_next,
+            'next_cursor': next_cursor
+        }
+        if total is not None:
+            pagination.update({
+                'page': page,
+                'total': total,
+                'pages': (total + per_page - 1) // per_page
+            })
+
+        return {
+            'sessions': [
+                {
+                    'session_id': row.id,
+                    'exam_name': row.title,
+                    'status': row.status,
+                    'exam_type': row.exam_type,
+                    'score_percentage': row.score_percentage,
+                    'created_time': row.created_time
+                }
+                for row in rows
+            ],
+            'pagination': pagination
+        }
+
+    @staticmethod
+    def _week_label(column):
+        """按数据库方言生成ISO周标签表达式，如2024-W01"""
+        dialect = db.engine.dialect.name
+        if dialect == 'postgresql':
+            return func.to_char(func.date_trunc('week', column), 'IYYY-"W"IW')
+        if dialect == 'mysql':
+            return func.date_format(column, '%x-W%v')
+        return func.strftime('%Y-W%W', column)
+
+    def get_user_exam_statistics(self, user_id: str, subject_id: Optional[int] = None,
+                                 exam_type: Optional[str] = None, days: int = 30) -> Dict[str, Any]:
+        """
+        获取用户考试统计信息
+
+        分组聚合在数据库中完成：按(周, 考试类型, 分数段, 是否完成)一次GROUP BY，
+        Python只合并少量分组行，不再逐条遍历考试记录
+        """
+        completed = ExamSession.status == ExamStatus.COMPLETED.value
+        score_bucket = case(
+            (~completed, None),
+            (ExamSession.score_percentage >= 90, '90-100'),
+            (ExamSession.score_percentage >= 80, '80-89'),
+            (ExamSession.score_percentage >= 70, '70-79'),
+            (ExamSession.score_percentage >= 60, '60-69'),
+            else_='below_60'
+        )
+        week = self._week_label(ExamSession.created_time)
+        is_completed = case((completed, 1), else_=0)
+
+        query = db.session.query(
+            week.label('week'),
+            ExamSession.exam_type,
+            score_bucket.label('bucket'),
+            is_completed.label('completed'),
+            func.count(ExamSession.id).label('exam_count'),
+            func.sum(ExamSession.score_percentage).label('score_sum'),
+            func.sum(ExamSession.total_time_minutes).label('minutes_sum')
+        ).filter(
+            ExamSession.user_id == user_id,
+            ExamSession.created_time >= datetime.utcnow() - timedelta(days=days)
+        )
+        if subject_id:
+            query = query.filter(ExamSession.subject_id == subject_id)
+        if exam_type:
+            query = query.filter(ExamSession.exam_type == exam_type)
+
+        # 按标签分组：CASE中的绑定参数在SELECT和GROUP BY中会被渲染成不同占位符
+        rows = query.group_by('week', ExamSession.exam_type, 'bucket', 'completed').all()
+
+        total_exams = completed_exams = 0
+        score_sum = minutes_sum = 0.0
+        exam_type_distribution: Dict[str, int] = {}
+        score_distribution: Dict[str, int] = {}
+        weekly: Dict[str, List[float]] = {}
+
+        for row in rows:
+            total_exams += row.exam_count
+            exam_type_distribution[row.exam_type] = exam_type_distribution.get(row.exam_type, 0) + row.exam_count
+            if not row.completed:
+                continue
+            completed_exams += row.exam_count
+            score_sum += row.score_sum or 0
+            minutes_sum += row.minutes_sum or 0
+            score_distribution[row.bucket] = score_distribution.get(row.bucket, 0) + row.exam_count
+            week_stats = weekly.setdefault(row.week, [0.0, 0])
+            week_stats[0] += row.score_sum or 0
+            week_stats[1] += row.exam_count
+
+        return {
+            'total_exams': total_exams,
+            'completed_exams': completed_exams,
+            'completion_rate': round(completed_exams / total_exams * 100, 2) if total_exams else 0.0,
+            'average_score': round(score_sum / completed_exams, 2) if completed_exams else 0.0,
+            # 已完成考试的计划时长合计
+            'total_time_hours': round(minutes_sum / 60, 2),
+            'exam_type_distribution': exam_type_distribution,
+            'score_distribution': score_distribution,
+            'improvement_trend': [
+                {
+                    'week': week_label,
+                    'average_score': round(week_score / week_count, 2),
+                    'exam_count': week_count
+                }
+                for week_label, (week_score, week_count) in sorted(weekly.items())
+            ]
+        }
+
     def get_exam_session(self, session_id: int, user_id: Optional[str] = None) -> Optional[ExamSession]:
         """获取考试会话"""
         try:
@@ -476,6 +1045,57 @@ class ExamService:
         except Exception:
             return None
 
+    def get_stream_snapshot(self, session_id: int, user_id: str) -> Optional[Tuple[Dict[str, Any], bool]]:
+        """
+        获取状态推送连接建立时的会话快照
+
+        Returns:
+            Optional[Tuple[Dict, bool]]: (快照事件, 考试是否已结束)，会话不存在时为None
+        """
+        row = db.session.query(
+            ExamSession.status, ExamSession.total_questions, ExamSession.completed_questions
+        ).filter(ExamSession.id == session_id, ExamSession.user_id == str(user_id)).first()
+        if row is None:
+            return None
+
+        total_questions = row.total_questions or 0
+        answered = row.completed_questions or 0
+        snapshot = {
+            'event': 'snapshot',
+            'session_id': session_id,
+            'status': row.status,
+            'progress': {
+                'answered': answered,
+                'total': total_questions,
+                'percentage': (answered / total_questions) * 100 if total_questions > 0 else 0
+            }
+        }
+        finished = row.status in (
+            ExamStatus.COMPLETED.value, ExamStatus.EXPIRED.value, ExamStatus.CANCELLED.value
+        )
+        return snapshot, finished
+
+    def get_exam_timing(self, session_id: int, user_id: str) -> Optional[ExamTiming]:
+        """
+        获取考试计时信息，优先读取Redis中的计时哈希，未命中时只查询计时相关的列
+
+        Returns:
+            Optional[ExamTiming]: 计时信息，会话不存在或不属于该用户时为None
+        """
+        cached = load_exam_timing(session_id)
+        if cached is not None:
+            owner, timing = cached
+            return timing if owner == str(user_id) else None
+
+        row = db.session.query(
+            ExamSession.status, ExamSession.actual_start_time, ExamSession.end_time,
+            ExamSession.total_time_minutes, ExamSession.pause_duration
+        ).filter(ExamSession.id == session_id, ExamSession.user_id == str(user_id)).first()
+        if row is None:
+            return None
+        return ExamTiming(row.status, row.actual_start_time, row.end_time,
+                          row.total_time_minutes, row.pause_duration)
+
     def reset_exam_session(self, session_id: int, user_id: str) -> bool:
         """重置考试会话"""
         try:
@@ -492,17 +1112,23 @@ class ExamService:
                 return False
             
             # 重置考试状态
+            actual_start_time = datetime.utcnow()
+            timing = ExamTiming(
+                ExamStatus.IN_PROGRESS.value, actual_start_time, None,
+                session.total_time_minutes, session.pause_duration
+            )
             db.session.execute(
                 update(ExamSession)
                 .where(ExamSession.id == session_id)
                 .values(
                     status=ExamStatus.IN_PROGRESS.value,
-                    actual_start_time=datetime.utcnow(),
+                    actual_start_time=actual_start_time,
                     current_question_index=0,
-                    updated_time=datetime.utcnow()
+                    updated_time=actual_start_time
                 )
             )
             db.session.commit()
+            save_exam_timing(session_id, user_id, timing)
             return True
             
         except Exception as e:
@@ -530,7 +1156,7 @@ class ExamService:
                 return None
                 
             question_id = question_ids[question_index]
-            question = db.session.query(Question).get(int(question_id))
+            question = self._load_session_questions(session_id, question_ids).get(str(question_id))
             if not question:
                 return None
                 
@@ -646,6 +1272,7 @@ class ExamService:
                 )
             )
             db.session.commit()
+            drop_exam_timing(session_id)
             return True
         except Exception:
             db.session.rollback()
@@ -668,6 +1295,7 @@ class ExamService:
                 )
             )
             db.session.commit()
+            drop_exam_timing(session_id)
             return True
         except Exception:
             db.session.rollback()
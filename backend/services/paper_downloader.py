@@ -64,7 +64,14 @@ class PaperDownloader:
             # 获取学科信息
             subject = Subject.query.filter_by(id=subject_id, tenant_id=tenant_id).first()
             if not subject:
-                raise ValueError(f"学科不存在: {subject_id}")
+                logger.warning(f"学科不存在: {subject_id}")
+                return {
+                    'success': False,
+                    'error': f"学科不存在: {subject_id}",
+                    'error_code': 'SUBJECT_NOT_FOUND',
+                    'total_found': 0,
+                    'saved_count': 0
+                }
             
             logger.info(f"开始下载学科 {subject.name} 的真题，年份范围: {years}年")
             
@@ -14,15 +14,65 @@ License: Apache License 2.0
 
 
 import json
+import orjson
 from datetime import datetime, timedelta
-from typing import List, Dict, Optional, Tuple
+from typing import Any, List, Dict, Optional, Tuple
 from sqlalchemy import and_, or_, desc, asc
 
 from models.exam import TimeAllocation, ScoringStrategy, ExamSession
 from models.question import Question
 from services.llm_service import LLMService
+from utils.cache import VersionedCache
 from utils.database import db
 
+# 策略建议只取决于用户近期考试表现和考试配置，按用户缓存，用户完成考试后整体失效
+_recommendation_cache = VersionedCache('strategy', maxsize=4096, ttl=300)
+
+def invalidate_user_strategy_cache(user_id) -> None:
+    """用户考试表现变化后使其策略建议缓存失效"""
+    _recommendation_cache.invalidate(user_id)
+
+# 列表接口直接按列查询，跳过ORM实例化；JSON列为空时的默认值与to_dict一致
+_TIME_ALLOCATION_COLUMNS = (
+    TimeAllocation.id, TimeAllocation.user_id, TimeAllocation.exam_session_id,
+    TimeAllocation.strategy_name, TimeAllocation.strategy_description,
+    TimeAllocation.easy_question_time, TimeAllocation.medium_question_time,
+    TimeAllocation.hard_question_time, TimeAllocation.review_time_percentage,
+    TimeAllocation.time_distribution, TimeAllocation.buffer_time,
+    TimeAllocation.actual_time_usage, TimeAllocation.adherence_score,
+    TimeAllocation.effectiveness_score, TimeAllocation.improvement_areas,
+    TimeAllocation.is_active, TimeAllocation.created_time, TimeAllocation.updated_time
+)
+_TIME_ALLOCATION_JSON_DEFAULTS = {
+    'time_distribution': dict, 'actual_time_usage': dict, 'improvement_areas': list
+}
+_SCORING_STRATEGY_COLUMNS = (
+    ScoringStrategy.id, ScoringStrategy.user_id, ScoringStrategy.strategy_name,
+    ScoringStrategy.strategy_type, ScoringStrategy.skip_threshold,
+    ScoringStrategy.guess_threshold, ScoringStrategy.time_pressure_threshold,
+    ScoringStrategy.easy_question_priority, ScoringStrategy.medium_question_priority,
+    ScoringStrategy.hard_question_priority, ScoringStrategy.answer_order_strategy,
+    ScoringStrategy.review_strategy, ScoringStrategy.guess_strategy,
+    ScoringStrategy.risk_tolerance, ScoringStrategy.certainty_threshold,
+    ScoringStrategy.strategy_parameters, ScoringStrategy.usage_count,
+    ScoringStrategy.average_score, ScoringStrategy.success_rate,
+    ScoringStrategy.is_default, ScoringStrategy.is_active,
+    ScoringStrategy.created_time, ScoringStrategy.updated_time
+)
+_SCORING_STRATEGY_JSON_DEFAULTS = {'strategy_parameters': dict}
+
+def _project_rows(columns, json_defaults: Dict[str, Any], *criteria, order_by=None) -> List[Dict]:
+    """按列查询并返回字典列表，空JSON列填充默认值"""
+    rows = db.session.query(*columns).filter(*criteria).order_by(order_by).all()
+    result = []
+    for row in rows:
+        item = row._asdict()
+        for key, factory in json_defaults.items():
+            if item[key] is None:
+                item[key] = factory()
+        result.append(item)
+    return result
+
 class StrategyService:
     """
     策略服务类
@@ -118,6 +168,12 @@ class StrategyService:
         Returns:
             Dict: 最优时间分配建议
         """
+        return self._cached_recommendation(
+            'time_allocation', user_id, exam_config, self._compute_time_allocation
+        )
+    
+    def _compute_time_allocation(self, user_id: int, exam_config: Dict) -> Dict:
+        """计算最优时间分配建议"""
         # 获取用户历史表现数据
         user_performance = self._get_user_performance_data(user_id, exam_config.get('subject_id'))
         
@@ -128,6 +184,30 @@ class StrategyService:
         
         return recommendation
     
+    def _cached_recommendation(self, kind: str, user_id: int, exam_config: Dict, compute) -> Dict:
+        """
+        带缓存地获取策略建议
+        
+        Args:
+            kind: 建议类型
+            user_id: 用户ID
+            exam_config: 考试配置
+            compute: 缓存未命中时的计算函数
+        
+        Returns:
+            Dict: 策略建议
+        """
+        # 以排序键后的JSON编码作为缓存键：{"a": 1}与[["a", 1]]、true与1、1与1.0各自区分
+        try:
+            params = (kind, orjson.dumps(exam_config, option=orjson.OPT_SORT_KEYS))
+        except TypeError:
+            # 配置中含有无法编码为JSON的值时直接计算
+            return compute(user_id, exam_config)
+        
+        return _recommendation_cache.get_or_compute(
+            user_id, params, lambda: compute(user_id, exam_config)
+        )
+    
     def _get_user_performance_data(self, user_id: int, subject_id: Optional[int] = None) -> Dict:
         """
         获取用户历史表现数据
@@ -490,6 +570,12 @@ class StrategyService:
         Returns:
             Dict: 最优得分策略建议
         """
+        return self._cached_recommendation(
+            'scoring_strategy', user_id, exam_config, self._compute_scoring_strategy
+        )
+    
+    def _compute_scoring_strategy(self, user_id: int, exam_config: Dict) -> Dict:
+        """计算最优得分策略建议"""
         # 获取用户历史表现数据
         user_performance = self._get_user_performance_data(user_id, exam_config.get('subject_id'))
         
@@ -725,7 +811,7 @@ class StrategyService:
     
     # ==================== 策略管理 ====================
     
-    def get_user_time_allocations(self, user_id: int) -> List[TimeAllocation]:
+    def get_user_time_allocations(self, user_id: int) -> List[Dict]:
         """
         获取用户的时间分配策略列表
         
@@ -733,16 +819,16 @@ class StrategyService:
             user_id: 用户ID
         
         Returns:
-            List[TimeAllocation]: 时间分配策略列表
+            List[Dict]: 时间分配策略列表，字段与TimeAllocation.to_dict一致
         """
-        return db.session.query(TimeAllocation).filter(
-            and_(
-                TimeAllocation.user_id == user_id,
-                TimeAllocation.is_active == True
-            )
-        ).order_by(desc(TimeAllocation.created_time)).all()
+        return _project_rows(
+            _TIME_ALLOCATION_COLUMNS, _TIME_ALLOCATION_JSON_DEFAULTS,
+            TimeAllocation.user_id == user_id,
+            TimeAllocation.is_active == True,
+            order_by=desc(TimeAllocation.created_time)
+        )
     
-    def get_user_scoring_strategies(self, user_id: int) -> List[ScoringStrategy]:
+    def get_user_scoring_strategies(self, user_id: int) -> List[Dict]:
         """
         获取用户的得分策略列表
         
@@ -750,14 +836,14 @@ class StrategyService:
             user_id: 用户ID
         
         Returns:
-            List[ScoringStrategy]: 得分策略列表
+            List[Dict]: 得分策略列表，字段与ScoringStrategy.to_dict一致
         """
-        return db.session.query(ScoringStrategy).filter(
-            and_(
-                ScoringStrategy.user_id == user_id,
-                ScoringStrategy.is_active == True
-            )
-        ).order_by(desc(ScoringStrategy.created_time)).all()
+        return _project_rows(
+            _SCORING_STRATEGY_COLUMNS, _SCORING_STRATEGY_JSON_DEFAULTS,
+            ScoringStrategy.user_id == user_id,
+            ScoringStrategy.is_active == True,
+            order_by=desc(ScoringStrategy.created_time)
+        )
     
     def update_strategy_effectiveness(self, strategy_id: int, strategy_type: str, 
                                    exam_session: ExamSession):
@@ -854,12 +940,6 @@ class StrategyService:
         # 获取用户最近的表现数据
         user_performance = self._get_user_performance_data(user_id)
         
-        # 分析当前策略的效果
-        current_strategies = {
-            'time_allocations': self.get_user_time_allocations(user_id),
-            'scoring_strategies': self.get_user_scoring_strategies(user_id)
-        }
-        
         # 生成优化建议
         recommendations = {
             'time_allocation_suggestions': self._generate_time_optimization_suggestions(user_performance),
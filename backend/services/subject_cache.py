@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+AI智能学习系统 - 业务服务 - subject_cache.py
+
+Description:
+    学科信息缓存，为各接口的学科存在性校验提供缓存。
+
+Author: Chang Xinglong
+Date: 2025-08-30
+Version: 1.0.0
+License: Apache License 2.0
+"""
+
+from collections import namedtuple
+from typing import Optional
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from models.knowledge import Subject
+from utils.cache import VersionedCache
+from utils.database import db
+
+# 学科信息很少变化，校验时只需ID、名称和所属租户；
+# 学科经ORM更新或删除并提交后在所有worker中失效，其余途径的修改最多延迟TTL后可见
+SubjectInfo = namedtuple('SubjectInfo', ['id', 'name', 'tenant_id'])
+_subject_cache = VersionedCache('subject', maxsize=4096, ttl=300)
+
+def _load_subject(subject_id: str) -> Optional[SubjectInfo]:
+    row = db.session.query(Subject.id, Subject.name, Subject.tenant_id).filter_by(id=subject_id).first()
+    return SubjectInfo(row.id, row.name, row.tenant_id) if row is not None else None
+
+def get_subject(subject_id: str, tenant_id: Optional[str] = None) -> Optional[SubjectInfo]:
+    """
+    获取学科信息（带缓存）
+
+    Args:
+        subject_id: 学科ID
+        tenant_id: 租户ID，指定时学科须属于该租户
+
+    Returns:
+        Optional[SubjectInfo]: 学科信息，不存在或不属于该租户时为None
+    """
+    # 不存在的学科不缓存
+    subject = _subject_cache.get_or_compute(subject_id, (), lambda: _load_subject(subject_id))
+    if subject is None or (tenant_id is not None and subject.tenant_id != tenant_id):
+        return None
+    return subject
+
+def invalidate_subject(subject_id: str) -> None:
+    """使学科的缓存信息失效"""
+    _subject_cache.invalidate(subject_id)
+
+# flush时只记录改动的学科，事务提交后才失效：提交前失效会让其他请求
+# 把尚未提交的旧值重新读入缓存，回滚的改动则无需失效
+_CHANGED_SUBJECTS_KEY = 'subject_cache_changed_ids'
+
+@event.listens_for(Session, 'after_flush')
+def _collect_changed_subjects(session, flush_context):
+    changed = {obj.id for obj in session.dirty | session.deleted if isinstance(obj, Subject)}
+    if changed:
+        session.info.setdefault(_CHANGED_SUBJECTS_KEY, set()).update(changed)
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_committed_subjects(session):
+    changed = session.info.pop(_CHANGED_SUBJECTS_KEY, None)
+    if changed:
+        _subject_cache.invalidate(*changed)
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changed_subjects(session):
+    session.info.pop(_CHANGED_SUBJECTS_KEY, None)
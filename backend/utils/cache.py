@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+AI智能学习系统 - 工具模块 - cache.py
+
+Description:
+    按范围版本号失效的结果缓存，供学科统计、策略建议、学科图谱、学科信息等
+    读多写少的查询结果共用。
+
+Author: Chang Xinglong
+Date: 2025-08-30
+Version: 1.0.0
+License: Apache License 2.0
+"""
+
+import logging
+import threading
+import time
+from typing import Any, Callable, Hashable, Optional, Tuple
+
+import redis
+from cachetools import TTLCache
+
+from utils.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+# Redis不可用后暂停访问的时长（秒），期间只使用进程内缓存，避免每次读取都等待连接超时
+_REDIS_RETRY_SECONDS = 30
+
+class VersionedCache:
+    """
+    按范围（如学科、用户）整体失效的进程内结果缓存
+
+    缓存键为(范围, 版本号, 参数)。版本号保存在Redis中，任一worker使某个范围失效后，
+    所有worker随后读取的都是新版本号，旧结果不再命中并随TTL过期；
+    发起失效的worker同时直接删除本进程中该范围的条目。
+    Redis不可用时版本号记为None，只依赖本进程的删除，其他worker上的旧结果最多延迟TTL后失效。
+    """
+
+    def __init__(self, namespace: str, maxsize: int, ttl: int):
+        """
+        Args:
+            namespace: Redis中版本号键的命名空间
+            maxsize: 进程内最多缓存的结果数
+            ttl: 结果的存活时间（秒）
+        """
+        self.namespace = namespace
+        self._results = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+        self._redis_retry_at = 0.0
+
+    def _version_key(self, scope: str) -> str:
+        return f'cache:version:{self.namespace}:{scope}'
+
+    def _redis(self) -> Optional[redis.Redis]:
+        """获取Redis客户端，最近访问失败时返回None"""
+        if time.monotonic() < self._redis_retry_at:
+            return None
+        return get_redis()
+
+    def _redis_failed(self, error: Exception) -> None:
+        logger.warning(f"缓存版本号读写失败，暂时只使用进程内缓存: {error}")
+        self._redis_retry_at = time.monotonic() + _REDIS_RETRY_SECONDS
+
+    def key(self, scope: Any, params: Hashable = ()) -> Tuple:
+        """
+        生成带当前版本号的缓存键；先取键再计算结果，计算期间发生的失效不会被新结果掩盖
+
+        Args:
+            scope: 失效范围，如学科ID
+            params: 影响结果的其余参数
+        """
+        scope = str(scope)
+        version = None
+        client = self._redis()
+        if client is not None:
+            try:
+                version = int(client.get(self._version_key(scope)) or 0)
+            except redis.RedisError as e:
+                self._redis_failed(e)
+        return (scope, version, params)
+
+    def get(self, key: Tuple) -> Any:
+        """读取缓存结果，未命中时返回None"""
+        with self._lock:
+            return self._results.get(key)
+
+    def set(self, key: Tuple, value: Any) -> None:
+        """写入缓存结果"""
+        with self._lock:
+            self._results[key] = value
+
+    def get_or_compute(self, scope: Any, params: Hashable, compute: Callable[[], Any]) -> Any:
+        """
+        读取缓存结果，未命中时计算并缓存；计算结果为None时不缓存
+
+        Args:
+            scope: 失效范围
+            params: 影响结果的其余参数
+            compute: 缓存未命中时计算结果的函数
+        """
+        key = self.key(scope, params)
+        result = self.get(key)
+        if result is None:
+            result = compute()
+            if result is not None:
+                self.set(key, result)
+        return result
+
+    def invalidate(self, *scopes: Any) -> None:
+        """使指定范围的缓存结果在所有worker中失效"""
+        scopes = {str(scope) for scope in scopes}
+        with self._lock:
+            for key in [key for key in self._results.keys() if key[0] in scopes]:
+                self._results.pop(key, None)
+
+        client = self._redis()
+        if client is None:
+            return
+        try:
+            pipe = client.pipeline(transaction=False)
+            for scope in scopes:
+                pipe.incr(self._version_key(scope))
+            pipe.execute()
+        except redis.RedisError as e:
+            self._redis_failed(e)
@@ -13,8 +13,11 @@ License: Apache License 2.0
 """
 
 
+import json
+from typing import Optional, Tuple
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
+from sqlalchemy.dialects.postgresql import JSONB
 
 # 创建数据库实例
 db = SQLAlchemy()
@@ -41,4 +44,67 @@ def get_db():
     Returns:
         SQLAlchemy: 数据库实例
     """
-    return db
\ No newline at end of file
+    return db
+
+# 分页位置靠前时返回精确总数；翻到较深的页时在PostgreSQL上改用执行计划的行数估计，
+# 避免大表每次翻页都做一次完整的COUNT
+EXACT_COUNT_LIMIT = 10000
+
+def estimate_count(query) -> Optional[int]:
+    """
+    由PostgreSQL执行计划估计查询结果行数
+    
+    Args:
+        query: 已带筛选条件的ORM查询
+        
+    Returns:
+        int: 估计行数，非PostgreSQL数据库返回None
+    """
+    connection = db.session.connection()
+    if connection.dialect.name != 'postgresql':
+        return None
+    
+    compiled = query.enable_eagerloads(False).order_by(None).statement.compile(
+        dialect=connection.dialect, compile_kwargs={'render_postcompile': True}
+    )
+    plan = connection.exec_driver_sql(f'EXPLAIN (FORMAT JSON) {compiled}', compiled.params).scalar()
+    return int(plan[0]['Plan']['Plan Rows'])
+
+def count_rows(query, page: int, per_page: int) -> Tuple[int, bool]:
+    """
+    统计分页查询的总行数
+    
+    Args:
+        query: 未分页、已带筛选条件的ORM查询
+        page: 页码
+        per_page: 每页数量
+        
+    Returns:
+        tuple: (总行数, 是否为估计值)
+    """
+    if page * per_page >= EXACT_COUNT_LIMIT:
+        estimate = estimate_count(query)
+        if estimate is not None:
+            return estimate, True
+    return query.order_by(None).count(), False
+
+def json_array_contains(column, value):
+    """
+    生成“JSON数组列包含某个元素”的筛选条件
+    
+    PostgreSQL上转换为jsonb后使用@>包含运算；其他数据库按元素的JSON编码做文本匹配，
+    同时匹配转义（ensure_ascii）和未转义两种写法，不依赖写入时的序列化选项
+    
+    Args:
+        column: JSON数组列
+        value: 元素值
+        
+    Returns:
+        筛选条件表达式
+    """
+    if db.engine.dialect.name == 'postgresql':
+        return db.cast(column, JSONB).contains([value])
+    
+    text_column = db.cast(column, db.Text)
+    encodings = {json.dumps(value), json.dumps(value, ensure_ascii=False)}
+    return db.or_(*(text_column.contains(encoded, autoescape=True) for encoded in encodings))
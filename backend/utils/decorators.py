@@ -14,8 +14,8 @@ License: Apache License 2.0
 
 
 from functools import wraps
-from flask import request, jsonify, g
-from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
+from flask import request, jsonify, g, current_app
+from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt, verify_jwt_in_request
 from models.user import User
 from models.tenant import Tenant
 from utils.response import error_response
@@ -114,6 +114,47 @@ def tenant_required(f):
     
     return decorated_function
 
+# 开发阶段未接入认证的接口使用的固定身份
+_STUB_USER = '1'
+_STUB_TENANT = 'default'
+
+def with_identity(f):
+    """
+    身份注入装饰器
+    
+    每个请求只解析一次身份并写入g.user_id和g.tenant_id：
+    USE_STUB_AUTH开启时使用固定身份，否则从JWT中读取
+    
+    Args:
+        f: 被装饰的函数
+        
+    Returns:
+        function: 装饰后的函数
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if current_app.config.get('USE_STUB_AUTH', True):
+            g.user_id = _STUB_USER
+            g.tenant_id = _STUB_TENANT
+            return f(*args, **kwargs)
+        
+        try:
+            verify_jwt_in_request()
+        except Exception:
+            return error_response("未登录或登录已过期", 401)
+        
+        identity = get_jwt_identity()
+        if isinstance(identity, dict):
+            g.user_id = identity.get('user_id')
+            g.tenant_id = identity.get('tenant_id') or _STUB_TENANT
+        else:
+            g.user_id = identity
+            g.tenant_id = _STUB_TENANT
+        
+        return f(*args, **kwargs)
+    
+    return decorated_function
+
 def role_required(*roles):
     """
     角色权限装饰器
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+AI智能学习系统 - 工具模块 - redis_client.py
+
+Description:
+    Redis客户端，为需要在多个worker进程间共享的状态（事件推送、任务状态、
+    缓存版本号）提供按REDIS_URL复用的连接。
+
+Author: Chang Xinglong
+Date: 2025-08-30
+Version: 1.0.0
+License: Apache License 2.0
+"""
+
+import threading
+from typing import Dict
+
+import redis
+import redis.asyncio as async_redis
+from flask import current_app
+
+# 客户端自带线程安全的连接池，按URL在进程内复用；
+# 异步客户端绑定创建它的事件循环，每个ASGI worker只有一个事件循环
+_clients: Dict[str, redis.Redis] = {}
+_async_clients: Dict[str, async_redis.Redis] = {}
+_client_lock = threading.Lock()
+
+# 普通命令的读写超时（秒），Redis不可用时请求不至于长时间挂起；
+# 发布订阅的阻塞读取由get_message的timeout单独控制
+_SOCKET_TIMEOUT = 5
+
+def get_redis(url: str = None) -> redis.Redis:
+    """
+    获取共享的Redis客户端
+
+    Args:
+        url: Redis地址，默认取当前应用的REDIS_URL
+
+    Returns:
+        redis.Redis: Redis客户端
+    """
+    url = url or current_app.config['REDIS_URL']
+    client = _clients.get(url)
+    if client is None:
+        with _client_lock:
+            client = _clients.get(url)
+            if client is None:
+                client = redis.Redis.from_url(
+                    url, socket_timeout=_SOCKET_TIMEOUT, socket_connect_timeout=_SOCKET_TIMEOUT,
+                    health_check_interval=30
+                )
+                _clients[url] = client
+    return client
+
+def get_async_redis(url: str) -> async_redis.Redis:
+    """
+    获取共享的异步Redis客户端，只能在ASGI事件循环中使用
+
+    Args:
+        url: Redis地址
+
+    Returns:
+        redis.asyncio.Redis: 异步Redis客户端
+    """
+    client = _async_clients.get(url)
+    if client is None:
+        client = async_redis.Redis.from_url(
+            url, socket_timeout=_SOCKET_TIMEOUT, socket_connect_timeout=_SOCKET_TIMEOUT,
+            health_check_interval=30
+        )
+        _async_clients[url] = client
+    return client
@@ -13,8 +13,47 @@ License: Apache License 2.0
 """
 
 
-from flask import jsonify
-from typing import Any, Dict, Optional
+import logging
+import orjson
+from functools import lru_cache
+from itertools import islice
+from flask import current_app, stream_with_context
+from typing import Any, Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+# 与Flask默认JSON提供器保持一致：允许非字符串键（如按小时、难度分组的int键），
+# 同时直接输出numpy数值和数组
+JSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+def encode_json(data: Any) -> bytes:
+    """
+    按统一选项编码JSON，供响应体及需要预先编码、缓存响应数据的调用方使用
+    
+    Args:
+        data: 待编码数据
+        
+    Returns:
+        bytes: JSON字节串
+    """
+    return orjson.dumps(data, default=current_app.json.default, option=JSON_OPTIONS)
+
+def _json_response(payload: Dict, code: int):
+    """
+    使用orjson序列化响应体
+    
+    datetime由orjson直接输出为ISO 8601字符串，调用方无需预先isoformat()；
+    orjson不支持的类型（Decimal等）交给Flask默认JSON提供器处理
+    
+    Args:
+        payload: 响应字典
+        code: 状态码
+        
+    Returns:
+        Response: JSON响应对象
+    """
+    body = encode_json(payload)
+    return current_app.response_class(body, status=code, mimetype='application/json')
 
 def success_response(data: Any = None, message: str = "操作成功", code: int = 200) -> Dict:
     """
@@ -37,7 +76,7 @@ def success_response(data: Any = None, message: str = "操作成功", code: int
     if data is not None:
         response["data"] = data
     
-    return jsonify(response), code
+    return _json_response(response, code), code
 
 def error_response(message: str = "操作失败", code: int = 400, error_code: Optional[str] = None) -> Dict:
     """
@@ -60,7 +99,107 @@ def error_response(message: str = "操作失败", code: int = 400, error_code: O
     if error_code:
         response["error_code"] = error_code
     
-    return jsonify(response), code
+    return _json_response(response, code), code
+
+def encoded_success_response(data: bytes, message: str = "操作成功", code: int = 200):
+    """
+    使用已编码数据的成功响应
+    
+    响应体与success_response一致，data为调用方已用orjson编码（通常已缓存）的JSON片段，
+    直接拼接进响应体，不再重新序列化
+    
+    Args:
+        data: 已编码的JSON数据
+        message: 响应消息
+        code: 状态码
+        
+    Returns:
+        Dict: 响应字典
+    """
+    head = orjson.dumps({"success": True, "code": code, "message": message})
+    body = head[:-1] + b',"data":' + data + b'}'
+    return current_app.response_class(body, status=code, mimetype='application/json'), code
+
+def streamed_list_response(items: Iterable[Any], message: str = "操作成功", encoded: bool = False,
+                           prefetch: int = 100):
+    """
+    流式输出列表数据的成功响应
+    
+    响应体与success_response(list(items))一致，但逐项编码输出，
+    配合yield_per等分批读取时内存占用与列表长度无关；
+    生成器在请求上下文中执行，数据库会话在输出结束前保持可用
+    
+    返回前先读取并编码前prefetch项，查询和序列化的早期错误在调用方抛出，
+    可照常返回错误响应；不足prefetch项时直接返回完整响应。
+    此后发生的错误无法再改变已发出的200状态码：记录日志后中断连接，
+    响应体缺少结尾，客户端按不完整的JSON或传输错误处理
+    
+    Args:
+        items: 逐项产出响应字典的可迭代对象
+        message: 响应消息
+        encoded: items产出的是否为已编码（如来自缓存）的JSON字节串
+        prefetch: 返回响应前预先读取的项数
+        
+    Returns:
+        Dict: 响应字典
+    """
+    head = orjson.dumps({"success": True, "code": 200, "message": message})[:-1] + b',"data":['
+    default = current_app.json.default
+    
+    def encode(item):
+        return item if encoded else orjson.dumps(item, default=default, option=JSON_OPTIONS)
+    
+    iterator = iter(items)
+    first = [encode(item) for item in islice(iterator, prefetch)]
+    if len(first) < prefetch:
+        body = head + b','.join(first) + b']}'
+        return current_app.response_class(body, status=200, mimetype='application/json'), 200
+    
+    def generate():
+        yield head + b','.join(first)
+        try:
+            for item in iterator:
+                yield b',' + encode(item)
+        except Exception:
+            logger.exception("流式响应输出中断")
+            raise
+        yield b']}'
+    
+    return current_app.response_class(
+        stream_with_context(generate()), status=200, mimetype='application/json'
+    ), 200
+
+@lru_cache(maxsize=256)
+def _encode_static_error(message: str, code: int, error_code: Optional[str]) -> bytes:
+    """编码固定文案的错误响应体，相同参数只序列化一次"""
+    response = {
+        "success": False,
+        "code": code,
+        "message": message
+    }
+    
+    if error_code:
+        response["error_code"] = error_code
+    
+    return orjson.dumps(response)
+
+def static_error_response(message: str, code: int = 400, error_code: Optional[str] = None) -> Dict:
+    """
+    固定文案的错误响应
+    
+    响应体与error_response一致，但编码结果按参数缓存；
+    仅用于字面量消息，包含异常信息等动态内容的消息仍使用error_response
+    
+    Args:
+        message: 错误消息
+        code: HTTP状态码
+        error_code: 业务错误码
+        
+    Returns:
+        Dict: 响应字典
+    """
+    body = _encode_static_error(message, code, error_code)
+    return current_app.response_class(body, status=code, mimetype='application/json'), code
 
 def paginated_response(data: list, total: int, page: int, per_page: int, message: str = "获取成功") -> Dict:
     """
@@ -14,7 +14,8 @@ License: Apache License 2.0
 
 
 import re
-from typing import Any, Dict, List, Optional
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
 from flask import request
 
 def validate_email(email: str) -> bool:
@@ -202,4 +203,19 @@ def validate_date_range(start_date, end_date) -> bool:
     if not start_date or not end_date:
         return False
     
-    return start_date <= end_date
\ No newline at end of file
+    return start_date <= end_date
+
+@lru_cache(maxsize=4096)
+def parse_tags(tags_str: str) -> Tuple[str, ...]:
+    """
+    解析逗号分隔的标签字符串
+    
+    标签组合重复率高，结果按输入缓存；返回元组以保证缓存值不可变
+    
+    Args:
+        tags_str: 逗号分隔的标签字符串
+        
+    Returns:
+        Tuple[str, ...]: 去除空白后的非空标签
+    """
+    return tuple(tag for tag in (part.strip() for part in tags_str.split(',')) if tag)